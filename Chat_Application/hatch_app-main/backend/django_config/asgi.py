@@ -11,16 +11,21 @@ import os
 
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-# import hatch_app.features.chat.routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_config.settings")
+# Initialise Django before importing anything that touches models.
+django_asgi_app = get_asgi_application()
+
+import hatch_app.features.chat.routing
+from hatch_app.lifespan import LifespanApp
+from hatch_app.middleware import FirebaseAuthMiddleware
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),  # Handles normal HTTP requests
-    # "websocket": AuthMiddlewareStack(  # Handles WebSockets
-    #     URLRouter(
-    #         hatch_app.features.chat.routing.websocket_urlpatterns  # Use correct path
-    #     )
-    # ),
+    "http": django_asgi_app,  # Handles normal HTTP requests
+    "websocket": FirebaseAuthMiddleware(  # Handles WebSockets
+        URLRouter(
+            hatch_app.features.chat.routing.websocket_urlpatterns
+        )
+    ),
+    "lifespan": LifespanApp(),  # Flushes buffered messages and pending pushes on shutdown
 })
-
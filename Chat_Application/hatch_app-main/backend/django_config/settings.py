@@ -25,12 +25,14 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "channels",
     "hatch_app",
 ]
 
 MIDDLEWARE = [
+    "hatch_app.instrumentation.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -72,6 +74,51 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Channel broadcast fan-out (hatch_app/features/chat/fanout.py): channels with at least
+# FANOUT_LARGE_CHANNEL members broadcast to FANOUT_SHARDS smaller groups concurrently.
+# Changing FANOUT_SHARDS needs connected sockets to reconnect.
+FANOUT_SHARDS = int(os.getenv('FANOUT_SHARDS', 16))
+FANOUT_LARGE_CHANNEL = int(os.getenv('FANOUT_LARGE_CHANNEL', 500))
+FANOUT_SIZE_CACHE_TTL = int(os.getenv('FANOUT_SIZE_CACHE_TTL', 60))
+
+# Channels with at least this many members keep no per-member unread counters; their unread
+# counts are computed from read watermarks when asked (hatch_app/features/chat/services.py)
+UNREAD_COUNTER_MAX_MEMBERS = int(os.getenv('UNREAD_COUNTER_MAX_MEMBERS', 200))
+
+# Presence (hatch_app/features/chat/presence.py) shares the channel-layer Redis
+PRESENCE_REDIS_URL = os.getenv('PRESENCE_REDIS_URL', f"redis://{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_PORT', 6379)}/0")
+PRESENCE_HEARTBEAT_INTERVAL = int(os.getenv('PRESENCE_HEARTBEAT_INTERVAL', 20))
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', 60))
+
+# Write-behind persistence for WebSocket messages (hatch_app/features/chat/persistence.py), PostgreSQL only
+CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'False') == 'True'
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BEHIND_BATCH_SIZE', 200))
+CHAT_WRITE_BEHIND_INTERVAL = float(os.getenv('CHAT_WRITE_BEHIND_INTERVAL', 0.05))
+# Retries for a batch failing with a transient database error; after that, and for messages that
+# cannot be inserted at all, they are appended to the dead-letter file (JSON lines; logged if unset),
+# which `manage.py replay_dead_letters` inserts once the cause is fixed
+CHAT_WRITE_BEHIND_MAX_RETRIES = int(os.getenv('CHAT_WRITE_BEHIND_MAX_RETRIES', 8))
+CHAT_WRITE_BEHIND_DEAD_LETTER = os.getenv('CHAT_WRITE_BEHIND_DEAD_LETTER')
+
+# Shared cache; Redis so invalidations reach every worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', f"redis://{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_PORT', 6379)}/1"),
+    }
+}
+
+MEMBERSHIP_CACHE_TTL = int(os.getenv('MEMBERSHIP_CACHE_TTL', 300))
+
+# Rows per transaction when adding members in bulk (hatch_app/features/chat/invites.py)
+MEMBER_INVITE_CHUNK_SIZE = int(os.getenv('MEMBER_INVITE_CHUNK_SIZE', 500))
+
+# User profile cache: a per-process LRU in front of the shared cache. Profile edits are only
+# invalidated in the process that made them, so the local TTL bounds how stale other workers get.
+USER_PROFILE_CACHE_TTL = int(os.getenv('USER_PROFILE_CACHE_TTL', 3600))
+USER_PROFILE_LOCAL_TTL = int(os.getenv('USER_PROFILE_LOCAL_TTL', 30))
+USER_PROFILE_LOCAL_SIZE = int(os.getenv('USER_PROFILE_LOCAL_SIZE', 10000))
+
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
@@ -132,4 +179,46 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Where detached message partitions are exported (hatch_app/features/chat/archive.py)
+MESSAGE_ARCHIVE_DIR = os.getenv('MESSAGE_ARCHIVE_DIR', os.path.join(BASE_DIR, 'message_archive'))
+
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Chatbot prompt context and reply cache (hatch_app/features/chat/chatbot_context.py)
+CHATBOT_CONTEXT_TOKENS = int(os.getenv('CHATBOT_CONTEXT_TOKENS', 4000))
+CHATBOT_HISTORY_LIMIT = int(os.getenv('CHATBOT_HISTORY_LIMIT', 20))
+CHATBOT_STATE_ITEMS = int(os.getenv('CHATBOT_STATE_ITEMS', 10))
+CHATBOT_CACHE_TTL = int(os.getenv('CHATBOT_CACHE_TTL', 600))
+CHATBOT_CACHE_SIZE = int(os.getenv('CHATBOT_CACHE_SIZE', 5000))
+
+# Outbound LLM calls (hatch_app/features/chat/llm_governor.py). Limits are per server process.
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))
+LLM_MAX_CONCURRENT = int(os.getenv('LLM_MAX_CONCURRENT', 8))
+LLM_MAX_CONCURRENT_PER_USER = int(os.getenv('LLM_MAX_CONCURRENT_PER_USER', 2))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 32))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', 30))
+
+# Bearer token for /api/metrics/ (hatch_app/metrics.py); open when DEBUG is on
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Per-route query/latency instrumentation (hatch_app/instrumentation.py). A request running one
+# query shape QUERY_REPEAT_THRESHOLD or more times is flagged as a likely N+1; QUERY_LOG_SAMPLE_RATE
+# is the fraction of requests and WebSocket events that also get a log line.
+QUERY_METRICS_ENABLED = os.getenv('QUERY_METRICS_ENABLED', 'True') == 'True'
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', 5))
+QUERY_LOG_SAMPLE_RATE = float(os.getenv('QUERY_LOG_SAMPLE_RATE', 0.01))
+
+FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH')
+
+# Offline-member push notifications (hatch_app/features/chat/notifications.py)
+PUSH_TRANSPORT = os.getenv('PUSH_TRANSPORT', 'hatch_app.features.chat.notifications.FCMTransport')
+PUSH_COALESCE_WINDOW = float(os.getenv('PUSH_COALESCE_WINDOW', 2.0))
+
+# Firebase ID-token verification (hatch_app/firebase_auth.py)
+FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
+FIREBASE_TOKEN_CACHE_TTL = int(os.getenv('FIREBASE_TOKEN_CACHE_TTL', 300))
+FIREBASE_TOKEN_CACHE_SIZE = int(os.getenv('FIREBASE_TOKEN_CACHE_SIZE', 10000))
+# Local development and load runs only: trust the UID header (and `?uid=` on WebSockets)
+# without checking the token
+AUTH_TRUST_UID_HEADER = os.getenv('AUTH_TRUST_UID_HEADER', 'False') == 'True'
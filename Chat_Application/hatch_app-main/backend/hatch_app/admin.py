@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .features.user.models import User
-from .features.chat.models import Channel, ChannelMember, Message, MessageReaction, MessageSeen, Bucket, BucketMember
+from .features.chat.models import Channel, ChannelMember, Message, MessageArchive, MessageReaction, Bucket, BucketMember
 from .features.tasks.models import Task
 
 admin.site.register(User)
@@ -9,6 +9,6 @@ admin.site.register(Task)
 admin.site.register(ChannelMember)
 admin.site.register(Message)
 admin.site.register(MessageReaction)
-admin.site.register(MessageSeen)
+admin.site.register(MessageArchive)
 admin.site.register(Bucket)
 admin.site.register(BucketMember)
\ No newline at end of file
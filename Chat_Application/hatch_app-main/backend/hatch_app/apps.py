@@ -3,3 +3,8 @@ from django.apps import AppConfig
 class HatchAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hatch_app"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install
+        connection_created.connect(install, dispatch_uid='hatch_query_metrics')
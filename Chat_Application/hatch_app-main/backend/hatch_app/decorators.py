@@ -1,26 +1,32 @@
-from firebase_admin import auth
 from functools import wraps
+from django.conf import settings
 from django.http import JsonResponse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from hatch_app.firebase_auth import AuthenticationError, authenticate
+
+def bearer_token(authorization):
+    """Extract the token from an `Authorization: Bearer <token>` header value."""
+    parts = (authorization or '').split(' ')
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None
+    return parts[1]
 
 def verify_token(request):
-    return {'user': request.META.get("HTTP_UID")}
     header_uid = request.META.get("HTTP_UID")
-    token = request.META.get('HTTP_AUTHORIZATION').split(' ')[1]
+    if settings.AUTH_TRUST_UID_HEADER:
+        return {'user': header_uid}
 
+    token = bearer_token(request.META.get('HTTP_AUTHORIZATION'))
     if not token or not header_uid:
         raise ValueError('Missing token or UID')
-    
-    try:
-        decoded_token = auth.verify_id_token(token)
-        uid = decoded_token['uid']
-        
-        if not uid or uid != header_uid:
-            raise ValueError('Invalid UID')
 
-        return decoded_token
-    except:
+    try:
+        decoded_token = authenticate(token, expected_uid=header_uid)
+    except AuthenticationError:
+        raise
+    except Exception:
         raise ValueError('Invalid token')
+    return {**decoded_token, 'user': decoded_token['uid']}
 
 def token_required(view_func):
     @wraps(view_func)
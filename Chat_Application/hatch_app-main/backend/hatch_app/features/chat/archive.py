@@ -0,0 +1,288 @@
+import gzip
+import heapq
+import json
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from collections import Counter
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from hatch_app.features.user.profiles import profiles
+from .models import Channel, ChannelMember, Message, MessageArchive, MessageReaction
+from .pagination import row_position
+from .partitions import add_months, detach_partition, lock_month
+
+archive_storage = FileSystemStorage(location=settings.MESSAGE_ARCHIVE_DIR)
+
+ARCHIVE_FIELDS = ('id', 'channel_id', 'sender_id', 'message_text', 'message_file', 'join_channel', 'created_at')
+
+# Messages per gzip member of an archive file. A history page decompresses at most one member
+# before reaching its cursor, instead of the whole month.
+ARCHIVE_BLOCK_SIZE = 500
+
+
+class ArchivedMessage:
+    """A message read back from an archive file. Has `id` and `created_at` so pagination treats it like a row."""
+
+    def __init__(self, record):
+        self.id = record['id']
+        self.created_at = parse_datetime(record['created_at'])
+        self.record = record
+
+
+class ArchiveWriter:
+    """
+    Streams one channel's messages for one month into a gzipped temp file, then stores it. The
+    file is a series of gzip members of ARCHIVE_BLOCK_SIZE messages (still one valid gzip
+    stream); where each member starts is recorded in MessageArchive.block_index.
+    """
+
+    def __init__(self, channel_id, month):
+        self.channel_id = channel_id
+        self.month = month
+        self.count = 0
+        self.newest_at = None
+        self.newest_text = None
+        self.oldest_at = None
+        self.block_index = []
+        self._file = tempfile.TemporaryFile()
+        self._gzip = None
+
+    def write(self, record):
+        # Records arrive newest first
+        if self.newest_at is None:
+            self.newest_at = record['created_at']
+            self.newest_text = record['message_text']
+        if self.count % ARCHIVE_BLOCK_SIZE == 0:
+            if self._gzip:
+                self._gzip.close()
+            self.block_index.append([record['created_at'].isoformat(), record['id'], self._file.tell()])
+            self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb')
+        self.oldest_at = record['created_at']
+        self.count += 1
+        record = {**record, 'created_at': record['created_at'].isoformat()}
+        self._gzip.write(json.dumps(record, ensure_ascii=False).encode() + b'\n')
+
+    def close(self):
+        if self._gzip:
+            self._gzip.close()
+        self._file.seek(0)
+        path = f"{self.month:%Y-%m}/channel_{self.channel_id}.jsonl.gz"
+        if archive_storage.exists(path):
+            archive_storage.delete(path)
+        path = archive_storage.save(path, File(self._file, name=path))
+        self._file.close()
+        MessageArchive.objects.update_or_create(
+            channel_id=self.channel_id,
+            month=self.month.date(),
+            defaults={
+                'path': path,
+                'message_count': self.count,
+                'oldest_at': self.oldest_at,
+                'newest_at': self.newest_at,
+                'newest_text': self.newest_text,
+                'block_index': self.block_index,
+            },
+        )
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_month(month, chunk_size=2000):
+    """
+    Write every message of `month` to per-channel archive files, newest first within each file,
+    with each message's reactions inlined. Returns the number of messages exported.
+    """
+    rows = Message.objects.filter(
+        created_at__gte=month, created_at__lt=add_months(month, 1)
+    ).order_by('channel_id', '-created_at', '-id').values_list(*ARCHIVE_FIELDS).iterator(chunk_size=chunk_size)
+
+    writer = None
+    total = 0
+    for chunk in _chunks(rows, chunk_size):
+        reactions = {}
+        for message_id, user_id, reaction in MessageReaction.objects.filter(
+            message_id__in=[row[0] for row in chunk]
+        ).values_list('message_id', 'user_id', 'reaction'):
+            reactions.setdefault(message_id, []).append({'user_id': user_id, 'reaction': reaction})
+
+        for row in chunk:
+            record = dict(zip(ARCHIVE_FIELDS, row))
+            record['reactions'] = reactions.get(record['id'], [])
+            if writer is None or writer.channel_id != record['channel_id']:
+                if writer:
+                    writer.close()
+                writer = ArchiveWriter(record['channel_id'], month)
+            writer.write(record)
+            total += 1
+    if writer:
+        writer.close()
+    return total
+
+
+def archive_month(month, drop=True):
+    """
+    Export `month` to archive files, then remove its reactions and detach its partition.
+    Pointers into the month are cleared (the foreign keys have no database constraint):
+    channels whose last message is archived keep its sender and time, and the inbox takes the
+    text from the archive; read watermarks keep their last_read_at.
+
+    It all happens in one transaction holding the month's lock, so reactions to the month's
+    messages wait until the partition is gone instead of being deleted unexported.
+    """
+    next_month = add_months(month, 1)
+    with transaction.atomic():
+        lock_month(month)
+        exported = export_month(month)
+        MessageReaction.objects.filter(
+            message__created_at__gte=month, message__created_at__lt=next_month
+        ).delete()
+        detach_partition(month, drop=drop)
+        Channel.objects.filter(
+            last_message_at__gte=month, last_message_at__lt=next_month
+        ).update(last_message=None)
+        ChannelMember.objects.filter(
+            last_read_at__gte=month, last_read_at__lt=next_month
+        ).update(last_read_message=None)
+    return exported
+
+
+def archived_last_messages(channel_ids):
+    """{channel id: text of the newest archived message}, for channels whose last message is archived."""
+    texts = {}
+    for channel_id, text in MessageArchive.objects.filter(
+        channel_id__in=channel_ids
+    ).order_by('channel_id', 'month').values_list('channel_id', 'newest_text'):
+        texts[channel_id] = text
+    return texts
+
+
+def read_archive(path, offset=0):
+    """Records of an archive file, newest first, from the gzip member starting at byte `offset`."""
+    with archive_storage.open(path, 'rb') as stored:
+        stored.seek(offset)
+        with gzip.GzipFile(fileobj=stored) as lines:
+            for line in lines:
+                yield json.loads(line)
+
+
+def block_offset(archive, before):
+    """
+    Byte offset of the gzip member holding the newest message older than `before`: the last
+    member whose first message is not older than it. Archives written before the index read from 0.
+    """
+    offset = 0
+    for created_at, message_id, start in archive.block_index:
+        if (parse_datetime(created_at), message_id) < before:
+            break
+        offset = start
+    return offset
+
+
+def archived_page(channel_id, before=None, limit=10):
+    """
+    Archived messages of a channel older than `before` ((created_at, id), or None for the newest),
+    newest first. Returns (messages, has_more).
+    """
+    archives = MessageArchive.objects.filter(channel_id=channel_id).order_by('-month')
+    if before:
+        archives = archives.filter(oldest_at__lte=before[0])
+
+    found = []
+    for archive in archives:
+        offset = block_offset(archive, before) if before else 0
+        for record in read_archive(archive.path, offset):
+            message = ArchivedMessage(record)
+            if before and (message.created_at, message.id) >= before:
+                continue
+            found.append(message)
+            if len(found) > limit:
+                return found[:limit], True
+    return found, False
+
+
+def continue_into_archive(channel_id, live_rows, before_position, limit):
+    """
+    Once a history page runs past the live partitions, fill the rest of it from the archives.
+    `before_position` is the decoded `before` cursor, if any. Returns (archived messages, has_more).
+    """
+    if live_rows:
+        before_position = row_position(live_rows[-1])
+    remaining = limit - len(live_rows)
+    if remaining == 0:
+        archives = MessageArchive.objects.filter(channel_id=channel_id)
+        if before_position:
+            archives = archives.filter(oldest_at__lte=before_position[0])
+        return [], archives.exists()
+    return archived_page(channel_id, before_position, remaining)
+
+
+def archived_message_count(channel_id):
+    return sum(MessageArchive.objects.filter(channel_id=channel_id).values_list('message_count', flat=True))
+
+
+def archived_message_data(messages, user_id):
+    """Render archived messages in the same shape as MessageSerializer plus reaction summaries."""
+    senders = profiles.get_many(message.record['sender_id'] for message in messages)
+    created_at = serializers.DateTimeField()
+    data = []
+    for message in messages:
+        record = message.record
+        sender = senders.get(record['sender_id'])
+        counts = Counter(reaction['reaction'] for reaction in record['reactions'])
+        mine = {reaction['reaction'] for reaction in record['reactions'] if reaction['user_id'] == user_id}
+        data.append({
+            'id': record['id'],
+            'sender': {'id': sender.id, 'name': sender.name, 'email': sender.email} if sender else None,
+            'message_text': record['message_text'],
+            'message_file': record['message_file'],
+            'join_channel': record['join_channel'],
+            'created_at': created_at.to_representation(message.created_at),
+            'channel': record['channel_id'],
+            'reactions': [
+                {'reaction': reaction, 'count': count, 'reacted': reaction in mine}
+                for reaction, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            ],
+        })
+    return data
+
+
+def merge_archive(keep_id, duplicate_id, month):
+    """
+    Fold `duplicate_id`'s archive for `month` (a date) into `keep_id`'s, rewriting the kept file,
+    and remove the duplicate's file and row. Both files are newest first, so they merge in one pass.
+    """
+    keep = MessageArchive.objects.get(channel_id=keep_id, month=month)
+    duplicate = MessageArchive.objects.get(channel_id=duplicate_id, month=month)
+    records = heapq.merge(
+        read_archive(keep.path), read_archive(duplicate.path),
+        key=lambda record: (parse_datetime(record['created_at']), record['id']), reverse=True,
+    )
+
+    writer = ArchiveWriter(keep_id, datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc))
+    for record in records:
+        writer.write({**record, 'channel_id': keep_id, 'created_at': parse_datetime(record['created_at'])})
+    writer.close()
+    archive_storage.delete(duplicate.path)
+    duplicate.delete()
+
+
+def delete_archives(channel_id):
+    """Remove a channel's archive files. The MessageArchive rows go with the channel."""
+    for path in MessageArchive.objects.filter(channel_id=channel_id).values_list('path', flat=True):
+        try:
+            archive_storage.delete(path)
+        except OSError as e:
+            print(f"Error deleting message archive {path}: {e}")
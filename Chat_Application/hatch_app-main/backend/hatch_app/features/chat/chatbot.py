@@ -1,43 +1,95 @@
+import asyncio
 import os
+from django.conf import settings
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-from typing import Optional
+from typing import AsyncIterator, Optional
+from .llm_governor import Deadline, DeadlineExceeded, LLMUnavailable, llm_governor
 
 load_dotenv()
 
+
+class UpstreamError(LLMUnavailable):
+    """The model API failed or returned nothing."""
+
+    status_code = 502
+
+
 class HatchChatbot:
     def __init__(self):
-        self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-        self.model = "gemini-2.5-pro-exp-03-25"
+        # GEMINI_BASE_URL points the client at another server, e.g. `manage.py fake_llm_server`
+        base_url = os.environ.get("GEMINI_BASE_URL")
+        self.client = genai.Client(
+            api_key=os.environ.get("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(base_url=base_url) if base_url else None,
+        )
+        self.model = os.environ.get("GEMINI_MODEL", "gemini-2.5-pro-exp-03-25")
         self.system_instruction = """You are a helpful and context-aware chatbot in a community collaboration app called Hatch. Assist users in navigating their communities, managing tasks, and communicating with others. Help them join or leave communities, send messages to individuals or channels, and assign or view tasks. Always understand the context of the user's current community and respond accordingly. Keep your responses clear, concise, and action-oriented. Your goal is to enhance collaboration and boost productivity within the platform."""
 
-    def generate(self, prompt: str) -> Optional[str]:
-        try:
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=prompt)],
-                ),
-            ]
-            
-            generate_content_config = types.GenerateContentConfig(
-                system_instruction=[
-                    types.Part.from_text(text=self.system_instruction),
-                ],
-            )
-
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
-            )
-            
+    def _request(self, prompt: str, context=None, timeout: Optional[float] = None) -> dict:
+        """`context` is a ChatbotContext: earlier turns go before the prompt, user state into the system instruction."""
+        contents = []
+        system_instruction = [types.Part.from_text(text=self.system_instruction)]
+        if context is not None:
+            for user_text, reply_text in context.history:
+                contents.append(types.Content(role="user", parts=[types.Part.from_text(text=user_text)]))
+                contents.append(types.Content(role="model", parts=[types.Part.from_text(text=reply_text)]))
+            if context.state:
+                system_instruction.append(types.Part.from_text(text=context.state))
+        contents.append(
+            types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=prompt)],
+            ),
+        )
+
+        generate_content_config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None,
+        )
+        return {"model": self.model, "contents": contents, "config": generate_content_config}
+
+    def generate(self, prompt: str, context=None, user_id=None, deadline: Optional[Deadline] = None) -> str:
+        """
+        The whole reply at once, from a thread. Runs under the LLM governor; raises LLMUnavailable
+        when the call is rejected, times out or fails.
+        """
+        deadline = deadline or Deadline(settings.LLM_TIMEOUT)
+        with llm_governor.slot(user_id, deadline):
+            try:
+                response = self.client.models.generate_content(**self._request(prompt, context, deadline.remaining()))
+            except Exception as e:
+                print(f"Error generating response: {str(e)}")
+                deadline.check()
+                raise UpstreamError("Chatbot is unavailable, please try again") from e
+            if not response.text:
+                raise UpstreamError("Chatbot returned an empty reply")
             return response.text
 
-        except Exception as e:
-            print(f"Error generating response: {str(e)}")
-            return None
+    async def stream(self, prompt: str, context=None, user_id=None, deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+        """Yield the reply in pieces as the model produces them, under the LLM governor. Raises LLMUnavailable."""
+        deadline = deadline or Deadline(settings.LLM_TIMEOUT)
+        async with llm_governor.aslot(user_id, deadline):
+            try:
+                chunks = await asyncio.wait_for(
+                    self.client.aio.models.generate_content_stream(**self._request(prompt, context, deadline.remaining())),
+                    deadline.remaining(),
+                )
+                chunks = aiter(chunks)
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), deadline.remaining())
+                    except StopAsyncIteration:
+                        break
+                    if chunk.text:
+                        yield chunk.text
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("The chatbot took too long to answer")
+            except (LLMUnavailable, asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception as e:
+                print(f"Error streaming response: {str(e)}")
+                raise UpstreamError("Chatbot is unavailable, please try again") from e
 
 hatch_chatbot = HatchChatbot()
-
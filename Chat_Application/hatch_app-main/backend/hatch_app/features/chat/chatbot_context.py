@@ -0,0 +1,116 @@
+import hashlib
+import re
+import time
+from django.conf import settings
+from hatch_app.firebase_auth import TTLCache
+from hatch_app.features.tasks.models import Task
+from .models import ChatBotMessage
+from .services import unread_memberships
+
+OPEN_TASK_STATUSES = ['open', 'in-progress']
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for Gemini's tokenizer; close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def normalize_prompt(prompt):
+    """Case, spacing and trailing punctuation do not change what is being asked."""
+    return re.sub(r'\s+', ' ', prompt).strip().casefold().rstrip('?!. ')
+
+
+class ChatbotContext:
+    """What the model sees besides the prompt: earlier turns (oldest first) and the user's current state."""
+
+    def __init__(self, history, state):
+        self.history = history
+        self.state = state
+
+    def fingerprint(self, prompt):
+        """
+        Identifies the context a reply to `prompt` depends on: the user's state and the exchange
+        just before it, unless that exchange was the same question (a repeat does not change
+        the answer, a follow-up does).
+        """
+        normalized = normalize_prompt(prompt)
+        previous = next(
+            (turn for turn in reversed(self.history) if normalize_prompt(turn[0]) != normalized), None
+        )
+        digest = hashlib.sha256(self.state.encode())
+        if previous:
+            digest.update(b'\0' + previous[0].encode() + b'\0' + previous[1].encode())
+        return digest.hexdigest()
+
+
+def user_state(user_id, limit):
+    """Open tasks assigned to the user and channels with unread messages, as prompt text."""
+    tasks = Task.objects.filter(
+        assigned_to_id=user_id, status__in=OPEN_TASK_STATUSES
+    ).order_by('due_date', 'id').values_list('community__name', 'title', 'status', 'due_date')[:limit]
+    unread = unread_memberships(user_id).filter(
+        unread__gt=0
+    ).order_by('-unread').values_list('channel__bucket__name', 'channel__name', 'unread')[:limit]
+
+    lines = []
+    for community, title, status, due_date in tasks:
+        due = f", due {due_date:%Y-%m-%d}" if due_date else ""
+        lines.append(f"- Task in {community}: {title} ({status}{due})")
+    for community, channel, count in unread:
+        lines.append(f"- {count} unread in {community} / {channel}")
+    if not lines:
+        return ""
+    return "The user's current state:\n" + "\n".join(lines)
+
+
+def build_context(user_id, budget=None):
+    """
+    The user's recent chatbot exchanges and current state, fitted to a token budget. State is
+    capped at a quarter of the budget; the rest goes to history, newest exchanges first.
+    """
+    budget = budget or settings.CHATBOT_CONTEXT_TOKENS
+    state = user_state(user_id, settings.CHATBOT_STATE_ITEMS)
+    while state and estimate_tokens(state) > budget // 4:
+        state = state.rsplit("\n", 1)[0] if "\n" in state else ""
+
+    remaining = budget - (estimate_tokens(state) if state else 0)
+    exchanges = ChatBotMessage.objects.filter(
+        chat_bot__user_id=user_id
+    ).order_by('-created_at', '-id').values_list('message_text', 'reply_text')[:settings.CHATBOT_HISTORY_LIMIT]
+
+    history = []
+    for prompt, reply in exchanges:
+        cost = estimate_tokens(prompt) + estimate_tokens(reply)
+        if cost > remaining:
+            break
+        history.append((prompt, reply))
+        remaining -= cost
+    history.reverse()
+    return ChatbotContext(history, state)
+
+
+class ResponseCache:
+    """
+    Replies by (user, context fingerprint, prompt) in an in-process LRU with a TTL. A prompt is
+    looked up as sent, then normalized, so "What is due today?" also answers "what is due today".
+    """
+
+    def __init__(self, max_size, ttl):
+        self.entries = TTLCache(max_size)
+        self.ttl = ttl
+
+    def _keys(self, user_id, context, prompt):
+        fingerprint = context.fingerprint(prompt)
+        return (user_id, fingerprint, 'exact', prompt), (user_id, fingerprint, 'normalized', normalize_prompt(prompt))
+
+    def get(self, user_id, context, prompt):
+        exact, normalized = self._keys(user_id, context, prompt)
+        return self.entries.get(exact) or self.entries.get(normalized)
+
+    def set(self, user_id, context, prompt, reply):
+        expires_at = time.time() + self.ttl
+        for key in self._keys(user_id, context, prompt):
+            self.entries.set(key, reply, expires_at)
+
+
+response_cache = ResponseCache(settings.CHATBOT_CACHE_SIZE, settings.CHATBOT_CACHE_TTL)
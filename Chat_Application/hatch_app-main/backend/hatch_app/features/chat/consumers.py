@@ -1,69 +1,269 @@
-import json
+import asyncio
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.exceptions import ValidationError
 from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.conf import settings
 from .serializers import WebSocketMessageSerializer
 from .models import Message, ChannelMember
-from hatch_app.firebase_service import send_push_notification
+from .services import mark_read, record_chatbot_reply, record_new_messages
+from .chatbot import hatch_chatbot
+from .chatbot_context import build_context, response_cache
+from .llm_governor import LLMUnavailable
+from .notifications import PushPipeline
+from .presence import presence
+from .persistence import message_writer
+from .membership import is_channel_member
+from . import fanout, wire
+from hatch_app.features.user.profiles import profiles
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    connected_users = set()
+class WireConsumer(AsyncWebsocketConsumer):
+    """Sends frames in the subprotocol negotiated at connect (self.protocol)."""
 
+    async def send_payload(self, payload):
+        """Encode a payload for this socket alone (replies, errors)."""
+        frame = wire.encode(payload, self.protocol)
+        if isinstance(frame, str):
+            await self.send(text_data=frame)
+        else:
+            await self.send(bytes_data=frame)
+
+    async def send_event(self, event):
+        """Forward a broadcast event, encoded once per process for this socket's protocol."""
+        frame = wire.frames.get(event, self.protocol or wire.JSON)
+        if isinstance(frame, str):
+            await self.send(text_data=frame)
+        else:
+            await self.send(bytes_data=frame)
+
+
+class ChatConsumer(WireConsumer):
     async def connect(self):
 
         self.channel_id = self.scope["url_route"]["kwargs"]["channel_id"]
         self.user = self.scope["user"]
+        # Frame format for this socket: JSON text unless the client offered a MessagePack subprotocol
+        self.protocol = wire.negotiate(self.scope.get("subprotocols", []))
+
+        if self.user is None:
+            await self.accept()
+            await self.close(code=4001)
+            return
+
+        # Checked once for the life of the socket; removals arrive as membership.revoked events.
+        if not await database_sync_to_async(is_channel_member)(self.channel_id, self.user.id):
+            await self.accept()
+            await self.close(code=4003)
+            return
 
-        self.group_name = f"chat_{self.channel_id}"
+        self.groups_joined = fanout.socket_groups(self.channel_id, self.user.id, self.channel_name)
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await presence.connect(self.user.id, self.channel_name)
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept(subprotocol=self.protocol)
 
-        await self.accept()
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_INTERVAL)
+            try:
+                await presence.heartbeat(self.user.id, self.channel_name)
+            except Exception as e:
+                print(f"Presence heartbeat failed: {e}")
 
 
     async def disconnect(self, close_code):
-        if hasattr(self, 'group_name') and hasattr(self, 'channel_name'):
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
-        if hasattr(self, 'user') and hasattr(self.user, 'id'):
-            self.connected_users.discard(self.user.id)
+        for group in getattr(self, 'groups_joined', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if hasattr(self, 'heartbeat_task'):
+            self.heartbeat_task.cancel()
+            await presence.disconnect(self.user.id, self.channel_name)
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
+            data = wire.decode(text_data, bytes_data, self.protocol)
+
+            if data.get("type") == "read":
+                await self.receive_read(data)
+                return
             
             serializer = WebSocketMessageSerializer(
                 data=data,
-                context={'user': self.user}
+                context={'user': self.user, 'channel_id': self.channel_id}
             )
             
             is_valid = await sync_to_async(serializer.is_valid)(raise_exception=True)
             
             if is_valid:
-                message = await sync_to_async(serializer.save)()
+                if settings.CHAT_WRITE_BEHIND:
+                    message = await message_writer.submit(
+                        int(self.channel_id),
+                        self.user.id,
+                        serializer.validated_data['message_text']
+                    )
+                else:
+                    message = await sync_to_async(self.save_message)(serializer)
                 
-                await self.channel_layer.group_send(
-                    self.group_name,
-                    {
+                sender_name = await self.sender_name()
+                await fanout.broadcast(
+                    self.channel_layer,
+                    self.channel_id,
+                    wire.broadcast_event({
                         "type": "chat.message",
+                        "message_id": message.id,
                         "message": message.message_text,
-                        "sender": self.user.name,
+                        "sender": sender_name,
                         "sender_id": self.user.id,
                         "timestamp": message.created_at.isoformat(),
-                    }
+                    })
                 )
                 
-                await self.send_notifications_to_offline_members(
-                    self.channel_id,
+                push_pipeline.notify(
+                    message.channel_id,
+                    self.user.id,
+                    sender_name,
                     message.message_text
                 )
 
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({"error": "Invalid JSON format"}))
+        except wire.FrameError as e:
+            await self.send_payload({"error": str(e)})
         except ValidationError as e:
-            await self.send(text_data=json.dumps({"error": str(e.detail)}))
+            await self.send_payload({"error": str(e.detail)})
         except Exception as e:
-            await self.send(text_data=json.dumps({"error": "Internal server error"}))
+            await self.send_payload({"error": "Internal server error"})
+
+    async def receive_read(self, data):
+        """Mark the channel read up to data["message_id"] and let the other members know."""
+        unread = await database_sync_to_async(mark_read)(self.channel_id, self.user.id, data.get("message_id"))
+        if unread is None:
+            await self.send_payload({"error": "Message not found in this channel"})
+            return
+        await self.send_payload({
+            "type": "read.ack",
+            "message_id": data["message_id"],
+            "unread_count": unread,
+        })
+        await fanout.broadcast(
+            self.channel_layer,
+            self.channel_id,
+            wire.broadcast_event({
+                "type": "read.receipt",
+                "user_id": self.user.id,
+                "message_id": data["message_id"],
+            })
+        )
+
+    async def read_receipt(self, event):
+        if event["payload"]["user_id"] != self.user.id:
+            await self.send_event(event)
+
+    async def sender_name(self):
+        """The user's current name; renames show up on a live socket once the profile cache has them."""
+        profile = profiles.peek(self.user.id) or await database_sync_to_async(profiles.get)(self.user.id)
+        return (profile or self.user).name
+
+    def save_message(self, serializer):
+        with transaction.atomic():
+            message = serializer.save()
+            record_new_messages([message])
+        return message
+
+    async def membership_revoked(self, event):
+        # Targeted revocations arrive through the user's group, which spans all their channels
+        if str(event["channel_id"]) != str(self.channel_id):
+            return
+        if event["user_ids"] is None or self.user.id in event["user_ids"]:
+            await self.close(code=4003)
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event))
\ No newline at end of file
+        await self.send_event(event)
+
+    async def reaction_delta(self, event):
+        await self.send_event(event)
+
+
+class ChatbotConsumer(WireConsumer):
+    """
+    Streams chatbot replies as they are generated. One reply at a time per socket; the exchange
+    is stored once the reply is complete, and a disconnect mid-reply discards it.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.protocol = wire.negotiate(self.scope.get("subprotocols", []))
+        self.generation = None
+
+        if self.user is None:
+            await self.accept()
+            await self.close(code=4001)
+            return
+
+        await self.accept(subprotocol=self.protocol)
+
+    async def disconnect(self, close_code):
+        if self.generation is not None:
+            self.generation.cancel()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = wire.decode(text_data, bytes_data, self.protocol)
+        except wire.FrameError as e:
+            await self.send_payload({"error": str(e)})
+            return
+
+        message_text = data.get("message")
+        if not isinstance(message_text, str) or not message_text.strip():
+            await self.send_payload({"error": "Message is required"})
+            return
+        if self.generation is not None and not self.generation.done():
+            await self.send_payload({"error": "A reply is already being generated"})
+            return
+
+        self.generation = asyncio.create_task(self.reply(message_text))
+
+    async def reply(self, message_text):
+        """Runs as a background task, so every failure has to end the stream with chatbot.error."""
+        try:
+            await self.stream_reply(message_text)
+        except Exception as e:
+            print(f"Error generating chatbot reply for {self.user.id}: {e}")
+            await self.send_payload({"type": "chatbot.error", "error": "Internal server error"})
+
+    async def stream_reply(self, message_text):
+        await self.send_payload({"type": "chatbot.start"})
+        context = await database_sync_to_async(build_context)(self.user.id)
+        reply_text = response_cache.get(self.user.id, context, message_text)
+        cached = reply_text is not None
+        if cached:
+            await self.send_payload({"type": "chatbot.delta", "text": reply_text})
+        else:
+            parts = []
+            try:
+                async for text in hatch_chatbot.stream(message_text, context, user_id=self.user.id):
+                    parts.append(text)
+                    await self.send_payload({"type": "chatbot.delta", "text": text})
+            except LLMUnavailable as e:
+                await self.send_payload({"type": "chatbot.error", "error": str(e)})
+                return
+
+            reply_text = "".join(parts)
+            if not reply_text:
+                await self.send_payload({"type": "chatbot.error", "error": "Chatbot returned an empty reply"})
+                return
+            response_cache.set(self.user.id, context, message_text, reply_text)
+
+        chatbot, message = await database_sync_to_async(record_chatbot_reply)(self.user, message_text, reply_text)
+        await self.send_payload({
+            "type": "chatbot.done",
+            "chatbot_id": chatbot.id,
+            "message_id": message.id,
+            "reply": reply_text,
+            "cached": cached,
+            "timestamp": message.created_at.isoformat(),
+        })
+
+
+push_pipeline = PushPipeline(online_users=presence.online_among)
@@ -0,0 +1,82 @@
+import asyncio
+import zlib
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from .models import ChannelMember
+
+# Every channel socket joins three channel-layer groups:
+#   chat_<id>          the whole channel, used to broadcast to small channels in one group_send
+#   chat_<id>_s<n>     one of FANOUT_SHARDS slices of it, picked from the socket's own name
+#   user_<uid>         the user's sockets, for events aimed at a few members
+# Publishers pick one strategy per event, so each socket gets it exactly once. Channels with at
+# least FANOUT_LARGE_CHANNEL members broadcast to the shards concurrently, keeping each
+# group_send (and each Redis group key) small instead of one send walking thousands of members.
+
+
+def channel_group(channel_id):
+    return f"chat_{channel_id}"
+
+
+def shard_group(channel_id, shard):
+    return f"chat_{channel_id}_s{shard}"
+
+
+def user_group(user_id):
+    # Group names only allow ASCII letters, digits, hyphens, underscores and periods
+    return f"user_{user_id}"
+
+
+def socket_shard(channel_name):
+    return zlib.crc32(channel_name.encode()) % settings.FANOUT_SHARDS
+
+
+def socket_groups(channel_id, user_id, channel_name):
+    """The groups a socket in `channel_id` joins."""
+    return [channel_group(channel_id), shard_group(channel_id, socket_shard(channel_name)), user_group(user_id)]
+
+
+def _size_key(channel_id):
+    return f"chsize:{channel_id}"
+
+
+async def channel_size(channel_id):
+    """Member count of a channel, cached for FANOUT_SIZE_CACHE_TTL seconds."""
+    size = await cache.aget(_size_key(channel_id))
+    if size is None:
+        size = await database_sync_to_async(ChannelMember.objects.filter(channel_id=channel_id).count)()
+        await cache.aset(_size_key(channel_id), size, settings.FANOUT_SIZE_CACHE_TTL)
+    return size
+
+
+def channel_size_sync(channel_id):
+    """Same as channel_size, for sync code."""
+    size = cache.get(_size_key(channel_id))
+    if size is None:
+        size = ChannelMember.objects.filter(channel_id=channel_id).count()
+        cache.set(_size_key(channel_id), size, settings.FANOUT_SIZE_CACHE_TTL)
+    return size
+
+
+async def send_whole(channel_layer, channel_id, event):
+    await channel_layer.group_send(channel_group(channel_id), event)
+
+
+async def send_sharded(channel_layer, channel_id, event):
+    await asyncio.gather(*[
+        channel_layer.group_send(shard_group(channel_id, shard), event)
+        for shard in range(settings.FANOUT_SHARDS)
+    ])
+
+
+async def broadcast(channel_layer, channel_id, event):
+    """Deliver `event` to every socket in the channel, sharded when the channel is large."""
+    if await channel_size(channel_id) < settings.FANOUT_LARGE_CHANNEL:
+        await send_whole(channel_layer, channel_id, event)
+    else:
+        await send_sharded(channel_layer, channel_id, event)
+
+
+async def send_to_users(channel_layer, user_ids, event):
+    """Deliver `event` to every socket of these users; consumers check event["channel_id"] themselves."""
+    await asyncio.gather(*[channel_layer.group_send(user_group(user_id), event) for user_id in set(user_ids)])
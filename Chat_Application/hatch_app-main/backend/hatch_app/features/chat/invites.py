@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import transaction
+from hatch_app.features.user.models import User
+from hatch_app.features.user.profiles import profiles
+from .membership import forget_membership
+from .models import BucketMember, ChannelMember
+from .versions import CHANNEL_SETTINGS, bucket_members_changed, bump
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _add_chunk(channel, user_ids, bucket_invite_accepted):
+    """
+    One short transaction: make `user_ids` bucket members (new ones with `bucket_invite_accepted`)
+    and channel members, two bulk inserts that skip rows that already exist. Returns
+    ({user_id: bucket invite accepted}, user ids that were already channel members).
+    """
+    with transaction.atomic():
+        accepted = dict(BucketMember.objects.filter(
+            bucket_id=channel.bucket_id, user_id__in=user_ids
+        ).values_list('user_id', 'invite_accepted'))
+        joined = [user_id for user_id in user_ids if user_id not in accepted]
+        BucketMember.objects.bulk_create([
+            BucketMember(bucket_id=channel.bucket_id, user_id=user_id, role='member', invite_accepted=bucket_invite_accepted)
+            for user_id in joined
+        ], ignore_conflicts=True)
+        accepted.update((user_id, bucket_invite_accepted) for user_id in joined)
+
+        already = set(ChannelMember.objects.filter(
+            channel=channel, user_id__in=user_ids
+        ).values_list('user_id', flat=True))
+        added = [user_id for user_id in user_ids if user_id not in already]
+        ChannelMember.objects.bulk_create([
+            ChannelMember(channel=channel, user_id=user_id, invite_accepted=accepted[user_id])
+            for user_id in added
+        ], ignore_conflicts=True)
+
+        transaction.on_commit(lambda: forget_membership(channel.id, added))
+        bump(CHANNEL_SETTINGS, [channel.id])
+        if joined:
+            bucket_members_changed(channel.bucket_id, joined)
+    return accepted, already
+
+
+def add_members_by_email(channel, emails, bucket_invite_accepted):
+    """
+    Add users to a channel and its bucket by email. Emails are resolved in one query, and the
+    inserts run in chunks of MEMBER_INVITE_CHUNK_SIZE, each in its own short transaction.
+    Returns one {email, status} per distinct email, where status is 'added', 'invited' (added,
+    bucket invite still pending), 'already_member' or 'user_not_found', and the ids of the
+    users left with a pending bucket invite.
+    """
+    emails = list(dict.fromkeys(emails))
+    user_ids = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+
+    statuses = {}
+    pending = []
+    found = [user_ids[email] for email in emails if email in user_ids]
+    for chunk in chunks(found, settings.MEMBER_INVITE_CHUNK_SIZE):
+        accepted, already = _add_chunk(channel, chunk, bucket_invite_accepted)
+        for user_id in chunk:
+            if user_id in already:
+                statuses[user_id] = 'already_member'
+            elif accepted[user_id]:
+                statuses[user_id] = 'added'
+            else:
+                statuses[user_id] = 'invited'
+            if not accepted[user_id]:
+                pending.append(user_id)
+
+    results = [
+        {'email': email, 'status': statuses[user_ids[email]] if email in user_ids else 'user_not_found'}
+        for email in emails
+    ]
+    return results, pending
+
+
+def add_bucket_members_by_id(channel, user_ids):
+    """
+    Add users who already accepted the channel's bucket invite to the channel, in bulk.
+    Returns one {email, status} per distinct id; ids of unknown users are reported as the email.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    accepted = set(BucketMember.objects.filter(
+        bucket_id=channel.bucket_id, user_id__in=user_ids, invite_accepted=True
+    ).values_list('user_id', flat=True))
+    users = profiles.get_many(user_ids)
+
+    already = set()
+    eligible = [user_id for user_id in user_ids if user_id in accepted]
+    for chunk in chunks(eligible, settings.MEMBER_INVITE_CHUNK_SIZE):
+        already |= _add_chunk(channel, chunk, True)[1]
+
+    results = []
+    for user_id in user_ids:
+        if user_id not in users:
+            results.append({'email': user_id, 'status': 'user_not_found'})
+        elif user_id not in accepted:
+            results.append({'email': users[user_id].email, 'status': 'not_bucket_member'})
+        else:
+            results.append({'email': users[user_id].email, 'status': 'already_member' if user_id in already else 'added'})
+    return results
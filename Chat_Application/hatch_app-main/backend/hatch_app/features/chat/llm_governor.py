@@ -0,0 +1,281 @@
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from django.conf import settings
+from hatch_app import metrics
+
+
+class LLMUnavailable(Exception):
+    """The call was not made, or was abandoned; the message is safe to show the client."""
+
+    status_code = 503
+
+
+class QueueFull(LLMUnavailable):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+class DeadlineExceeded(LLMUnavailable):
+    status_code = 504
+
+
+class Deadline:
+    """An absolute deadline, passed down so time spent queueing comes out of the call's own timeout."""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded("The chatbot took too long to answer")
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds. Then one trial call is let through: success closes it, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpen, or returns whether this call is the trial."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpen("The chatbot is unavailable right now, please try again shortly")
+                self.state = self.HALF_OPEN
+                return True
+            if self.state == self.HALF_OPEN:
+                raise CircuitOpen("The chatbot is unavailable right now, please try again shortly")
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def abandon_trial(self):
+        """The trial call never finished; let the next caller be the trial instead."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class _Waiter:
+    def __init__(self, user_id, wake, trial):
+        self.user_id = user_id
+        self.wake = wake
+        self.trial = trial
+        self.granted = False
+
+
+class LLMGovernor:
+    """
+    Admission control for outbound LLM calls, shared by the REST views (threads) and the
+    consumers (event loop). At most `max_concurrent` calls run at once and `per_user` per user;
+    up to `max_queue` more wait in FIFO order and anything beyond that is rejected immediately.
+    Waiting counts against the caller's Deadline, and the circuit breaker is checked before a
+    slot is taken so callers fail fast while the upstream is down.
+    """
+
+    def __init__(self, max_concurrent, per_user, max_queue, breaker, name='gemini'):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.breaker = breaker
+        self.name = name
+        self.active = 0
+        self.active_by_user = Counter()
+        self.waiters = deque()
+        self._lock = threading.Lock()
+
+    def _admit(self, user_id):
+        if self.active < self.max_concurrent and self.active_by_user[user_id] < self.per_user:
+            self.active += 1
+            self.active_by_user[user_id] += 1
+            return True
+        return False
+
+    def _enqueue(self, user_id, wake):
+        """Take a slot now, or join the queue. Returns (waiter or None, trial). Holds the lock."""
+        try:
+            trial = self.breaker.before_call()
+        except CircuitOpen:
+            llm_rejected.inc(reason='circuit_open')
+            raise
+        if not self.waiters and self._admit(user_id):
+            return None, trial
+        if len(self.waiters) >= self.max_queue:
+            if trial:
+                self.breaker.abandon_trial()
+            llm_rejected.inc(reason='queue_full')
+            raise QueueFull("The chatbot is busy, please try again shortly")
+        waiter = _Waiter(user_id, wake, trial)
+        self.waiters.append(waiter)
+        return waiter, trial
+
+    def _abandon(self, waiter):
+        """A waiter gave up. Returns True if it was granted a slot in the meantime (caller must release)."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self.waiters.remove(waiter)
+        if waiter.trial:
+            self.breaker.abandon_trial()
+        return False
+
+    def _release(self, user_id):
+        with self._lock:
+            self.active -= 1
+            self.active_by_user[user_id] -= 1
+            if not self.active_by_user[user_id]:
+                del self.active_by_user[user_id]
+            # Grant freed capacity in queue order, skipping users already at their own limit
+            for waiter in list(self.waiters):
+                if self.active >= self.max_concurrent:
+                    break
+                if self._admit(waiter.user_id):
+                    self.waiters.remove(waiter)
+                    waiter.granted = True
+                    waiter.wake()
+
+    def _call_finished(self, user_id, started, failed):
+        self._release(user_id)
+        llm_latency.observe(time.monotonic() - started, upstream=self.name, outcome='error' if failed else 'ok')
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _check_granted_in_time(self, user_id, deadline, trial):
+        """
+        A slot granted just as the queue wait ran out leaves no time for the call. Hand it back
+        without a call: raising inside the slot would count as an upstream failure.
+        """
+        if deadline.remaining() > 0:
+            return
+        self._release(user_id)
+        if trial:
+            self.breaker.abandon_trial()
+        llm_rejected.inc(reason='deadline')
+        raise DeadlineExceeded("The chatbot took too long to answer")
+
+    @contextmanager
+    def slot(self, user_id, deadline):
+        """
+        Run one call from a thread, with time left on `deadline`. Exceptions raised inside count
+        as upstream failures.
+        """
+        event = threading.Event()
+        queued_at = time.monotonic()
+        with self._lock:
+            waiter, trial = self._enqueue(user_id, event.set)
+        if waiter is not None:
+            if not event.wait(deadline.remaining()) and not self._abandon(waiter):
+                llm_rejected.inc(reason='deadline')
+                raise DeadlineExceeded("The chatbot took too long to answer")
+        llm_queue_wait.observe(time.monotonic() - queued_at, upstream=self.name)
+        self._check_granted_in_time(user_id, deadline, trial)
+
+        started = time.monotonic()
+        failed = True
+        try:
+            yield deadline
+            failed = False
+        finally:
+            self._call_finished(user_id, started, failed)
+
+    @asynccontextmanager
+    async def aslot(self, user_id, deadline):
+        """Run one call from the event loop. Cancelling the task gives the slot back."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+
+        queued_at = time.monotonic()
+        with self._lock:
+            waiter, trial = self._enqueue(user_id, wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), deadline.remaining())
+            except asyncio.TimeoutError:
+                # A slot granted just as the wait ran out is still used
+                if not self._abandon(waiter):
+                    llm_rejected.inc(reason='deadline')
+                    raise DeadlineExceeded("The chatbot took too long to answer")
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self._release(user_id)
+                    if trial:
+                        self.breaker.abandon_trial()
+                raise
+        llm_queue_wait.observe(time.monotonic() - queued_at, upstream=self.name)
+        self._check_granted_in_time(user_id, deadline, trial)
+
+        started = time.monotonic()
+        try:
+            yield deadline
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away; that says nothing about the upstream's health
+            self._release(user_id)
+            if trial:
+                self.breaker.abandon_trial()
+            raise
+        except BaseException:
+            self._call_finished(user_id, started, failed=True)
+            raise
+        else:
+            self._call_finished(user_id, started, failed=False)
+
+    def queue_depth(self):
+        return len(self.waiters)
+
+    def active_calls(self):
+        return self.active
+
+
+llm_latency = metrics.Histogram('hatch_llm_call_seconds', 'Outbound LLM call duration.', ['upstream', 'outcome'])
+llm_queue_wait = metrics.Histogram('hatch_llm_queue_wait_seconds', 'Time LLM calls waited for a slot.', ['upstream'])
+llm_rejected = metrics.Counter('hatch_llm_rejected', 'LLM calls rejected before reaching the upstream.', ['reason'])
+
+llm_governor = LLMGovernor(
+    max_concurrent=settings.LLM_MAX_CONCURRENT,
+    per_user=settings.LLM_MAX_CONCURRENT_PER_USER,
+    max_queue=settings.LLM_MAX_QUEUE,
+    breaker=CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET),
+)
+
+metrics.Gauge('hatch_llm_queue_depth', 'LLM calls waiting for a slot.', function=llm_governor.queue_depth)
+metrics.Gauge('hatch_llm_active_calls', 'LLM calls in flight.', function=llm_governor.active_calls)
+metrics.Gauge(
+    'hatch_llm_circuit_open', 'Whether the LLM circuit breaker is rejecting calls.',
+    function=lambda: int(llm_governor.breaker.state != CircuitBreaker.CLOSED),
+)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from .models import ChannelMember
+from .services import broadcast_to_channel, send_to_users
+
+
+def _key(channel_id, user_id):
+    return f"chmember:{getattr(channel_id, 'pk', channel_id)}:{user_id}"
+
+
+def is_channel_member(channel_id, user_id):
+    """Cached ChannelMember existence check shared by REST views and WebSocket connects."""
+    key = _key(channel_id, user_id)
+    is_member = cache.get(key)
+    if is_member is None:
+        is_member = ChannelMember.objects.filter(channel_id=getattr(channel_id, 'pk', channel_id), user_id=user_id).exists()
+        cache.set(key, is_member, settings.MEMBERSHIP_CACHE_TTL)
+    return is_member
+
+
+def forget_membership(channel_id, user_ids):
+    """Drop cached answers for these users, e.g. after they were added to the channel."""
+    cache.delete_many([_key(channel_id, user_id) for user_id in user_ids])
+
+
+def forget_user_memberships(user_id, channel_ids):
+    """Drop cached answers for one user across several channels."""
+    cache.delete_many([_key(channel_id, user_id) for channel_id in channel_ids])
+
+
+def revoke_membership(channel_id, user_ids, everyone=False):
+    """
+    Drop cached answers and tell open sockets in the channel to disconnect the revoked users
+    (or every socket, when the channel itself is gone).
+    """
+    forget_membership(channel_id, user_ids)
+    if everyone:
+        broadcast_to_channel(channel_id, {"type": "membership.revoked", "channel_id": channel_id, "user_ids": None})
+    else:
+        # Only the revoked users' sockets need to hear about it, however large the channel is
+        send_to_users(user_ids, {"type": "membership.revoked", "channel_id": channel_id, "user_ids": list(user_ids)})
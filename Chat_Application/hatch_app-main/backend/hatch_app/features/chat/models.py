@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from hatch_app.features.user.models import User
 
 class Bucket(models.Model):
@@ -20,6 +21,9 @@ class BucketMember(models.Model):
 
     class Meta:
         unique_together = ('bucket', 'user')
+        indexes = [
+            models.Index(fields=['user', 'bucket', 'invite_accepted'], name='bmember_user_bucket_acc_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.name} in {self.bucket.name} with role {self.role}"
@@ -31,6 +35,24 @@ class Channel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     picture = models.CharField(max_length=255, default='https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcSpwxCN33LtdMLbWdhafc4HxabqpaU0qVbDxQ&s')
+    # Denormalized pointer to the newest message, maintained on write (see services.update_channel_last_message)
+    # No database constraints on foreign keys to Message: PostgreSQL cannot reference a
+    # partitioned table by id alone (see migration 0016), so Django enforces on_delete.
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    last_message_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # "<user_id>:<user_id>" of a 1-on-1 direct channel's participants, sorted (see
+    # services.direct_channel_key); unique, so each pair has at most one. NULL for other channels.
+    direct_key = models.CharField(max_length=511, null=True, blank=True, unique=True)
+    # False while the channel has UNREAD_COUNTER_MAX_MEMBERS+ members: ChannelMember.unread_count is
+    # then not maintained and unread counts come from the read watermarks (see services.unread_memberships)
+    unread_counters = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', '-last_message_at'], name='channel_bucket_last_msg_idx'),
+        ]
+
     def __str__(self):
         return f"{self.id}: {self.name} in {self.bucket.name} "
 
@@ -40,9 +62,17 @@ class ChannelMember(models.Model):
     invite_accepted = models.BooleanField(default=True)  
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Read watermark; unread_count is maintained on write in small channels (see services.count_new_messages)
+    last_read_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('channel', 'user')
+        indexes = [
+            models.Index(fields=['user', 'channel'], name='chmember_user_channel_idx'),
+            models.Index(fields=['user'], name='chmember_user_unread_idx', condition=models.Q(unread_count__gt=0)),
+        ]
 
     def __str__(self):
         return f"{self.id}  {self.channel.id}:{self.user.name} in {self.channel.name} in bucket: {self.channel.bucket.name}"
@@ -53,13 +83,23 @@ class Message(models.Model):
     message_text = models.TextField()
     message_file = models.TextField(null=True, blank=True)
     join_channel = models.CharField(max_length=255, null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind persistence assigns the timestamp before the INSERT
+    created_at = models.DateTimeField(default=timezone.now)
+    # On PostgreSQL the table also has a generated `search_vector` tsvector column with a GIN
+    # index (migration 0015). It is deliberately not a model field; see features/chat/search.py.
+    # It is also range partitioned by month on created_at (migration 0016), with primary key
+    # (id, created_at); see features/chat/partitions.py.
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['channel', '-created_at', '-id'], name='msg_channel_created_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.name} in {self.channel.name}"
 
 class MessageReaction(models.Model):
-    message = models.ForeignKey(Message, on_delete=models.CASCADE)
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, db_constraint=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     reaction = models.CharField(max_length=50)  # E.g., emoji or text reaction
     created_at = models.DateTimeField(auto_now_add=True)
@@ -70,17 +110,27 @@ class MessageReaction(models.Model):
     def __str__(self):
         return f"Reaction by {self.user.name} to message {self.message.id}"
 
-class MessageSeen(models.Model):
-    message = models.ForeignKey(Message, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    seen_at = models.DateTimeField()
+class MessageArchive(models.Model):
+    """One channel's messages from a detached monthly partition, kept as a gzipped JSON-lines file."""
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE)
+    month = models.DateField()
+    path = models.CharField(max_length=255)
+    message_count = models.PositiveIntegerField()
+    oldest_at = models.DateTimeField()
+    newest_at = models.DateTimeField()
+    # Text of the newest message, for the inbox once a channel's last message is only archived
+    newest_text = models.TextField(null=True, blank=True)
+    # [[created_at, id, byte offset]] of the first (newest) message of each gzip member in the
+    # file, newest first, so a history page can start reading near its cursor (see archive.archived_page)
+    block_index = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('message', 'user')
+        unique_together = ('channel', 'month')
 
     def __str__(self):
-        return f"{self.user.name} saw message {self.message.id}"
-    
+        return f"Archive of {self.channel_id} for {self.month:%Y-%m}"
+
 class ChatBot(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
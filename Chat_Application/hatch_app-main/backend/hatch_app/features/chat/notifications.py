@@ -0,0 +1,151 @@
+import asyncio
+import inspect
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from hatch_app.features.user.models import DeviceToken
+from hatch_app.firebase_service import send_multicast_notification
+
+FCM_MULTICAST_LIMIT = 500
+
+
+class FCMTransport:
+    """Sends through Firebase Cloud Messaging, one multicast request per batch of tokens."""
+    batch_size = FCM_MULTICAST_LIMIT
+
+    def send(self, tokens, title, body, data):
+        return send_multicast_notification(tokens, title, body, data)
+
+
+class FakePushTransport:
+    """Records notifications instead of sending them; for tests and local runs."""
+    batch_size = FCM_MULTICAST_LIMIT
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, tokens, title, body, data):
+        self.sent.append({'tokens': list(tokens), 'title': title, 'body': body, 'data': data})
+        return []
+
+
+class PendingPush:
+    """Messages from one channel that arrived within the same coalescing window."""
+
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        self.count = 0
+        self.sender_ids = set()
+        self.sender_names = []
+        self.last_text = ''
+
+    def add(self, sender_id, sender_name, message_text):
+        self.count += 1
+        self.sender_ids.add(sender_id)
+        if sender_name not in self.sender_names:
+            self.sender_names.append(sender_name)
+        self.last_text = message_text
+
+    def render(self):
+        if self.count == 1:
+            return self.sender_names[0], self.last_text
+        return ', '.join(self.sender_names), f"{self.count} new messages"
+
+
+@database_sync_to_async
+def channel_device_tokens(channel_id, exclude_user_ids):
+    """(user_id, token) for every registered device of the channel's members, in one query."""
+    return list(
+        DeviceToken.objects.filter(
+            user__channelmember__channel_id=channel_id,
+            user__channelmember__invite_accepted=True,
+        ).exclude(user_id__in=exclude_user_ids).values_list('user_id', 'token')
+    )
+
+
+@database_sync_to_async
+def forget_device_tokens(tokens):
+    DeviceToken.objects.filter(token__in=tokens).delete()
+
+
+class PushPipeline:
+    """
+    Takes message events off the socket's critical path and delivers push notifications to
+    offline channel members. Bursts from the same channel within `window` seconds are
+    coalesced into one notification, and tokens are sent in multicast batches.
+    `online_users(user_ids)` returns (or awaits to) the subset currently connected.
+    """
+
+    def __init__(self, transport=None, window=None, online_users=None):
+        self.transport = transport or import_string(settings.PUSH_TRANSPORT)()
+        self.window = settings.PUSH_COALESCE_WINDOW if window is None else window
+        self.online_users = online_users or (lambda user_ids: set())
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    def notify(self, channel_id, sender_id, sender_name, message_text):
+        """Queue a message event. Must be called from the event loop; never blocks."""
+        burst = self._pending.get(channel_id)
+        if burst is None:
+            burst = self._pending[channel_id] = PendingPush(channel_id)
+            self._timers[channel_id] = self._spawn(self._flush_later(channel_id))
+        burst.add(sender_id, sender_name, message_text)
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, channel_id):
+        await asyncio.sleep(self.window)
+        self._timers.pop(channel_id, None)
+        burst = self._pending.pop(channel_id, None)
+        if burst:
+            await self._deliver(burst)
+
+    async def _deliver(self, burst):
+        try:
+            devices = await channel_device_tokens(burst.channel_id, burst.sender_ids)
+            online = self.online_users({user_id for user_id, _ in devices})
+            if inspect.isawaitable(online):
+                online = await online
+            tokens = [token for user_id, token in devices if user_id not in online]
+            if not tokens:
+                return
+
+            title, body = burst.render()
+            data = {'channel_id': str(burst.channel_id)}
+            size = self.transport.batch_size
+            send = sync_to_async(self.transport.send, thread_sensitive=False)
+            results = await asyncio.gather(*[
+                send(tokens[start:start + size], title, body, data)
+                for start in range(0, len(tokens), size)
+            ], return_exceptions=True)
+
+            stale = []
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"Error sending push batch for channel {burst.channel_id}: {result}")
+                elif result:
+                    stale.extend(result)
+            if stale:
+                await forget_device_tokens(stale)
+        except Exception as e:
+            print(f"Error delivering push notifications for channel {burst.channel_id}: {e}")
+
+    async def drain(self):
+        """Deliver everything pending now and wait for in-flight sends, e.g. on shutdown."""
+        pending, self._pending = self._pending, {}
+        for channel_id in pending:
+            timer = self._timers.pop(channel_id, None)
+            if timer:
+                timer.cancel()
+        in_flight = list(self._tasks)
+        await asyncio.gather(
+            *[self._deliver(burst) for burst in pending.values()],
+            *in_flight,
+            return_exceptions=True,
+        )
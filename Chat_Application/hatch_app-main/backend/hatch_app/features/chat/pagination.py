@@ -0,0 +1,100 @@
+import base64
+from datetime import datetime
+from django.db.models import Q
+
+DEFAULT_PAGE_LIMIT = 10
+MAX_PAGE_LIMIT = 100
+
+
+def encode_cursor(created_at, pk):
+    """Encode a (created_at, id) position into an opaque, URL-safe cursor."""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_score_cursor(score, pk):
+    """Encode a (score, id) position, for result lists ordered by relevance rather than time."""
+    raw = f"{score!r}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_score_cursor(cursor):
+    """Decode a cursor produced by encode_score_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return float(score), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_limit(value, default=DEFAULT_PAGE_LIMIT):
+    """Clamp a page_limit query param to [1, MAX_PAGE_LIMIT]."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_LIMIT))
+
+
+def keyset_page(queryset, before=None, after=None, limit=DEFAULT_PAGE_LIMIT, field='created_at'):
+    """
+    Return one page of `queryset` ordered newest first on (field, id) without COUNT or OFFSET.
+    - `before`: cursor; rows strictly older than it (scrolling back through history).
+    - `after`: cursor; rows strictly newer than it (catching up on new messages).
+    Returns (rows, has_more) where rows are always newest first.
+    """
+    if before and after:
+        raise ValueError('Use either before or after, not both')
+
+    if after:
+        value, pk = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+        ).order_by(field, 'id')
+    else:
+        if before:
+            value, pk = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk})
+            )
+        queryset = queryset.order_by(f'-{field}', '-id')
+
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows.reverse()
+    return rows, has_more
+
+
+def row_position(row, field='created_at'):
+    """(field, id) of a model instance or a .values() dict."""
+    if isinstance(row, dict):
+        return row[field], row['id']
+    return getattr(row, field), row.id
+
+
+def page_cursors(rows, has_more, after=None, field='created_at'):
+    """
+    Build the cursors for a newest-first page.
+    `next_cursor` walks further back in history, `prev_cursor` polls for newer rows.
+    """
+    if not rows:
+        return {'next_cursor': None, 'prev_cursor': after}
+    newest, oldest = rows[0], rows[-1]
+    older_exists = has_more if not after else True
+    return {
+        'next_cursor': encode_cursor(*row_position(oldest, field)) if older_exists else None,
+        'prev_cursor': encode_cursor(*row_position(newest, field)),
+    }
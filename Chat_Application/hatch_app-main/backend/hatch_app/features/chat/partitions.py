@@ -0,0 +1,94 @@
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection
+from .models import Message
+
+TABLE = Message._meta.db_table
+PARTITION_PREFIX = f"{TABLE}_p"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing `value`."""
+    value = value.astimezone(dt_timezone.utc) if value.tzinfo else value
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def is_partitioned():
+    """True when the message table is the partitioned table created by migration 0016."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def monthly_partitions():
+    """[(month, table name)] of the attached monthly partitions, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)", [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        suffix = name[len(PARTITION_PREFIX):]
+        if name.startswith(PARTITION_PREFIX) and len(suffix) == 6 and suffix.isdigit():
+            partitions.append((datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc), name))
+    return sorted(partitions)
+
+
+def create_partition(month):
+    """Attach a partition for `month` unless it exists. Returns True if one was created."""
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+    return True
+
+
+def default_partition_rows():
+    """Rows that fell outside every monthly partition. Should stay 0 if partitions are created ahead."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM "{DEFAULT_PARTITION}"')
+        return cursor.fetchone()[0]
+
+
+# pg_advisory_xact_lock class id for per-month locks; the object id is the month as YYYYMM
+MONTH_LOCK_CLASS = 0x4D534753
+
+
+def lock_month(month, shared=False):
+    """
+    Transaction-level lock on the messages of `month`. Reaction writers take it shared, and
+    archive_month takes it exclusively so no reaction changes between its export and its delete.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(%s, %s)", [MONTH_LOCK_CLASS, month.year * 100 + month.month])
+
+
+def detach_partition(month, drop=True):
+    """Detach the partition for `month` from the message table, and drop it unless `drop` is False."""
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
@@ -0,0 +1,225 @@
+import asyncio
+import atexit
+import json
+import threading
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.utils import timezone
+from .models import Message
+from .services import record_new_messages
+
+# Errors worth retrying: the database went away or the connection broke. Anything else (an
+# IntegrityError after the channel was deleted, a bad payload) fails the same way every time.
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class MessageIdAllocator:
+    """Hands out Message ids reserved in blocks from the Postgres sequence, so ids exist before the INSERT."""
+
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._ids = []
+        self._lock = asyncio.Lock()
+
+    def _reserve(self):
+        if connection.vendor != 'postgresql':
+            raise ImproperlyConfigured('CHAT_WRITE_BEHIND needs PostgreSQL to reserve message ids')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [Message._meta.db_table, self.block_size],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    async def next_id(self):
+        async with self._lock:
+            if not self._ids:
+                self._ids = await database_sync_to_async(self._reserve)()
+            return self._ids.pop(0)
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for WebSocket messages.
+
+    submit() assigns an id and timestamp and returns immediately so the message can be broadcast.
+    A single background flusher then writes buffered messages in id order with bulk_create, at
+    most every `interval` seconds or as soon as `batch_size` are waiting. A batch that fails with a
+    transient error is retried with backoff, up to `max_retries` times, before anything newer is
+    written. Any other failure splits the batch until the offending messages are isolated; those,
+    and batches that ran out of retries, go to the dead-letter log so later batches keep flowing.
+    Writes are idempotent (explicit ids; stored ones are skipped along with their side effects),
+    and close() (ASGI lifespan shutdown) or, failing that, process exit flush whatever is still
+    buffered. Dead letters are replayed with `manage.py replay_dead_letters`.
+    """
+
+    def __init__(self, batch_size=None, interval=None, retry_delay=0.5, max_retry_delay=10, max_retries=None):
+        self.batch_size = batch_size or settings.CHAT_WRITE_BEHIND_BATCH_SIZE
+        self.interval = settings.CHAT_WRITE_BEHIND_INTERVAL if interval is None else interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = settings.CHAT_WRITE_BEHIND_MAX_RETRIES if max_retries is None else max_retries
+        self.allocator = MessageIdAllocator()
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._wakeup = None
+        self._flusher = None
+        self._closing = False
+        self._atexit_registered = False
+
+    def _start(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+        if not self._atexit_registered:
+            atexit.register(self.flush_sync)
+            self._atexit_registered = True
+
+    async def submit(self, channel_id, sender_id, message_text, message_file=None):
+        message = Message(
+            id=await self.allocator.next_id(),
+            channel_id=channel_id,
+            sender_id=sender_id,
+            message_text=message_text,
+            message_file=message_file,
+            created_at=timezone.now(),
+        )
+        self._start()
+        with self._buffer_lock:
+            self._buffer.append(message)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return message
+
+    def _take(self):
+        with self._buffer_lock:
+            batch = sorted(self._buffer[:self.batch_size], key=lambda message: message.id)
+            del self._buffer[:len(batch)]
+        return batch
+
+    def _put_back(self, batch):
+        with self._buffer_lock:
+            self._buffer[:0] = batch
+
+    @staticmethod
+    def write(batch):
+        """
+        Insert the messages not already stored and update channel state for those alone. A retry
+        whose first attempt did commit, or a dead-letter replay, is then a no-op instead of
+        counting the messages as unread twice. Returns the messages inserted.
+        """
+        with transaction.atomic():
+            # The created_at range lets PostgreSQL skip the other monthly partitions
+            created = [message.created_at for message in batch]
+            stored = set(Message.objects.filter(
+                id__in=[message.id for message in batch], created_at__range=(min(created), max(created)),
+            ).values_list('id', flat=True))
+            new = [message for message in batch if message.id not in stored]
+            if new:
+                Message.objects.bulk_create(new, ignore_conflicts=True)
+                record_new_messages(new)
+        return new
+
+    @staticmethod
+    def _dead_letter(batch, error):
+        """Record messages that will not be persisted, one JSON line each, so they can be replayed."""
+        print(f"Giving up on persisting {len(batch)} messages: {error}")
+        lines = [json.dumps({
+            'id': message.id,
+            'channel_id': message.channel_id,
+            'sender_id': message.sender_id,
+            'message_text': message.message_text,
+            'message_file': message.message_file,
+            'created_at': message.created_at.isoformat(),
+            'error': str(error),
+        }) for message in batch]
+        path = settings.CHAT_WRITE_BEHIND_DEAD_LETTER
+        if path:
+            try:
+                with open(path, 'a') as f:
+                    f.write(''.join(f"{line}\n" for line in lines))
+                return
+            except OSError as e:
+                print(f"Error writing dead-letter log {path}: {e}")
+        for line in lines:
+            print(f"[dead-letter] {line}")
+
+    async def _flush_batch(self, batch):
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                await database_sync_to_async(self.write)(batch)
+                return
+            except TRANSIENT_ERRORS as e:
+                error = e
+                if attempt < self.max_retries:
+                    print(f"Error persisting {len(batch)} messages, retrying in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._dead_letter(batch, e)
+                    return
+                # Halve until the bad messages are isolated; the rest still go in, in id order
+                middle = len(batch) // 2
+                await self._flush_batch(batch[:middle])
+                await self._flush_batch(batch[middle:])
+                return
+        self._dead_letter(batch, error)
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything buffered so far, in order."""
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                await self._flush_batch(batch)
+            except asyncio.CancelledError:
+                self._put_back(batch)
+                raise
+
+    async def close(self):
+        """Stop the flusher and persist what is left; call on shutdown."""
+        self._closing = True
+        if self._flusher:
+            self._wakeup.set()
+            await self._flusher
+        await self.flush()
+
+    def _flush_batch_sync(self, batch):
+        try:
+            self.write(batch)
+        except TRANSIENT_ERRORS as e:
+            # No time to wait for the database at exit
+            self._dead_letter(batch, e)
+        except Exception as e:
+            if len(batch) == 1:
+                self._dead_letter(batch, e)
+                return
+            middle = len(batch) // 2
+            self._flush_batch_sync(batch[:middle])
+            self._flush_batch_sync(batch[middle:])
+
+    def flush_sync(self):
+        """Last-chance flush from a thread with no running loop (registered with atexit)."""
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            self._flush_batch_sync(batch)
+
+
+message_writer = MessageWriter()
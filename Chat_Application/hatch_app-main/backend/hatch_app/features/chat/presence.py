@@ -0,0 +1,80 @@
+import time
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+
+class Presence:
+    """
+    Cluster-wide online status kept in Redis, shared by every ASGI worker.
+
+    Each user has a sorted set of their live connections scored by expiry time. A connection
+    stays online while its heartbeats keep pushing the score forward, so sockets on a worker
+    that dies simply age out after `ttl` seconds. A user is online while any connection is
+    unexpired, and the number of unexpired connections is their device count.
+    """
+
+    def __init__(self, url, ttl, prefix='presence'):
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = aioredis.Redis.from_url(self.url)
+        return self._async_client
+
+    def _key(self, user_id):
+        return f"{self.prefix}:{user_id}"
+
+    def _touch(self, pipe, user_id, connection_id):
+        now = time.time()
+        key = self._key(user_id)
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zadd(key, {connection_id: now + self.ttl})
+        pipe.expire(key, int(self.ttl) + 1)
+
+    def _count(self, pipe, user_ids):
+        now = time.time()
+        for user_id in user_ids:
+            pipe.zcount(self._key(user_id), now, '+inf')
+
+    async def connect(self, user_id, connection_id):
+        pipe = self.async_client.pipeline(transaction=False)
+        self._touch(pipe, user_id, connection_id)
+        await pipe.execute()
+
+    heartbeat = connect
+
+    async def disconnect(self, user_id, connection_id):
+        await self.async_client.zrem(self._key(user_id), connection_id)
+
+    async def device_counts(self, user_ids):
+        """{user_id: live connection count} for every given user, in one round trip."""
+        user_ids = list(dict.fromkeys(user_ids))
+        pipe = self.async_client.pipeline(transaction=False)
+        self._count(pipe, user_ids)
+        return dict(zip(user_ids, await pipe.execute()))
+
+    async def online_among(self, user_ids):
+        """The subset of `user_ids` with at least one live connection."""
+        return {user_id for user_id, count in (await self.device_counts(user_ids)).items() if count}
+
+    def device_counts_sync(self, user_ids):
+        """Same as device_counts, for sync views."""
+        user_ids = list(dict.fromkeys(user_ids))
+        pipe = self.client.pipeline(transaction=False)
+        self._count(pipe, user_ids)
+        return dict(zip(user_ids, pipe.execute()))
+
+
+presence = Presence(settings.PRESENCE_REDIS_URL, settings.PRESENCE_TTL)
@@ -1,6 +1,8 @@
 from django.urls import re_path
-from .consumers import ChatConsumer
+from hatch_app.instrumentation import instrument_consumer
+from .consumers import ChatConsumer, ChatbotConsumer
 
 websocket_urlpatterns = [
-    re_path(r"ws/chat/(?P<channel_id>\w+)/$", ChatConsumer.as_asgi()),
+    re_path(r"ws/chat/(?P<channel_id>\w+)/$", instrument_consumer(ChatConsumer).as_asgi()),
+    re_path(r"ws/chatbot/$", instrument_consumer(ChatbotConsumer).as_asgi()),
 ]
@@ -0,0 +1,60 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from .models import ChannelMember, Message
+from .pagination import decode_score_cursor, encode_score_cursor
+from .projections import MESSAGE
+
+# Text search configuration used for both the stored vectors and the queries. 'simple' only
+# lowercases and splits words, so mixed Urdu/English text is indexed as written.
+SEARCH_CONFIG = 'simple'
+
+
+def search_vector():
+    """
+    The `search_vector` column of the message table. It is a PostgreSQL generated column
+    (migration 0015) rather than a model field, so ordinary message reads never load it.
+    """
+    return RawSQL(f'"{Message._meta.db_table}"."search_vector"', [], output_field=SearchVectorField())
+
+
+def ranked_matches(queryset, text):
+    """Annotate matching messages with `rank`. Uses the GIN index on PostgreSQL."""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        vector = search_vector()
+        # ts_rank returns float4. Cast to double precision so the rank in a cursor (a Python float)
+        # compares equal to the same row's rank on the next page; a float4 column compared with
+        # the float8 literal would never tie, and rows sharing the page's last rank were skipped.
+        rank = Cast(SearchRank(vector, query), FloatField())
+        return queryset.alias(document=vector).filter(document=query).annotate(rank=rank)
+
+    # Other databases (SQLite in tests): every word must appear somewhere in the text, unranked
+    for word in text.split():
+        queryset = queryset.filter(message_text__icontains=word)
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def search_messages(user_id, text, limit, cursor=None, channel_id=None):
+    """
+    Messages matching `text` in channels `user_id` belongs to, best match first, then newest id.
+    Rows are MESSAGE projection values plus `rank`, paged by keyset on (rank, id).
+    Returns (rows, next_cursor); raises ValueError for a bad cursor.
+    """
+    channels = ChannelMember.objects.filter(user_id=user_id).values('channel_id')
+    queryset = Message.objects.filter(channel_id__in=channels)
+    if channel_id is not None:
+        queryset = queryset.filter(channel_id=channel_id)
+    queryset = ranked_matches(queryset, text)
+
+    if cursor:
+        rank, pk = decode_score_cursor(cursor)
+        queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=pk))
+
+    messages = list(MESSAGE.values(queryset, 'rank').order_by('-rank', '-id')[:limit + 1])
+    if len(messages) <= limit:
+        return messages, None
+    messages = messages[:limit]
+    return messages, encode_score_cursor(messages[-1]['rank'], messages[-1]['id'])
@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import Bucket, BucketMember, Channel, ChannelMember, Message, MessageReaction, MessageSeen
+from .models import Bucket, BucketMember, Channel, ChannelMember, Message, MessageReaction
 from hatch_app.features.user.models import User
+from .membership import is_channel_member
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,6 +24,7 @@ class ChannelSerializer(serializers.ModelSerializer):
     class Meta:
         model = Channel
         fields = '__all__'
+        read_only_fields = ['last_message', 'last_message_sender', 'last_message_at', 'direct_key', 'unread_counters']
 
 class ChannelMemberSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -30,6 +32,7 @@ class ChannelMemberSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChannelMember
         fields = '__all__'
+        read_only_fields = ['last_read_message', 'last_read_at', 'unread_count']
 
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
@@ -45,22 +48,14 @@ class MessageReactionSerializer(serializers.ModelSerializer):
         model = MessageReaction
         fields = '__all__'
 
-class MessageSeenSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-
-    class Meta:
-        model = MessageSeen
-        fields = '__all__'
-
 
 class WebSocketMessageSerializer(serializers.ModelSerializer):
+    channel_id = serializers.IntegerField(write_only=True)
+    sender_id = serializers.CharField(write_only=True)
+
     class Meta:
         model = Message
         fields = ['message_text', 'channel_id', 'sender_id']
-        extra_kwargs = {
-            'sender_id': {'write_only': True},
-            'channel_id': {'write_only': True}
-        }
 
     def validate_sender_id(self, value):
         if value != self.context['user'].id:
@@ -68,9 +63,12 @@ class WebSocketMessageSerializer(serializers.ModelSerializer):
         return value
 
     def validate_channel_id(self, value):
-        if not ChannelMember.objects.filter(
-            channel_id=value,
-            user_id=self.context['user'].id
-        ).exists():
+        # A socket's membership is checked once at connect; it may only post to its own channel.
+        connected_channel = self.context.get('channel_id')
+        if connected_channel is not None:
+            if str(value) != str(connected_channel):
+                raise serializers.ValidationError("Message is not for this channel")
+            return value
+        if not is_channel_member(value, self.context['user'].id):
             raise serializers.ValidationError("User is not a member of this channel")
         return value
\ No newline at end of file
@@ -0,0 +1,187 @@
+from collections import Counter
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DateTimeField, F, IntegerField, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+from .models import Channel, ChannelMember, ChatBot, ChatBotMessage, Message, MessageReaction
+from .versions import BUCKET_CHANNELS, bump
+from . import fanout
+
+
+def broadcast_to_channel(channel_id, event):
+    """Send an event to every socket in a channel from sync code. Delivery is best effort."""
+    try:
+        async_to_sync(fanout.broadcast)(get_channel_layer(), channel_id, event)
+    except Exception as e:
+        print(f"Error broadcasting {event.get('type')} to channel {channel_id}: {e}")
+
+
+def send_to_users(user_ids, event):
+    """Send an event to every socket of these users from sync code. Delivery is best effort."""
+    try:
+        async_to_sync(fanout.send_to_users)(get_channel_layer(), user_ids, event)
+    except Exception as e:
+        print(f"Error sending {event.get('type')} to users: {e}")
+
+
+def direct_channel_key(user_id, other_user_id):
+    """Channel.direct_key for the direct channel between two users, whichever of them starts it."""
+    return ':'.join(sorted([user_id, other_user_id]))
+
+
+def update_channel_last_message(message):
+    """
+    Point the message's channel at it, unless the channel already points at a newer message.
+    Single conditional UPDATE, so concurrent senders cannot move the pointer backwards.
+    """
+    Channel.objects.filter(id=message.channel_id).filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+    ).update(
+        last_message=message,
+        last_message_sender_id=message.sender_id,
+        last_message_at=message.created_at,
+    )
+
+
+def watermark_unread():
+    """
+    Expression for a ChannelMember's unread count computed from its read watermark: messages
+    from others after the last read message, or since joining for members who never read.
+    """
+    since = Coalesce(OuterRef('last_read_at'), OuterRef('created_at'), output_field=DateTimeField())
+    newer = Message.objects.filter(channel_id=OuterRef('channel_id')).exclude(sender_id=OuterRef('user_id')).filter(
+        Q(created_at__gt=since) | Q(created_at=OuterRef('last_read_at'), id__gt=OuterRef('last_read_message_id'))
+    )
+    counted = newer.order_by().values('channel_id').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def unread_memberships(user_id):
+    """
+    The user's ChannelMember rows annotated with `unread`: the maintained counter in small
+    channels, computed from the watermark in channels without counters.
+    """
+    return ChannelMember.objects.filter(user_id=user_id).annotate(unread=Case(
+        When(channel__unread_counters=True, then=F('unread_count')),
+        default=watermark_unread(),
+        output_field=IntegerField(),
+    ))
+
+
+def count_new_messages(channel_id, messages):
+    """
+    Add new messages to the unread counter of every member except whoever sent them.
+
+    That is one row update per member for every message, so channels with
+    UNREAD_COUNTER_MAX_MEMBERS or more members stop keeping counters (unread_memberships
+    computes theirs from the watermark). A channel shrinking below half that has its counters
+    recomputed once and kept again; the gap keeps a channel near the limit from flapping.
+    """
+    size = fanout.channel_size_sync(channel_id)
+    counters = Channel.objects.filter(id=channel_id).values_list('unread_counters', flat=True).first()
+    if size >= settings.UNREAD_COUNTER_MAX_MEMBERS:
+        if counters:
+            Channel.objects.filter(id=channel_id).update(unread_counters=False)
+        return
+    members = ChannelMember.objects.filter(channel_id=channel_id)
+    if not counters:
+        if size < settings.UNREAD_COUNTER_MAX_MEMBERS // 2:
+            # The new messages are already inserted, so the recount includes them
+            members.update(unread_count=watermark_unread())
+            Channel.objects.filter(id=channel_id).update(unread_counters=True)
+        return
+
+    senders = Counter(message.sender_id for message in messages)
+    if len(senders) == 1:
+        (sender_id, count), = senders.items()
+        members.exclude(user_id=sender_id).update(unread_count=F('unread_count') + count)
+        return
+    members.update(unread_count=F('unread_count') + len(messages))
+    for sender_id, count in senders.items():
+        members.filter(user_id=sender_id).update(unread_count=F('unread_count') - count)
+
+
+def record_new_messages(messages):
+    """Maintain the per-channel denormalized state (last message, unread counters) for inserted messages."""
+    by_channel = {}
+    for message in messages:
+        by_channel.setdefault(message.channel_id, []).append(message)
+    for channel_id, channel_messages in by_channel.items():
+        update_channel_last_message(max(channel_messages, key=lambda message: (message.created_at, message.id)))
+        count_new_messages(channel_id, channel_messages)
+    # Channel lists show each channel's latest message
+    bump(BUCKET_CHANNELS, Channel.objects.filter(id__in=list(by_channel)).values_list('bucket_id', flat=True))
+
+
+def create_message(**fields):
+    """Insert a message and update its channel's denormalized state in one transaction."""
+    with transaction.atomic():
+        message = Message.objects.create(**fields)
+        record_new_messages([message])
+    return message
+
+
+def mark_read(channel_id, user_id, message_id):
+    """
+    Move the user's read watermark forward to `message_id` and recount what is still unread.
+    Returns the unread count, or None if the message is not in the channel or the user is not a member.
+    """
+    message = Message.objects.filter(id=message_id, channel_id=channel_id).only('id', 'created_at').first()
+    if message is None:
+        return None
+
+    member = ChannelMember.objects.filter(channel_id=channel_id, user_id=user_id)
+    with transaction.atomic():
+        # Lock the row first: a sender's increment committed between the count and the update
+        # below would otherwise be overwritten. Counting after the lock sees that message.
+        if member.select_for_update().values_list('id', flat=True).first() is None:
+            return None
+        unread = Message.objects.filter(channel_id=channel_id).filter(
+            Q(created_at__gt=message.created_at) | Q(created_at=message.created_at, id__gt=message.id)
+        ).exclude(sender_id=user_id).count()
+        moved = member.filter(
+            Q(last_read_at__isnull=True) | Q(last_read_at__lte=message.created_at)
+        ).update(last_read_message=message, last_read_at=message.created_at, unread_count=unread)
+    if not moved:
+        # Already read past this message; report the current count
+        return unread_memberships(user_id).filter(channel_id=channel_id).values_list('unread', flat=True).first()
+    return unread
+
+
+def reaction_summaries(message_ids, user_id):
+    """
+    {message_id: [{reaction, count, reacted}]} for a page of messages, grouped by emoji in one query.
+    `reacted` is whether `user_id` is among the reactors.
+    """
+    rows = MessageReaction.objects.filter(message_id__in=message_ids).values('message_id', 'reaction').annotate(
+        count=Count('id'),
+        mine=Count('id', filter=Q(user_id=user_id)),
+    ).order_by('message_id', '-count', 'reaction')
+
+    summaries = {message_id: [] for message_id in message_ids}
+    for row in rows:
+        summaries[row['message_id']].append({
+            'reaction': row['reaction'],
+            'count': row['count'],
+            'reacted': row['mine'] > 0,
+        })
+    return summaries
+
+
+def record_chatbot_reply(user, message_text, reply_text):
+    """
+    Store a finished chatbot exchange, creating the user's bot on first use. Called after
+    generation so no transaction is held open while the model runs. Returns (chatbot, message).
+    """
+    chatbot, _ = ChatBot.objects.get_or_create(
+        user_id=user.id,
+        defaults={'name': f"{user.name}'s Assistant"}
+    )
+    message = ChatBotMessage.objects.create(
+        chat_bot=chatbot,
+        message_text=message_text,
+        reply_text=reply_text
+    )
+    return chatbot, message
@@ -19,16 +19,21 @@ urlpatterns = [
     path('channels/members/add/', views.add_channel_member, name='add-channel-member'),
     path('channels/<int:channel_id>/members/<int:user_id>/remove/', views.remove_channel_member, name='remove-channel-member'),
     path('channels/<int:channel_id>/settings/', views.get_channel_settings, name='get-channel-settings'),
+    path('channels/<int:channel_id>/presence/', views.get_channel_presence, name='get-channel-presence'),
     path('channels/<int:channel_id>/members/add/', views.add_channel_members, name='add-channel-members'),
     path('channels/<int:channel_id>/members/<str:member_id>/role/', views.update_channel_member_role, name='update-channel-member-role'),
 
     path('channels/<int:channel_id>/messages/', views.fetch_messages, name='fetch-messages'),
+    path('messages/search/', views.search_messages, name='search-messages'),
+    path('channels/read/', views.mark_channels_read, name='mark-channels-read'),
+    path('unread-counts/', views.get_unread_counts, name='get-unread-counts'),
 
     path('direct-messages/recent/', views.get_chat_messages, name='get-chat-messages'),
     path('direct-messages/communities/', views.get_community_messages, name='get-community_messages'),
     path('direct-messages/send/', views.create_direct_channel_and_send_message, name='create-direct-channel-and-send-message'),
     path('direct-messages/<int:channel_id>/send/', views.send_messages, name='send-messages'),
     path('direct-messages/<int:message_id>/react/', views.react_message, name='react-message'),
+    path('direct-messages/<int:message_id>/reactions/', views.list_message_reactors, name='list-message-reactors'),
 
     path('chatbot/message/', views.send_chatbot_message, name='send-chatbot-message'),
 ]
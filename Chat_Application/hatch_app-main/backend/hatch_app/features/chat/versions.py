@@ -0,0 +1,87 @@
+import uuid
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from .models import BucketMember, ChannelMember
+
+# What each version covers. A version is a random token in the cache; bumping deletes it and
+# the next read mints a new one, so a lost cache entry only costs clients one full response.
+USER_BUCKETS = 'user-buckets'        # list_buckets, per user
+BUCKET_CHANNELS = 'bucket-channels'  # list_channels, per bucket (channels and their latest message)
+BUCKET_MEMBERS = 'bucket-members'    # list_bucket_members, per bucket
+CHANNEL_SETTINGS = 'channel-settings'  # get_channel_settings, per channel
+
+
+def _key(scope, object_id):
+    return f"ver:{scope}:{object_id}"
+
+
+def current_version(scope, object_id):
+    key = _key(scope, object_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump(scope, object_ids):
+    """Invalidate the versions of these objects once the current transaction commits."""
+    keys = [_key(scope, object_id) for object_id in set(object_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def bucket_members_changed(bucket_id, user_ids=(), channel_ids=()):
+    """
+    Bucket membership or roles changed for `user_ids`. Bumps the bucket's member list and
+    channel list, the bucket lists of everyone in it (member counts), and the settings of the
+    channels those users are in. Pass `channel_ids` when the rows are already deleted.
+    """
+    member_ids = list(BucketMember.objects.filter(bucket_id=bucket_id).values_list('user_id', flat=True))
+    bump(BUCKET_MEMBERS, [bucket_id])
+    bump(BUCKET_CHANNELS, [bucket_id])
+    bump(USER_BUCKETS, [*member_ids, *user_ids])
+    if user_ids:
+        channel_ids = [*channel_ids, *ChannelMember.objects.filter(
+            channel__bucket_id=bucket_id, user_id__in=user_ids
+        ).values_list('channel_id', flat=True)]
+    bump(CHANNEL_SETTINGS, channel_ids)
+
+
+def user_profile_changed(user_id):
+    """A user's display data changed: bump the member lists and channel settings that show it."""
+    bump(BUCKET_MEMBERS, BucketMember.objects.filter(user_id=user_id).values_list('bucket_id', flat=True))
+    bump(CHANNEL_SETTINGS, ChannelMember.objects.filter(user_id=user_id).values_list('channel_id', flat=True))
+
+
+def etag_versioned(scope, id_kwarg=None, authorize=None):
+    """
+    Conditional GET for a view whose 200 response only changes when `scope` is bumped for the
+    object named by URL kwarg `id_kwarg` (or the requesting user). A matching If-None-Match
+    gets a 304 without running the view, once `authorize(request, object_id)` has returned None
+    rather than an error Response, so the 304 tells nothing to callers the view would refuse.
+    Goes below @token_required.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            object_id = kwargs[id_kwarg] if id_kwarg else request.user
+            etag = quote_etag(current_version(scope, object_id))
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                denied = authorize(request, object_id) if authorize else None
+                if denied is not None:
+                    return denied
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
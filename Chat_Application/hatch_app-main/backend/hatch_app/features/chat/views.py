@@ -3,18 +3,37 @@ from hatch_app.decorators import token_required
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from .models import Bucket, BucketMember, Channel, ChannelMember, Message, MessageReaction, MessageSeen, ChatBot , ChatBotMessage
+from .models import Bucket, BucketMember, Channel, ChannelMember, Message, MessageReaction
 from .serializers import (
     BucketSerializer, BucketMemberSerializer,
     ChannelSerializer, ChannelMemberSerializer,
-    MessageSerializer, MessageReactionSerializer, MessageSeenSerializer
+    MessageReactionSerializer
 )
 from hatch_app.features.chat.chatbot import hatch_chatbot
-from django.core.paginator import Paginator,EmptyPage, PageNotAnInteger
-from django.db.models import OuterRef, Subquery, Count
+from hatch_app.features.chat.chatbot_context import build_context, response_cache
+from hatch_app.features.chat.llm_governor import LLMUnavailable
+from hatch_app.features.chat.services import (
+    broadcast_to_channel, create_message, direct_channel_key, mark_read, reaction_summaries, record_chatbot_reply,
+    unread_memberships,
+)
+from hatch_app.features.chat.presence import presence
+from hatch_app.features.chat.membership import is_channel_member, forget_membership, forget_user_memberships, revoke_membership
+from hatch_app.features.chat.pagination import MAX_PAGE_LIMIT, decode_cursor, keyset_page, page_cursors, parse_page_limit
+from hatch_app.features.chat.archive import archived_last_messages, archived_message_count, archived_message_data, continue_into_archive, delete_archives
+from hatch_app.features.chat.partitions import lock_month, month_start
+from hatch_app.features.chat.search import search_messages as run_message_search
+from hatch_app.features.chat.projections import BUCKET_MEMBER, MESSAGE
+from hatch_app.features.chat.wire import broadcast_event
+from hatch_app.features.chat.invites import add_bucket_members_by_id, add_members_by_email
+from hatch_app.features.chat.versions import (
+    BUCKET_CHANNELS, BUCKET_MEMBERS, CHANNEL_SETTINGS, USER_BUCKETS, bucket_members_changed, bump, etag_versioned,
+)
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
 from hatch_app.features.user.models import User
+from hatch_app.features.user.profiles import profiles
 from django.conf import settings
 
 
@@ -43,19 +62,32 @@ def check_bucket_invite(bucket_id, user):
     
 def check_channel_membership(channel_id, user):
     """Check if the user is a member of the channel."""
-    if not ChannelMember.objects.filter(channel_id=channel_id, user=user).exists():
+    if not is_channel_member(channel_id, user):
         return Response({'error': 'You are not a member of this channel'}, status=status.HTTP_403_FORBIDDEN)
 
 
+def bucket_member_required(request, bucket_id):
+    """etag_versioned authorize hook: the error Response for non-members, else None."""
+    bucket = check_bucket_membership(bucket_id, request.user)
+    return bucket if isinstance(bucket, Response) else None
+
+
+def channel_member_required(request, channel_id):
+    """etag_versioned authorize hook: the error Response for non-members, else None."""
+    return check_channel_membership(channel_id, request.user)
+
+
 @api_view(['POST'])
 @token_required
-@transaction.atomic
 def send_chatbot_message(request):
     """
     Send a message to chatbot, get API response, and store both message and reply.
+    The reply is generated outside any transaction; ws/chatbot/ streams it instead.
     """
     message_text = request.data.get('message')
-    user = get_object_or_404(User, id=request.user)
+    user = profiles.get(request.user)
+    if user is None:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     if not message_text:
         return Response(
             {"error": "Message is required"}, 
@@ -63,18 +95,13 @@ def send_chatbot_message(request):
         )
 
     try:
-        chatbot_lol, created = ChatBot.objects.get_or_create(
-            user_id=request.user,
-            defaults={'name': f"{user.name}'s Assistant"}
-        )
+        context = build_context(user.id)
+        bot_reply = response_cache.get(user.id, context, message_text)
+        if bot_reply is None:
+            bot_reply = hatch_chatbot.generate(message_text, context, user_id=user.id)
+            response_cache.set(user.id, context, message_text, bot_reply)
 
-        bot_reply = hatch_chatbot.generate(message_text)
-
-        chat_message = ChatBotMessage.objects.create(
-            chat_bot=chatbot_lol,
-            message_text=message_text,
-            reply_text=bot_reply
-        )
+        chatbot_lol, chat_message = record_chatbot_reply(user, message_text, bot_reply)
         return Response({
             'chatbot_id': chatbot_lol.id,
             'chatbot_name': chatbot_lol.name,
@@ -86,6 +113,8 @@ def send_chatbot_message(request):
             },
         }, status=status.HTTP_200_OK)
 
+    except LLMUnavailable as e:
+        return Response({"error": str(e)}, status=e.status_code)
     except ValueError as e:
         return Response(
             {"error": str(e)}, 
@@ -98,42 +127,100 @@ def send_chatbot_message(request):
         )
 
 
+def direct_message_counterparts(channel_ids, user):
+    """Map each direct channel id to the other participant's (name, profile_picture), via the profile cache."""
+    members = list(ChannelMember.objects.filter(
+        channel_id__in=channel_ids
+    ).exclude(user=user).values_list('channel_id', 'user_id'))
+    users = profiles.get_many(user_id for _, user_id in members)
+    return {
+        channel_id: (users[user_id].name, users[user_id].profile_picture)
+        for channel_id, user_id in members if user_id in users
+    }
+
+
+# Columns the inbox views read from a channel and its last message
+INBOX_FIELDS = (
+    'id', 'last_message__message_text', 'last_message_sender_id', 'last_message_at',
+)
+
+
+def inbox_senders(channels):
+    """Profiles of the last senders of these inbox rows."""
+    return profiles.get_many(channel['last_message_sender_id'] for channel in channels if channel['last_message_sender_id'])
+
+
+def inbox_archived_texts(channels):
+    """Last-message texts of inbox rows whose last message was archived (only queried if there are any)."""
+    archived = [
+        channel['id'] for channel in channels
+        if channel['last_message__message_text'] is None and channel['last_message_at'] is not None
+    ]
+    return archived_last_messages(archived) if archived else {}
+
+
+def inbox_entry(channel, senders, archived_texts):
+    sender = senders.get(channel['last_message_sender_id'])
+    text = channel['last_message__message_text']
+    if text is None:
+        text = archived_texts.get(channel['id'])
+    return {
+        'latest_message': text if text is not None else 'No messages yet',
+        'latest_sender_name': sender.name if sender else None,
+        'latest_sender_id': channel['last_message_sender_id'],
+        'timestamp': channel['last_message_at']
+    }
+
+
 @api_view(['GET'])
 @token_required
 def get_chat_messages(request):
-    """Retrieve the latest direct messages (1-on-1 chats) for the user."""
+    """Retrieve the latest direct messages (1-on-1 chats) for the user.
+    Returns the full list, or a cursor page when page_limit/before/after is given."""
+    paginate = any(param in request.GET for param in ('page_limit', 'before', 'after'))
+
     direct_channels = Channel.objects.filter(
         members__user=request.user,
         channel_type="direct"
-    )
+    ).annotate(
+        activity_at=Coalesce('last_message_at', 'created_at')
+    ).values(*INBOX_FIELDS, 'activity_at')
 
-    latest_messages = Message.objects.filter(
-        channel=OuterRef('id')
-    ).order_by('-created_at')
+    if paginate:
+        after = request.GET.get('after')
+        try:
+            channels, has_more = keyset_page(
+                direct_channels,
+                before=request.GET.get('before'),
+                after=after,
+                limit=parse_page_limit(request.GET.get('page_limit'), default=MAX_PAGE_LIMIT),
+                field='activity_at',
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        channels = list(direct_channels.order_by('-activity_at', '-id'))
 
-    
-    direct_channels_with_messages = direct_channels.annotate(
-        latest_message=Subquery(latest_messages.values('message_text')[:1]),
-        latest_sender=Subquery(latest_messages.values('sender__name')[:1]),
-        latest_sender_id=Subquery(latest_messages.values('sender__id')[:1]),
-        latest_timestamp=Subquery(latest_messages.values('created_at')[:1])
-    ).order_by('-latest_timestamp')
+    counterparts = direct_message_counterparts([channel['id'] for channel in channels], request.user)
+    senders = inbox_senders(channels)
+    archived_texts = inbox_archived_texts(channels)
 
     message_list = []
-    for channel in direct_channels_with_messages:
-        members = ChannelMember.objects.filter(channel_id=channel.id).exclude(user=request.user)
-        last_message = {
-            
-            'channel_id': channel.id,
-            'channel_name': members.first().user.name if members.exists() else 'Unknown',
-            'profile_picture': members.first().user.profile_picture if members.exists() else None,
-            'latest_message': channel.latest_message or 'No messages yet',
-            'latest_sender_name': channel.latest_sender,
-            'latest_sender_id': channel.latest_sender_id ,
-            'timestamp': channel.latest_timestamp
-        }
-        message_list.append(last_message)
+    for channel in channels:
+        name, picture = counterparts.get(channel['id'], ('Unknown', None))
+        message_list.append({
+            'channel_id': channel['id'],
+            'channel_name': name,
+            'profile_picture': picture,
+            **inbox_entry(channel, senders, archived_texts)
+        })
 
+    if paginate:
+        return Response({
+            'has_more': has_more,
+            **page_cursors(channels, has_more, after=after, field='activity_at'),
+            'channels': message_list
+        })
     return Response(message_list)
 
 @api_view(['GET'])
@@ -143,50 +230,34 @@ def get_community_messages(request):
 
     buckets = Bucket.objects.filter(
         bucketmember__user=request.user
-    ).annotate(member_count=Count('bucketmember'))
+    ).annotate(member_count=Count('bucketmember')).values('id', 'name', 'picture', 'member_count')
+
+    # Every community channel of the user across all their buckets, in one query
+    channels_by_bucket = {}
+    community_channels = Channel.objects.filter(
+        members__user=request.user,
+        channel_type="community"
+    ).order_by('id').values(*INBOX_FIELDS, 'bucket_id', 'name', 'picture')
+    community_channels = list(community_channels)
+    senders = inbox_senders(community_channels)
+    archived_texts = inbox_archived_texts(community_channels)
+    for channel in community_channels:
+        channels_by_bucket.setdefault(channel['bucket_id'], []).append({
+            'channel_id': channel['id'],
+            'channel_name': channel['name'],
+            'picture': channel['picture'],
+            **inbox_entry(channel, senders, archived_texts)
+        })
 
     bucket_list = []
     for bucket in buckets:
-
-        community_channels = Channel.objects.filter(
-            bucket=bucket,
-            members__user=request.user,
-            channel_type="community"
-
-        ).annotate(
-            latest_message=Subquery(
-                Message.objects.filter(channel=OuterRef('id')).order_by('-created_at').values('message_text')[:1]
-            ),
-            latest_sender_name=Subquery(
-                Message.objects.filter(channel=OuterRef('id')).order_by('-created_at').values('sender__name')[:1]
-            ),
-            latest_sender_id=Subquery(
-                Message.objects.filter(channel=OuterRef('id')).order_by('-created_at').values('sender__id')[:1]
-            ),
-            latest_timestamp=Subquery(
-                Message.objects.filter(channel=OuterRef('id')).order_by('-created_at').values('created_at')[:1]
-            )
-        )
-
-        channels_list = []
-        for channel in community_channels:
-            channels_list.append({
-                'channel_id': channel.id,
-                'channel_name': channel.name,
-                'picture': channel.picture,
-                'latest_message': channel.latest_message or 'No messages yet',
-                'latest_sender_name': channel.latest_sender_name,
-                'latest_sender_id': channel.latest_sender_id,
-                'timestamp': channel.latest_timestamp
-            })
-
         bucket_list.append({
-            "Bucket ID": bucket.id,
-            "Bucket Name": bucket.name,
-            "Bucket Picture": bucket.picture,
-            "Bucket_id": bucket.id,
-            "Member Count": bucket.member_count,
-            "channels_list": channels_list
+            "Bucket ID": bucket['id'],
+            "Bucket Name": bucket['name'],
+            "Bucket Picture": bucket['picture'],
+            "Bucket_id": bucket['id'],
+            "Member Count": bucket['member_count'],
+            "channels_list": channels_by_bucket.get(bucket['id'], [])
         })
 
     return Response(bucket_list)
@@ -203,6 +274,7 @@ def create_bucket(request):
             user=request.user,
             role='admin'
         )
+        bucket_members_changed(bucket.id, [request.user])
         return Response(bucket_serializer.data, status=status.HTTP_201_CREATED)
     return Response(bucket_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -211,10 +283,21 @@ def delete_bucket(request, bucket_id):
     bucket = check_bucket_membership(bucket_id, request.user, required_roles=['admin'])
     if isinstance(bucket, Response):
         return bucket
+    member_ids = list(BucketMember.objects.filter(bucket=bucket).values_list('user_id', flat=True))
+    channel_ids = list(Channel.objects.filter(bucket=bucket).values_list('id', flat=True))
+    # The channels and their memberships go with the bucket; collect who loses access first
+    channel_members = {channel_id: [] for channel_id in channel_ids}
+    for channel_id, user_id in ChannelMember.objects.filter(channel_id__in=channel_ids).values_list('channel_id', 'user_id'):
+        channel_members[channel_id].append(user_id)
     bucket.delete()
+    bucket_members_changed(bucket_id, member_ids, channel_ids)
+    for channel_id, user_ids in channel_members.items():
+        revoke_membership(channel_id, user_ids, everyone=True)
     return Response({'message': 'Bucket deleted'}, status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
+@token_required
+@etag_versioned(USER_BUCKETS)
 def list_buckets(request):
     user = request.user
 
@@ -243,7 +326,8 @@ def add_bucket_member(request):
         bucket_check = check_bucket_membership(bucket_id, request.user, required_roles=['admin'])
         if isinstance(bucket_check, Response):
             return bucket_check
-        serializer.save()
+        member = serializer.save()
+        bucket_members_changed(member.bucket_id, [member.user_id])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -253,25 +337,35 @@ def remove_bucket_member(request, bucket_id, user_id):
     if isinstance(bucket_check, Response):
         return bucket_check
     member = get_object_or_404(BucketMember, bucket_id=bucket_id, user_id=user_id)
-    member.delete()
+    # Leaving the bucket means leaving its channels too
+    channel_ids = list(ChannelMember.objects.filter(
+        channel__bucket_id=bucket_id, user_id=member.user_id
+    ).values_list('channel_id', flat=True))
+    with transaction.atomic():
+        member.delete()
+        ChannelMember.objects.filter(channel_id__in=channel_ids, user_id=member.user_id).delete()
+    bucket_members_changed(bucket_id, [member.user_id], channel_ids)
+    for channel_id in channel_ids:
+        revoke_membership(channel_id, [member.user_id])
     return Response({'message': 'User removed from bucket'}, status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['GET'])
 @token_required
+@etag_versioned(BUCKET_MEMBERS, 'bucket_id', authorize=bucket_member_required)
 def list_bucket_members(request, bucket_id):
 
     bucket_check = check_bucket_membership(bucket_id, request.user)
     if isinstance(bucket_check, Response):
         return bucket_check
 
-    members = BucketMember.objects.filter(bucket_id=bucket_id)
-    serializer = BucketMemberSerializer(members, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    members = BUCKET_MEMBER.values(BucketMember.objects.filter(bucket_id=bucket_id))
+    return Response(BUCKET_MEMBER.render(members), status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @token_required
+@etag_versioned(CHANNEL_SETTINGS, 'channel_id', authorize=channel_member_required)
 def get_channel_settings(request, channel_id):
     """
     List channel members with their names and bucket membership status.
@@ -285,29 +379,23 @@ def get_channel_settings(request, channel_id):
 
         # Get channel and its bucket
         channel = get_object_or_404(Channel, id=channel_id)
-        bucket_id = channel.bucket.id
+        bucket_id = channel.bucket_id
 
-        # Get channel members with their bucket status
+        # Channel members with their role in the bucket; members who left the bucket are skipped
         members = ChannelMember.objects.filter(
             channel_id=channel_id
-        ).select_related('user')
+        ).annotate(
+            bucket_role=Subquery(
+                BucketMember.objects.filter(bucket_id=bucket_id, user_id=OuterRef('user_id')).values('role')[:1]
+            )
+        ).filter(bucket_role__isnull=False).values_list('user_id', 'bucket_role')
+        members = list(members)
+        users = profiles.get_many(user_id for user_id, _ in members)
 
-        # Format response data
-        member_data = []
-        for member in members:
-            try:
-                # Get member's bucket status
-                bucket_member = BucketMember.objects.get(
-                    bucket_id=bucket_id,
-                    user=member.user
-                )
-                member_data.append({
-                    'member_name': member.user.name,
-                    'member_id': member.user.id,
-                    'bucket_role': bucket_member.role,
-                })
-            except BucketMember.DoesNotExist:
-                continue
+        member_data = [
+            {'member_name': users[user_id].name if user_id in users else None, 'member_id': user_id, 'bucket_role': role}
+            for user_id, role in members
+        ]
         res = {
             'channel_id': channel.id,
             'channel_name': channel.name,
@@ -323,56 +411,85 @@ def get_channel_settings(request, channel_id):
         )
     
 
+@api_view(['GET'])
+@token_required
+def get_channel_presence(request, channel_id):
+    """Online status and live connection count for every member of a channel."""
+    membership_check = check_channel_membership(channel_id, request.user)
+    if membership_check:
+        return membership_check
+
+    member_ids = list(ChannelMember.objects.filter(channel_id=channel_id).values_list('user_id', flat=True))
+    try:
+        counts = presence.device_counts_sync(member_ids)
+    except Exception as e:
+        return Response({'error': f'Presence unavailable: {str(e)}'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({
+        'channel_id': channel_id,
+        'members': [
+            {'member_id': member_id, 'online': counts[member_id] > 0, 'connections': counts[member_id]}
+            for member_id in member_ids
+        ]
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @token_required
-@transaction.atomic
 def create_channel(request):
     """Creates a new channel (group or direct) and optionally a new bucket, adds members, and sends invites if needed."""
     data = request.data.copy()
     bucket_id = data.get('bucket')
     bucket_name = data.get('bucket_name')
     channel_members = data.get('members', [])
-    sender = get_object_or_404(User, id=request.user)
+    sender = profiles.get(request.user)
+    if sender is None:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
     if not bucket_id and not bucket_name:
         return Response({'error': 'Either bucket_id or bucket_name is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    if not bucket_id:
-        bucket = Bucket.objects.create(name=bucket_name)
-        BucketMember.objects.create(bucket=bucket, user=sender, role='admin',invite_accepted = True)
-        data['bucket'] = bucket.id
-    else:
+    if bucket_id:
         bucket = check_bucket_membership(bucket_id, request.user, required_roles=['admin'])
         if isinstance(bucket, Response):
             return bucket
 
-    serializer = ChannelSerializer(data=data)
-    if serializer.is_valid():
+    # Only the bucket, the channel and its creator are created in one transaction
+    with transaction.atomic():
+        if not bucket_id:
+            bucket = Bucket.objects.create(name=bucket_name)
+            BucketMember.objects.create(bucket=bucket, user_id=sender.id, role='admin',invite_accepted = True)
+            data['bucket'] = bucket.id
+
+        serializer = ChannelSerializer(data=data)
+        if not serializer.is_valid():
+            transaction.set_rollback(True)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         channel = serializer.save()
-
-        ChannelMember.objects.create(channel=channel, user=sender)
-
-        for member_email in channel_members:
-            user = get_object_or_404(User, email=member_email)
-            bucket_member = BucketMember.objects.get_or_create(bucket=bucket, user=user, defaults={'role': 'member', 'invite_accepted': False})
-            if not bucket_member[0].invite_accepted:
-                message_text = f"{sender.name} Has invited you to join {bucket.name}. Use following code to join code:{bucket.id}"
-                create_direct_channel_and_send_message_helper(member_email,message_text,sender)
-                ChannelMember.objects.create(channel=channel, user=user, invite_accepted=False)
-            else:
-                ChannelMember.objects.create(channel=channel, user=user, invite_accepted=True)
-
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ChannelMember.objects.create(channel=channel, user_id=sender.id)
+        bump(BUCKET_CHANNELS, [bucket.id])
+        if not bucket_id:
+            bucket_members_changed(bucket.id, [sender.id])
+
+    # Members are added in bulk, in short transactions of their own; invites go out once they are committed
+    results, pending = add_members_by_email(channel, channel_members, bucket_invite_accepted=False)
+    if pending:
+        message_text = f"{sender.name} Has invited you to join {bucket.name}. Use following code to join code:{bucket.id}"
+        for invitee in profiles.get_many(pending).values():
+            try:
+                create_direct_channel_and_send_message_helper(invitee.email, message_text, sender)
+            except ValueError as e:
+                print(f"Error sending invite to {invitee.email}: {e}")
+    return Response({**serializer.data, 'members': results}, status=status.HTTP_201_CREATED)
 
 
 @api_view(['POST'])
 @token_required
-@transaction.atomic
 def add_channel_members(request,channel_id):
     """
     Add new members to a channel and its associated bucket.
     If users are not bucket members, they will be invited.
+    `new` (emails) are added to the bucket as well; `existing` (user ids) must already be in it.
     """
     try:
         data = request.data.copy()
@@ -380,60 +497,12 @@ def add_channel_members(request,channel_id):
         new_members = data.get('new', [])
         
         channel = get_object_or_404(Channel, id=channel_id)
-        bucket = get_object_or_404(Bucket, id=channel.bucket.id)
-        sender = get_object_or_404(User, id=request.user)
-        bucket_check = check_bucket_membership(bucket.id, request.user, required_roles=['admin'])
+        bucket_check = check_bucket_membership(channel.bucket_id, request.user, required_roles=['admin'])
         if isinstance(bucket_check, Response):
             return bucket_check
 
-        added_members = []
-        for member_email in new_members:
-            try:
-                user = get_object_or_404(User, email=member_email)
-                bucket_member, created = BucketMember.objects.get_or_create(
-                    bucket=bucket,
-                    user=user,
-                    defaults={'role': 'member', 'invite_accepted': True}
-                )
-                channel_member = ChannelMember.objects.get_or_create(
-                    channel=channel,
-                    user=user,
-                    invite_accepted=True
-                )
-
-                added_members.append({
-                    'email': member_email,
-                    'status': 'added'
-                })
-
-            except User.DoesNotExist:
-                added_members.append({
-                    'email': member_email,
-                    'status': 'user_not_found'
-                })
-                continue
-
-        for member_id in existing_members:
-            try:
-                print(f"Adding {member_id} to channel {channel.name}")
-                user = get_object_or_404(User, id=member_id)
-                if BucketMember.objects.filter(bucket=bucket, user=user, invite_accepted=True).exists():
-                    ChannelMember.objects.get_or_create(
-                        channel=channel,
-                        user=user,
-                        defaults={'invite_accepted': True}
-                    )
-                    added_members.append({
-                        'email': user.email,
-                        'status': 'added'
-                    })
-
-            except User.DoesNotExist:
-                added_members.append({
-                    'email': member_id,
-                    'status': 'user_not_found'
-                })
-                continue
+        added_members, _ = add_members_by_email(channel, new_members, bucket_invite_accepted=True)
+        added_members += add_bucket_members_by_id(channel, existing_members)
 
         return Response({
             'message': 'Members processed successfully',
@@ -463,6 +532,7 @@ def update_channel_member_role(request,member_id,channel_id):
             return Response({'error': 'Invalid role'}, status=status.HTTP_400_BAD_REQUEST)
         member.role = role
         member.save()
+        bucket_members_changed(bucket.id, [member.user_id])
         return Response({'message': 'Member status updated successfully'}, status=status.HTTP_200_OK)
     except ObjectDoesNotExist:
         return Response({'error': 'Member not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -494,6 +564,10 @@ def add_member_using_invite(request):
             channel__bucket=bucket_id, user=request.user
         ).update(invite_accepted=True)
 
+        channel_ids = list(Channel.objects.filter(bucket_id=bucket_id).values_list('id', flat=True))
+        transaction.on_commit(lambda: forget_user_memberships(request.user, channel_ids))
+        bucket_members_changed(bucket.id, [request.user])
+
         return Response({"message": "Invite accepted successfully."}, status=status.HTTP_200_OK)
 
     except BucketMember.DoesNotExist:
@@ -515,10 +589,17 @@ def delete_channel(request, channel_id):
     if isinstance(bucket_check, Response):
         return bucket_check
 
+    member_ids = list(ChannelMember.objects.filter(channel=channel).values_list('user_id', flat=True))
+    delete_archives(channel_id)
     channel.delete()
+    bump(BUCKET_CHANNELS, [channel.bucket_id])
+    bump(CHANNEL_SETTINGS, [channel_id])
+    revoke_membership(channel_id, member_ids, everyone=True)
     return Response({'message': 'Channel deleted'}, status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
+@token_required
+@etag_versioned(BUCKET_CHANNELS, 'bucket_id', authorize=bucket_member_required)
 def list_channels(request, bucket_id):
     """Retrieve all channels in a bucket with the most recent message."""
     user = request.user
@@ -526,21 +607,19 @@ def list_channels(request, bucket_id):
     if not Bucket.objects.filter(id=bucket_id, bucketmember__user=user).exists():
         return Response({"detail": "You are not a member of this bucket."}, status=403)
 
-    latest_messages = Message.objects.filter(
-        channel=OuterRef('id')
-    ).order_by('-created_at').values('message_text')[:1]
-
-    channels = Channel.objects.filter(bucket_id=bucket_id).annotate(
-        latest_message=Subquery(latest_messages)
-    )
+    channels = list(Channel.objects.filter(bucket_id=bucket_id).select_related('last_message'))
+    archived_texts = archived_last_messages([
+        channel.id for channel in channels if channel.last_message is None and channel.last_message_at
+    ])
 
     channel_list = []
     for channel in channels:
+        latest = channel.last_message.message_text if channel.last_message else archived_texts.get(channel.id)
         channel_data = {
             "id": channel.id,
             "name": channel.name,
             "channel_type": channel.channel_type,
-            "latest_message": channel.latest_message if channel.latest_message else "No messages yet",
+            "latest_message": latest if latest is not None else "No messages yet",
         }
         channel_list.append(channel_data)
 
@@ -561,7 +640,9 @@ def add_channel_member(request):
 
     serializer = ChannelMemberSerializer(data=data)
     if serializer.is_valid():
-        serializer.save()
+        member = serializer.save()
+        forget_membership(member.channel_id, [member.user_id])
+        bump(CHANNEL_SETTINGS, [member.channel_id])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -577,64 +658,53 @@ def remove_channel_member(request, channel_id, user_id):
     member = get_object_or_404(ChannelMember, channel=channel, user_id=user_id)
 
     member.delete()
+    revoke_membership(channel_id, [member.user_id])
+    bump(CHANNEL_SETTINGS, [channel_id])
     return Response({'message': 'User removed from channel'}, status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
 @token_required
 def fetch_messages(request, channel_id):
-    """Fetches paginated messages for a channel along with reactions, supporting pagination
-    and after_id filtering."""
+    """Fetches messages for a channel along with per-emoji reaction summaries, newest first,
+    using opaque before/after cursors over (created_at, id). History continues into archived
+    months once the live partitions run out."""
     membership_check = check_channel_membership(channel_id, request.user)
     if membership_check:
         return membership_check
 
-    page = int(request.GET.get('page', 1))
-    page_limit = int(request.GET.get('page_limit', 10))
-    after_id = request.GET.get('after_id')
+    page_limit = parse_page_limit(request.GET.get('page_limit'))
+    before = request.GET.get('before')
+    after = request.GET.get('after')
+    include_total = request.GET.get('include_total') == 'true'
 
-    messages_queryset = Message.objects.filter(channel_id=channel_id).prefetch_related('messagereaction_set')
+    messages_queryset = MESSAGE.values(Message.objects.filter(channel_id=channel_id))
 
-    if after_id:
-        try:
-            reference_message = Message.objects.get(id=after_id)
-            messages_queryset = messages_queryset.filter(
-                created_at__gt=reference_message.created_at
+    try:
+        messages, has_more = keyset_page(messages_queryset, before=before, after=after, limit=page_limit)
+        archived = []
+        if not after and not has_more:
+            archived, has_more = continue_into_archive(
+                channel_id, messages, decode_cursor(before) if before else None, page_limit
             )
-        except Message.DoesNotExist:
-            pass
-
-    messages_queryset = messages_queryset.order_by("-created_at")
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    paginator = Paginator(messages_queryset, page_limit)
-
-    try:
-        messages_page = paginator.get_page(page)
-    except EmptyPage:
-        messages_page = []
-    except PageNotAnInteger:
-        messages_page = paginator.get_page(1)
-
-    serializer = MessageSerializer(messages_page, many=True)
-
-    for message in serializer.data:
-        message_obj = messages_queryset.get(id=message['id'])
-        reactions = message_obj.messagereaction_set.all()
-        message['reactions'] = [
-            {
-                "user_id": reaction.user.id,
-                "user_name": reaction.user.name,
-                "reaction": reaction.reaction
-            }
-            for reaction in reactions
-        ]
+    message_list = MESSAGE.render(messages)
+    summaries = reaction_summaries([message['id'] for message in messages], request.user)
+    for message in message_list:
+        message['reactions'] = summaries[message['id']]
+    message_list.extend(archived_message_data(archived, request.user))
 
     response_data = {
-        'page': page,
         'page_limit': page_limit,
-        'total_pages': paginator.num_pages,
-        'total_messages': paginator.count,
-        'messages': serializer.data
+        'has_more': has_more,
+        **page_cursors(messages + archived, has_more, after=after),
+        'messages': message_list
     }
+    if include_total:
+        response_data['total_messages'] = (
+            Message.objects.filter(channel_id=channel_id).count() + archived_message_count(channel_id)
+        )
 
     return Response(response_data)
 
@@ -655,10 +725,12 @@ def send_messages(request, channel_id):
     if not message_text:
         return Response({"error": "Message text is required."}, status=status.HTTP_400_BAD_REQUEST)
     
+    if profiles.get(request.user) is None:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
     try:
-        sender = get_object_or_404(User, id=request.user)
-        message = Message.objects.create(
-            sender=sender,
+        message = create_message(
+            sender_id=request.user,
             channel_id=channel_id,
             message_text=message_text,
             message_file=message_file
@@ -671,6 +743,93 @@ def send_messages(request, channel_id):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def parse_id(value):
+    """A positive integer id from JSON (number or numeric string), or None."""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+@api_view(['POST'])
+@token_required
+def mark_channels_read(request):
+    """Move the caller's read watermark forward in one or more channels."""
+    entries = request.data.get('read')
+    if not isinstance(entries, list) or not entries:
+        return Response({"error": "read must be a non-empty list of {channel_id, message_id}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            results.append({'channel_id': None, 'status': 'invalid'})
+            continue
+        channel_id = parse_id(entry.get('channel_id'))
+        message_id = parse_id(entry.get('message_id'))
+        if channel_id is None or message_id is None:
+            results.append({'channel_id': entry.get('channel_id'), 'status': 'invalid'})
+            continue
+        if not is_channel_member(channel_id, request.user):
+            results.append({'channel_id': channel_id, 'status': 'not_allowed'})
+            continue
+        unread = mark_read(channel_id, request.user, message_id)
+        if unread is None:
+            results.append({'channel_id': channel_id, 'status': 'message_not_found'})
+        else:
+            results.append({'channel_id': channel_id, 'status': 'read', 'unread_count': unread})
+
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@token_required
+def get_unread_counts(request):
+    """Unread message counts for every channel of the caller that has any."""
+    counts = unread_memberships(request.user).filter(unread__gt=0).values_list('channel_id', 'unread')
+    channels = {channel_id: unread for channel_id, unread in counts}
+    return Response({
+        'total_unread': sum(channels.values()),
+        'channels': channels
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@token_required
+def search_messages(request):
+    """Full-text search over messages in the caller's channels, best match first."""
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    channel_id = request.GET.get('channel_id')
+    if channel_id is not None:
+        try:
+            channel_id = int(channel_id)
+        except ValueError:
+            return Response({'error': 'channel_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    page_limit = parse_page_limit(request.GET.get('page_limit'))
+    try:
+        messages, next_cursor = run_message_search(
+            request.user, text, page_limit, cursor=request.GET.get('cursor'), channel_id=channel_id
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = MESSAGE.render(messages)
+    for result, message in zip(results, messages):
+        result['rank'] = message['rank']
+    return Response({
+        'page_limit': page_limit,
+        'has_more': next_cursor is not None,
+        'next_cursor': next_cursor,
+        'results': results
+    })
+
+
 @api_view(['POST'])
 @token_required
 def react_message(request, message_id):
@@ -683,61 +842,120 @@ def react_message(request, message_id):
     reaction = request.data.get('reaction')
     if not reaction:
         return Response({"error": "Reaction is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if profiles.get(request.user) is None:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     try:
-
-        sender = get_object_or_404(User, id=request.user)
-        reaction, created = MessageReaction.objects.update_or_create(
-            message=message,
-            user=sender,
-            reaction=reaction,
-        )
+        with transaction.atomic():
+            # Holds off archiving of the message's month; once it is archived the message is gone
+            lock_month(month_start(message.created_at), shared=True)
+            if not Message.objects.filter(id=message.id, created_at=message.created_at).exists():
+                return Response({"error": "Message not found."}, status=status.HTTP_404_NOT_FOUND)
+            previous = MessageReaction.objects.filter(message=message, user_id=request.user).values_list('reaction', flat=True).first()
+            _, created = MessageReaction.objects.update_or_create(
+                message=message,
+                user_id=request.user,
+                defaults={'reaction': reaction},
+            )
 
         if created:
             response_message = "Reaction added successfully."
         else:
             response_message = "Reaction updated successfully."
 
+        if previous != reaction:
+            broadcast_to_channel(message.channel_id, broadcast_event({
+                "type": "reaction.delta",
+                "message_id": message.id,
+                "user_id": request.user,
+                "added": reaction,
+                "removed": previous,
+            }))
+
         return Response({"message": response_message}, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@token_required
+def list_message_reactors(request, message_id):
+    """Pages through who reacted to a message, newest first, optionally for one emoji."""
+    message = get_object_or_404(Message, id=message_id)
+    membership_check = check_channel_membership(message.channel_id, request.user)
+    if membership_check:
+        return membership_check
+
+    page_limit = parse_page_limit(request.GET.get('page_limit'), default=50)
+    before = request.GET.get('before')
+    after = request.GET.get('after')
+
+    reactions = MessageReaction.objects.filter(message=message)
+    if request.GET.get('reaction'):
+        reactions = reactions.filter(reaction=request.GET['reaction'])
+
+    try:
+        page, has_more = keyset_page(reactions, before=before, after=after, limit=page_limit)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    users = profiles.get_many(reaction.user_id for reaction in page)
+    return Response({
+        'has_more': has_more,
+        **page_cursors(page, has_more, after=after),
+        'reactors': [
+            {
+                "user_id": reaction.user_id,
+                "user_name": users[reaction.user_id].name if reaction.user_id in users else None,
+                "reaction": reaction.reaction,
+            }
+            for reaction in page
+        ],
+    })
+
+
 def create_direct_channel_and_send_message_helper(email, message_text, sender):
     """Helper function to create a direct channel with a user and send a message."""
     try:
         recipient = User.objects.get(email=email)
+        if recipient.id == sender.id:
+            raise ValueError("You cannot send a direct message to yourself.")
 
-        direct_channel = Channel.objects.filter(
-            channel_type="direct",
-            members__user__id__in=[sender.id, recipient.id]
-        ).annotate(
-            member_count=Count('members')
-        ).filter(member_count=2).first()
+        key = direct_channel_key(sender.id, recipient.id)
+        direct_channel = Channel.objects.filter(direct_key=key).first()
 
         if not direct_channel:
 
             default_bucket, _ = Bucket.objects.get_or_create(name="Direct Messages")
 
             with transaction.atomic():
-                direct_channel = Channel.objects.create(
-                    name=f"Direct: {sender.name} & {recipient.name}",
-                    channel_type="direct",
-                    bucket=default_bucket
-                )
-
-                ChannelMember.objects.create(channel=direct_channel, user=sender,invite_accepted=True)
-                ChannelMember.objects.create(channel=direct_channel, user=recipient,invite_accepted=True)
-
-                BucketMember.objects.get_or_create(
-                    bucket=default_bucket,
-                    user=sender,
-                    defaults={'role': 'member'}
-                )
-                BucketMember.objects.get_or_create(
-                    bucket=default_bucket,
-                    user=recipient,
-                    defaults={'role': 'member'}
+                # The unique direct_key makes concurrent first messages agree on one channel:
+                # the loser's insert fails and get_or_create returns the winner's row.
+                direct_channel, created = Channel.objects.get_or_create(
+                    direct_key=key,
+                    defaults={
+                        'name': f"Direct: {sender.name} & {recipient.name}",
+                        'channel_type': "direct",
+                        'bucket': default_bucket,
+                    }
                 )
+                if created:
+                    ChannelMember.objects.create(channel=direct_channel, user_id=sender.id,invite_accepted=True)
+                    ChannelMember.objects.create(channel=direct_channel, user=recipient,invite_accepted=True)
+
+                    joined = []
+                    for user in (sender, recipient):
+                        _, new_member = BucketMember.objects.get_or_create(
+                            bucket=default_bucket,
+                            user_id=user.id,
+                            defaults={'role': 'member'}
+                        )
+                        if new_member:
+                            joined.append(user.id)
+                    bump(BUCKET_CHANNELS, [default_bucket.id])
+                    if joined:
+                        bucket_members_changed(default_bucket.id, joined)
+
+        create_message(sender_id=sender.id, channel=direct_channel, message_text=message_text)
 
         return {
             "message": "Message sent successfully.",
@@ -760,8 +978,11 @@ def create_direct_channel_and_send_message(request):
     if not email or not message_text:
         return Response({"error": "Email and message are required."}, status=status.HTTP_400_BAD_REQUEST)
 
+    sender = profiles.get(request.user)
+    if sender is None:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
     try:
-        sender = User.objects.get(id=request.user)
         result = create_direct_channel_and_send_message_helper(email, message_text, sender)
         return Response(result, status=status.HTTP_201_CREATED)
     except ValueError as e:
@@ -0,0 +1,103 @@
+import json
+import uuid
+import zlib
+from collections import OrderedDict
+import msgpack
+
+# WebSocket subprotocols, in server preference order. A client that offers none of them
+# gets the original text JSON frames.
+MSGPACK_DEFLATE = 'hatch.msgpack.deflate'
+MSGPACK = 'hatch.msgpack'
+JSON = 'hatch.json'
+SUBPROTOCOLS = (MSGPACK_DEFLATE, MSGPACK, JSON)
+
+# Largest client frame accepted once inflated; chat messages are a few KB at most
+MAX_FRAME_BYTES = 1024 * 1024
+
+
+def negotiate(offered):
+    """Pick the subprotocol for a connection from the client's offer, or None for plain JSON."""
+    for protocol in SUBPROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return None
+
+
+def deflate(data):
+    # Raw deflate, so browsers can read it with DecompressionStream('deflate-raw')
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def inflate(data):
+    """Inflate a client frame, refusing output past MAX_FRAME_BYTES (deflate bombs)."""
+    decompressor = zlib.decompressobj(-15)
+    inflated = decompressor.decompress(data, MAX_FRAME_BYTES)
+    if decompressor.unconsumed_tail:
+        raise FrameError('Frame too large')
+    return inflated
+
+
+def encode(payload, protocol):
+    """One frame for one connection: str for JSON, bytes for the MessagePack protocols."""
+    if protocol == MSGPACK_DEFLATE:
+        return deflate(msgpack.packb(payload))
+    if protocol == MSGPACK:
+        return msgpack.packb(payload)
+    return json.dumps(payload)
+
+
+def broadcast_event(payload):
+    """
+    A channel-layer event for group_send: the client-visible payload (including its "type") and
+    an id under which each receiving process caches the frames it encodes (see FrameCache).
+    """
+    return {"type": payload["type"], "id": uuid.uuid4().hex, "payload": payload}
+
+
+class FrameCache:
+    """
+    Frames of recent broadcast events by (event id, protocol). Every socket in a process that
+    receives the same event shares one encoding, and only the protocols its sockets negotiated
+    are encoded at all. Used from the event loop only.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._frames = OrderedDict()
+
+    def get(self, event, protocol):
+        key = (event["id"], protocol)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = encode(event["payload"], protocol)
+            if len(self._frames) > self.max_size:
+                self._frames.popitem(last=False)
+        return frame
+
+
+frames = FrameCache()
+
+
+class FrameError(ValueError):
+    """An incoming frame that could not be decoded; the message is safe to show the client."""
+
+
+def decode(text_data, bytes_data, protocol):
+    """Parse an incoming frame. Text frames are always JSON; binary frames follow the subprotocol."""
+    if text_data is not None:
+        try:
+            return json.loads(text_data)
+        except json.JSONDecodeError:
+            raise FrameError('Invalid JSON format')
+    if protocol not in (MSGPACK, MSGPACK_DEFLATE):
+        raise FrameError('Binary frames need a MessagePack subprotocol')
+    if protocol == MSGPACK_DEFLATE:
+        try:
+            bytes_data = inflate(bytes_data)
+        except zlib.error:
+            raise FrameError('Invalid MessagePack frame')
+    try:
+        return msgpack.unpackb(bytes_data)
+    except (ValueError, msgpack.UnpackException):
+        raise FrameError('Invalid MessagePack frame')
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from hatch_app.features.chat.models import Bucket
 from hatch_app.features.user.models import User
 
@@ -14,6 +15,17 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['community', 'assigned_to', 'due_date'], name='task_comm_assignee_due_idx'),
+            models.Index(fields=['community', 'assigned_by', 'due_date'], name='task_comm_assigner_due_idx'),
+            models.Index(
+                fields=['assigned_to', 'due_date'],
+                name='task_open_assignee_due_idx',
+                condition=Q(status__in=['open', 'in-progress']),
+            ),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -23,6 +35,11 @@ class Notification(models.Model):
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ]
+
     def __str__(self):
         if self.task:
             return f"Notification for {self.user.name} about {self.task.title}"
@@ -11,10 +11,11 @@ from django.utils import timezone
 from django.utils.timezone import make_aware
 from datetime import datetime
 from hatch_app.decorators import token_required
-from hatch_app.features.chat.models import Bucket,BucketMember,Message,Channel
+from hatch_app.features.chat.models import Bucket,BucketMember,Channel
+from hatch_app.features.chat.archive import archived_last_messages
 from hatch_app.features.user.models import User
 from django.shortcuts import get_object_or_404
-from django.db.models import OuterRef, Subquery, Count
+from django.db.models import F
 
 @api_view(['GET'])
 @token_required
@@ -455,29 +456,23 @@ def get_community_settings(request, community_id):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        direct_channels = Channel.objects.filter(
+        direct_channels_with_messages = Channel.objects.filter(
             members__user = user,
             bucket=community,
-        )
-        
-        latest_messages = Message.objects.filter(
-            channel=OuterRef('id')
-        ).order_by('-created_at')
-
-        direct_channels_with_messages = direct_channels.annotate(
-            latest_message=Subquery(latest_messages.values('message_text')[:1]),
-            latest_sender=Subquery(latest_messages.values('sender__name')[:1]),
-            latest_sender_id=Subquery(latest_messages.values('sender__id')[:1]),
-            latest_timestamp=Subquery(latest_messages.values('created_at')[:1])
-        ).order_by('-latest_timestamp')
+        ).select_related('last_message', 'last_message_sender').order_by(F('last_message_at').desc(nulls_last=True))
+        direct_channels_with_messages = list(direct_channels_with_messages)
+        archived_texts = archived_last_messages([
+            channel.id for channel in direct_channels_with_messages
+            if channel.last_message is None and channel.last_message_at
+        ])
 
         message_list = [{
             'channel_id': channel.id,
             'channel_name': channel.name,
-            'latest_message': channel.latest_message,
-            'latest_sender': channel.latest_sender,
-            'latest_sender_id': channel.latest_sender_id,
-            'timestamp': channel.latest_timestamp
+            'latest_message': channel.last_message.message_text if channel.last_message else archived_texts.get(channel.id),
+            'latest_sender': channel.last_message_sender.name if channel.last_message_sender else None,
+            'latest_sender_id': channel.last_message_sender_id,
+            'timestamp': channel.last_message_at
         } for channel in direct_channels_with_messages]
 
         tasks = Task.objects.filter(
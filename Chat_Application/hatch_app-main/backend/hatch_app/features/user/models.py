@@ -13,3 +13,13 @@ class User(models.Model):
 
     def __str__(self):
         return f"{self.name},{self.id}"
+
+class DeviceToken(models.Model):
+    """FCM registration token for one of a user's devices."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='device_tokens')
+    token = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Device of {self.user_id}"
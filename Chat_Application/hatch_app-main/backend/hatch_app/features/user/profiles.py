@@ -0,0 +1,111 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from hatch_app.firebase_auth import TTLCache
+from .models import User
+
+PROFILE_FIELDS = ('id', 'name', 'email', 'profile_picture', 'status', 'active')
+
+
+class UserProfile:
+    """Display data of a user, as served from the profile cache. Read-only stand-in for User."""
+
+    __slots__ = PROFILE_FIELDS
+
+    def __init__(self, **fields):
+        for field in PROFILE_FIELDS:
+            setattr(self, field, fields[field])
+
+    @property
+    def pk(self):
+        return self.id
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in PROFILE_FIELDS}
+
+
+class UserProfileCache:
+    """
+    Two-tier read-through cache of user display data.
+
+    An in-process LRU answers repeat lookups without any I/O; behind it the shared Django cache
+    (Redis) holds profiles for every worker, and misses fall through to one User query per batch.
+    forget() drops a user from Redis and from this process; other processes may serve their LRU
+    copy for up to `local_ttl` seconds, which is why that TTL is kept short.
+
+    Shared entries are keyed by a per-user version that forget() bumps. A reader that loaded the
+    old row from the database before a concurrent forget() then writes it under the old version,
+    where no one looks, instead of putting it back for `shared_ttl` seconds.
+    """
+
+    def __init__(self, local_size, local_ttl, shared_ttl, prefix='profile'):
+        self.local = TTLCache(local_size)
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.prefix = prefix
+
+    def _version_key(self, user_id):
+        return f"{self.prefix}-v:{user_id}"
+
+    def _key(self, user_id, version):
+        return f"{self.prefix}:{user_id}:{version}"
+
+    def peek(self, user_id):
+        """The profile if this process has it, without any I/O; else None."""
+        return self.local.get(user_id)
+
+    def get(self, user_id):
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        """{user_id: UserProfile} for the given ids; unknown ids are left out."""
+        profiles = {}
+        missing = []
+        for user_id in set(user_ids):
+            profile = self.local.get(user_id)
+            if profile is None:
+                missing.append(user_id)
+            else:
+                profiles[user_id] = profile
+        if not missing:
+            return profiles
+
+        # Versions are read before the database, so a forget() in between makes our write-back moot
+        versions = cache.get_many([self._version_key(user_id) for user_id in missing])
+        keys = {user_id: self._key(user_id, versions.get(self._version_key(user_id), 0)) for user_id in missing}
+        shared = cache.get_many(list(keys.values()))
+        found = {fields['id']: fields for fields in shared.values()}
+        unknown = [user_id for user_id in missing if user_id not in found]
+        if unknown:
+            loaded = {fields['id']: fields for fields in User.objects.filter(id__in=unknown).values(*PROFILE_FIELDS)}
+            if loaded:
+                cache.set_many({keys[user_id]: fields for user_id, fields in loaded.items()}, self.shared_ttl)
+            found.update(loaded)
+
+        expires_at = time.time() + self.local_ttl
+        for user_id, fields in found.items():
+            profile = UserProfile(**fields)
+            self.local.set(user_id, profile, expires_at)
+            profiles[user_id] = profile
+        return profiles
+
+    def forget(self, user_id):
+        """Drop a user everywhere this process can reach, after the current transaction commits."""
+        def drop():
+            self.local.delete(user_id)
+            # Versions never expire: one that lapsed back to 0 could revive an old entry
+            key = self._version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                if not cache.add(key, 1, timeout=None):
+                    cache.incr(key)
+        transaction.on_commit(drop)
+
+
+profiles = UserProfileCache(
+    local_size=settings.USER_PROFILE_LOCAL_SIZE,
+    local_ttl=settings.USER_PROFILE_LOCAL_TTL,
+    shared_ttl=settings.USER_PROFILE_CACHE_TTL,
+)
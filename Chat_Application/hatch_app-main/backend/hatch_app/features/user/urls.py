@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework import routers
-from .views import create_user, get_user, update_user, delete_user
+from .views import create_user, get_user, update_user, delete_user, register_device_token
 
 router = routers.DefaultRouter()
 
 urlpatterns = [
   path('', include(router.urls)),
   path('create/', create_user, name='create_user'),
+  path('devices/register/', register_device_token, name='register_device_token'),
   path('<str:uid>/', get_user, name='get_user'),
   path('<str:uid>/update/', update_user, name='update_user'),
   path('<str:uid>/delete/', delete_user, name='delete_user'),
@@ -2,7 +2,10 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .models import User
+from hatch_app.decorators import token_required
+from .models import User, DeviceToken
+from .profiles import profiles
+from hatch_app.features.chat.versions import user_profile_changed
 from .serializers import UserSerializer
 
 @api_view(['POST'])
@@ -10,7 +13,9 @@ def create_user(request):
     data = request.data
     serializer = UserSerializer(data=data)
     if serializer.is_valid():
-        serializer.save()   
+        user = serializer.save()
+        # An account re-created under the same uid may still have its old profile cached
+        profiles.forget(user.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     print(serializer.errors)
@@ -41,6 +46,9 @@ def update_user(request, uid):
         elif field == 'profile_picture':
             user.profile_picture = value
         user.save()
+        profiles.forget(user.id)
+        if field == 'name':
+            user_profile_changed(user.id)
         return Response({'message': 'User field updated successfully'}, status=status.HTTP_200_OK)
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -50,6 +58,17 @@ def delete_user(request, uid):
     try:
         user = User.objects.get(id=uid)
         user.delete()
+        profiles.forget(uid)
         return Response({'message': 'User deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
     except User.DoesNotExist:
-        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['POST'])
+@token_required
+def register_device_token(request):
+    """Register (or move to the current user) an FCM token used for push notifications."""
+    token = request.data.get('token')
+    if not token:
+        return Response({'error': 'Token is required'}, status=status.HTTP_400_BAD_REQUEST)
+    DeviceToken.objects.update_or_create(token=token, defaults={'user_id': request.user})
+    return Response({'message': 'Device registered successfully'}, status=status.HTTP_200_OK)
@@ -0,0 +1,196 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+
+
+class AuthenticationError(ValueError):
+    pass
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a per-entry deadline."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class GoogleKeySource:
+    """
+    Firebase signing certificates, cached for the max-age Google sends.
+    An unknown `kid` forces one refresh so key rotation is picked up immediately.
+    """
+
+    def __init__(self, url=GOOGLE_CERTS_URL, min_refresh_interval=30):
+        self.url = url
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        response = requests.get(self.url, timeout=5)
+        response.raise_for_status()
+        max_age = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        self._keys = {
+            kid: x509.load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in response.json().items()
+        }
+        self._fetched_at = time.time()
+        self._expires_at = self._fetched_at + (int(max_age.group(1)) if max_age else 3600)
+
+    def get_key(self, kid):
+        with self._lock:
+            now = time.time()
+            stale = now >= self._expires_at
+            rotated = kid not in self._keys and now - self._fetched_at >= self.min_refresh_interval
+            if stale or rotated:
+                self._refresh()
+            return self._keys.get(kid)
+
+
+class LocalKeySource:
+    """In-process RSA key pair standing in for Google's keys, for tests and local load runs."""
+
+    def __init__(self, kid='local'):
+        self.kid = kid
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def get_key(self, kid):
+        return self._private_key.public_key() if kid == self.kid else None
+
+    def sign(self, uid, project_id=None, lifetime=3600, **claims):
+        project_id = project_id or settings.FIREBASE_PROJECT_ID
+        now = int(time.time())
+        payload = {
+            'iss': f'https://securetoken.google.com/{project_id}',
+            'aud': project_id,
+            'sub': uid,
+            'uid': uid,
+            'iat': now,
+            'auth_time': now,
+            'exp': now + lifetime,
+            **claims,
+        }
+        key = self._private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        return jwt.encode(payload, key, algorithm='RS256', headers={'kid': self.kid})
+
+
+class TokenVerifier:
+    """Verifies Firebase ID tokens and caches the decoded claims by token hash until expiry."""
+
+    def __init__(self, key_source, project_id, cache_ttl=300, cache_size=10000):
+        self.key_source = key_source
+        self.project_id = project_id
+        self.cache_ttl = cache_ttl
+        self.cache = TTLCache(cache_size)
+
+    def _decode(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError:
+            raise AuthenticationError('Invalid token')
+        key = self.key_source.get_key(kid)
+        if key is None:
+            raise AuthenticationError('Invalid token')
+        try:
+            claims = jwt.decode(
+                token,
+                key=key,
+                algorithms=['RS256'],
+                audience=self.project_id,
+                issuer=f'https://securetoken.google.com/{self.project_id}',
+                options={'require': ['exp', 'iat', 'sub']},
+            )
+        except jwt.InvalidTokenError:
+            raise AuthenticationError('Invalid token')
+        if not claims.get('sub'):
+            raise AuthenticationError('Invalid token')
+        claims['uid'] = claims['sub']
+        return claims
+
+    def verify(self, token):
+        key = hashlib.sha256(token.encode()).hexdigest()
+        claims = self.cache.get(key)
+        if claims is None:
+            claims = self._decode(token)
+            self.cache.set(key, claims, min(claims['exp'], time.time() + self.cache_ttl))
+        return claims
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_verifier():
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = TokenVerifier(
+                    GoogleKeySource(getattr(settings, 'FIREBASE_CERTS_URL', GOOGLE_CERTS_URL)),
+                    settings.FIREBASE_PROJECT_ID,
+                    cache_ttl=settings.FIREBASE_TOKEN_CACHE_TTL,
+                    cache_size=settings.FIREBASE_TOKEN_CACHE_SIZE,
+                )
+    return _verifier
+
+
+def set_verifier(verifier):
+    """Swap the process-wide verifier, e.g. for one backed by a LocalKeySource."""
+    global _verifier
+    _verifier = verifier
+
+
+def authenticate(token, expected_uid=None):
+    """Return the verified claims for `token`; shared by token_required and the WebSocket middleware."""
+    if not token:
+        raise AuthenticationError('Missing token')
+    claims = get_verifier().verify(token)
+    if expected_uid and claims['uid'] != expected_uid:
+        raise AuthenticationError('Invalid UID')
+    return claims
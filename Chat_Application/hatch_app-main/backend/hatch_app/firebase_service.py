@@ -24,4 +24,23 @@ def send_push_notification(token, title, body, data=None):
         return True
     except Exception as e:
         print(f"Error sending notification: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def send_multicast_notification(tokens, title, body, data=None):
+    """Send one notification to up to 500 tokens. Returns the tokens FCM reports as no longer registered."""
+    initialize_firebase()
+
+    message = messaging.MulticastMessage(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        tokens=tokens,
+        data=data or {}
+    )
+
+    response = messaging.send_each_for_multicast(message)
+    return [
+        token for token, result in zip(tokens, response.responses)
+        if not result.success and isinstance(result.exception, messaging.UnregisteredError)
+    ]
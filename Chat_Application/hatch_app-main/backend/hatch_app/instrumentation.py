@@ -0,0 +1,163 @@
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from channels.exceptions import StopConsumer
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from hatch_app import metrics
+
+# Per-route SQL count, SQL time, latency and repeated-query (N+1) detection, for HTTP requests
+# (QueryMetricsMiddleware) and WebSocket events (instrument_consumer). Every database connection
+# gets the record_query execute wrapper when it is opened; it reports to the recorder of the
+# current context, which sync_to_async carries into the threads that run the queries.
+
+_recorder = ContextVar('query_recorder', default=None)
+
+_IN_LIST = re.compile(r'\bIN\s*\(\s*%s(?:\s*,\s*%s)*\s*\)', re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """The query's shape: literals and IN lists of any length compare equal."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERAL.sub('?', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds):
+        shape = fingerprint(sql)
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.fingerprints[shape] += 1
+
+    def repeated(self, threshold):
+        """{fingerprint: count} for the query shapes run at least `threshold` times, most first."""
+        return {shape: count for shape, count in self.fingerprints.most_common() if count >= threshold}
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None or recorder.closed:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record(sql, time.perf_counter() - started)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: wrap every new connection's queries."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def recording(route, method):
+    """
+    Record the queries run inside the block as one request on `route`. The block may set the
+    yielded dict's 'route' (once known) and 'status'; a block that raises is reported as 'error'.
+    """
+    recorder = QueryRecorder()
+    token = _recorder.set(recorder)
+    started = time.perf_counter()
+    outcome = {'route': route, 'status': 'error'}
+    try:
+        yield outcome
+    finally:
+        _recorder.reset(token)
+        # Tasks spawned inside the block keep this context; their later queries are not counted
+        recorder.closed = True
+        finish(outcome['route'], method, outcome['status'], recorder, time.perf_counter() - started)
+
+
+def finish(route, method, status, recorder, seconds):
+    route_seconds.observe(seconds, route=route, method=method)
+    route_queries.observe(recorder.count, route=route, method=method)
+    route_sql_seconds.observe(recorder.seconds, route=route, method=method)
+    repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+    if repeated:
+        route_repeated.inc(route=route, method=method)
+
+    if random.random() < settings.QUERY_LOG_SAMPLE_RATE:
+        shapes = '; '.join(f"{count}x {shape[:120]}" for shape, count in list(repeated.items())[:3])
+        print(
+            f"[route] {method} {route} status={status} time={seconds * 1000:.1f}ms "
+            f"queries={recorder.count} sql={recorder.seconds * 1000:.1f}ms"
+            + (f" repeated: {shapes}" if shapes else "")
+        )
+
+
+def _route(request):
+    # The URL pattern, not the path, keeps one series per endpoint
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+class QueryMetricsMiddleware:
+    """Put first in MIDDLEWARE so the latency covers the whole stack."""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with recording('unmatched', request.method) as outcome:
+            response = self.get_response(request)
+            outcome.update(route=_route(request), status=response.status_code)
+        return response
+
+
+def instrument_consumer(consumer_class):
+    """
+    Consumer subclass that records each client event (connect, receive, disconnect) as a request
+    on `ws <ConsumerName>`. Channel-layer broadcasts are not recorded: they fan out to every socket.
+    Use as a class decorator, or wrap a consumer in routing: instrument_consumer(Consumer).as_asgi().
+    """
+    if not settings.QUERY_METRICS_ENABLED:
+        return consumer_class
+    route = f"ws {consumer_class.__name__}"
+
+    class Instrumented(consumer_class):
+        async def dispatch(self, message):
+            if not message['type'].startswith('websocket.'):
+                return await super().dispatch(message)
+            with recording(route, message['type']) as outcome:
+                try:
+                    await super().dispatch(message)
+                except StopConsumer:
+                    # How a consumer finishes after websocket.disconnect
+                    outcome['status'] = 'ok'
+                    raise
+                outcome['status'] = 'ok'
+
+    Instrumented.__name__ = Instrumented.__qualname__ = consumer_class.__name__
+    return Instrumented
+
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+route_seconds = metrics.Histogram('hatch_route_seconds', 'Request or WebSocket event duration by route.', ['route', 'method'])
+route_queries = metrics.Histogram(
+    'hatch_route_queries', 'SQL queries per request or WebSocket event by route.', ['route', 'method'], buckets=QUERY_BUCKETS,
+)
+route_sql_seconds = metrics.Histogram('hatch_route_sql_seconds', 'Time spent in SQL per request by route.', ['route', 'method'])
+route_repeated = metrics.Counter(
+    'hatch_route_repeated_queries', 'Requests that ran one query shape QUERY_REPEAT_THRESHOLD+ times (likely N+1).',
+    ['route', 'method'],
+)
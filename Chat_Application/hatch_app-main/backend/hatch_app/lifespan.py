@@ -0,0 +1,31 @@
+async def shutdown():
+    """Persist and deliver what the WebSocket paths still hold in memory before the process exits."""
+    from hatch_app.features.chat.consumers import push_pipeline
+    from hatch_app.features.chat.persistence import message_writer
+
+    try:
+        await message_writer.close()
+    except Exception as e:
+        print(f"Error flushing buffered messages on shutdown: {e}")
+    try:
+        await push_pipeline.drain()
+    except Exception as e:
+        print(f"Error delivering pending push notifications on shutdown: {e}")
+
+
+class LifespanApp:
+    """
+    ASGI lifespan handler (uvicorn, hypercorn). Servers that do not send lifespan events, such as
+    daphne, skip it; the write-behind buffer then still gets its atexit flush, but coalesced
+    pushes still waiting for their window are lost.
+    """
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,5 @@
+# Load-test harness for the hot REST endpoints and ChatConsumer, run against a local PostgreSQL,
+# Redis and a server started with AUTH_TRUST_UID_HEADER=True:
+#   manage.py loadtest_seed                  synthetic users, buckets, channels, messages, tasks
+#   manage.py loadtest --save-baseline FILE  record throughput, latency and queries per request
+#   manage.py loadtest --baseline FILE       fail when a run regresses against that record
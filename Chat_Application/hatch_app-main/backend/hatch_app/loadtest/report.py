@@ -0,0 +1,82 @@
+import json
+import statistics
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Result:
+    """Latencies (seconds) and errors collected by one scenario over `elapsed` seconds."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self.queries = []
+        self.extra = {}
+
+    def summary(self):
+        total = len(self.latencies) + self.errors
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'error_rate': self.errors / total if total else 0.0,
+            'throughput': len(self.latencies) / self.elapsed if self.elapsed else 0.0,
+            'p50_ms': percentile(self.latencies, 0.5) * 1000,
+            'p95_ms': percentile(self.latencies, 0.95) * 1000,
+            'p99_ms': percentile(self.latencies, 0.99) * 1000,
+            'max_ms': max(self.latencies, default=0.0) * 1000,
+            'queries': statistics.median(self.queries) if self.queries else None,
+            **self.extra,
+        }
+
+
+def table(summaries):
+    lines = [f"{'scenario':<26} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'queries':>8}"]
+    for name, summary in summaries.items():
+        queries = '-' if summary['queries'] is None else f"{summary['queries']:g}"
+        lines.append(
+            f"{name:<26} {summary['throughput']:>9.1f} {summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} "
+            f"{summary['p99_ms']:>8.1f} {summary['max_ms']:>8.1f} {summary['errors']:>7} {queries:>8}"
+        )
+    return '\n'.join(lines)
+
+
+def save_baseline(path, summaries, config):
+    with open(path, 'w') as f:
+        json.dump({'config': config, 'scenarios': summaries}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(summaries, baseline, tolerance):
+    """
+    Compare a run with a saved baseline. Latency and throughput may drift by `tolerance` (a
+    fraction); queries per request, lost broadcasts and the error rate (beyond one point) may
+    not grow at all.
+    Returns one description per regression.
+    """
+    found = []
+    for name, summary in summaries.items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        if summary['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            found.append(f"{name}: p99 {summary['p99_ms']:.1f} ms, baseline {base['p99_ms']:.1f} ms")
+        if summary['throughput'] < base['throughput'] * (1 - tolerance):
+            found.append(f"{name}: {summary['throughput']:.1f} req/s, baseline {base['throughput']:.1f} req/s")
+        if summary['queries'] is not None and base['queries'] is not None and summary['queries'] > base['queries']:
+            found.append(f"{name}: {summary['queries']:g} queries per request, baseline {base['queries']:g}")
+        if summary['error_rate'] > base['error_rate'] + 0.01:
+            found.append(f"{name}: error rate {summary['error_rate']:.1%}, baseline {base['error_rate']:.1%}")
+        if summary.get('lost', 0) > base.get('lost', 0):
+            found.append(f"{name}: {summary['lost']} broadcasts lost, baseline {base.get('lost', 0)}")
+    return found
@@ -0,0 +1,79 @@
+import asyncio
+import random
+import time
+import httpx
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from .report import Result
+
+# Each scenario picks one request: (user id, path under /api/)
+
+
+def fetch_messages(rng, users, memberships):
+    user_id, channel_id = rng.choice(memberships)
+    return user_id, f'chat/channels/{channel_id}/messages/'
+
+
+def get_community_messages(rng, users, memberships):
+    return rng.choice(users), 'chat/direct-messages/communities/'
+
+
+def get_all_communities_task(rng, users, memberships):
+    return rng.choice(users), 'task/get_all_tasks/'
+
+
+SCENARIOS = {
+    'fetch_messages': fetch_messages,
+    'get_community_messages': get_community_messages,
+    'get_all_communities_task': get_all_communities_task,
+}
+
+
+async def run(name, base_url, users, memberships, concurrency, duration, random_seed=0):
+    """Closed loop: `concurrency` workers send requests back to back for `duration` seconds."""
+    scenario = SCENARIOS[name]
+    result = Result(name)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(rng, client, stop_at):
+        while time.monotonic() < stop_at:
+            user_id, path = scenario(rng, users, memberships)
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, headers={'UID': user_id})
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.monotonic()
+        stop_at = started + duration
+        await asyncio.gather(*[
+            worker(random.Random(f'{random_seed}-{n}'), client, stop_at) for n in range(concurrency)
+        ])
+        result.elapsed = time.monotonic() - started
+    return result
+
+
+@override_settings(AUTH_TRUST_UID_HEADER=True)
+def count_queries(name, users, memberships, samples, random_seed=0):
+    """
+    Queries per request, measured in this process through the full middleware and view stack.
+    Each sampled request is sent once to warm the caches, then again under a query capture.
+    """
+    scenario = SCENARIOS[name]
+    rng = random.Random(random_seed)
+    client = Client()
+    counts = []
+    for _ in range(samples):
+        user_id, path = scenario(rng, users, memberships)
+        client.get(f'/api/{path}', HTTP_UID=user_id)
+        with CaptureQueriesContext(connection) as queries:
+            client.get(f'/api/{path}', HTTP_UID=user_id)
+        counts.append(len(queries))
+    return counts
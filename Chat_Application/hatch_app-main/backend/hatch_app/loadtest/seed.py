@@ -0,0 +1,131 @@
+import random
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from hatch_app.features.chat import partitions
+from hatch_app.features.chat.models import Bucket, BucketMember, Channel, ChannelMember, Message
+from hatch_app.features.tasks.models import Task
+from hatch_app.features.user.models import User
+
+# Seeded rows are recognised by these prefixes, so they can be found and cleared again
+USER_PREFIX = 'load-'
+BUCKET_PREFIX = 'Load bucket '
+
+WORDS = (
+    'standup', 'deploy', 'review', 'lunch', 'budget', 'design', 'release', 'meeting', 'draft',
+    'ticket', 'call', 'today', 'tomorrow', 'please', 'thanks', 'done', 'blocked', 'shipping',
+)
+TASK_STATUSES = ('open', 'in-progress', 'completed')
+
+
+def clear():
+    """Delete everything a previous seed created. Returns (buckets, users) deleted."""
+    buckets = Bucket.objects.filter(name__startswith=BUCKET_PREFIX)
+    Message.objects.filter(channel__bucket__in=buckets).delete()
+    bucket_count = buckets.count()
+    buckets.delete()
+    user_count, _ = User.objects.filter(id__startswith=USER_PREFIX).delete()
+    return bucket_count, user_count
+
+
+def _ensure_partitions(oldest, newest):
+    if not partitions.is_partitioned():
+        return
+    month = partitions.month_start(oldest)
+    while month <= newest:
+        partitions.create_partition(month)
+        month = partitions.add_months(month, 1)
+
+
+def seed(users=200, buckets=10, members_per_bucket=40, channels_per_bucket=4, messages_per_channel=300,
+         tasks_per_bucket=200, days=30, random_seed=0):
+    """
+    Replace the seeded data set. Every bucket member joins every community channel of the bucket
+    and has read it up to its latest message. Returns a dict of row counts.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    members_per_bucket = min(members_per_bucket, users)
+    clear()
+    _ensure_partitions(now - timedelta(days=days), now)
+
+    with transaction.atomic():
+        user_ids = [f'{USER_PREFIX}{n}' for n in range(users)]
+        User.objects.bulk_create([
+            User(id=user_id, name=f'Load User {n}', email=f'{user_id}@hatch.local')
+            for n, user_id in enumerate(user_ids)
+        ], batch_size=1000)
+
+        bucket_rows = Bucket.objects.bulk_create([Bucket(name=f'{BUCKET_PREFIX}{n}') for n in range(buckets)])
+        members = {bucket.id: rng.sample(user_ids, members_per_bucket) for bucket in bucket_rows}
+        BucketMember.objects.bulk_create([
+            BucketMember(bucket_id=bucket_id, user_id=user_id, role='admin' if n == 0 else 'member', invite_accepted=True)
+            for bucket_id, user_list in members.items()
+            for n, user_id in enumerate(user_list)
+        ], batch_size=5000)
+
+        channels = Channel.objects.bulk_create([
+            Channel(bucket_id=bucket.id, name=f'channel {n}', channel_type='community')
+            for bucket in bucket_rows
+            for n in range(channels_per_bucket)
+        ])
+        ChannelMember.objects.bulk_create([
+            ChannelMember(channel_id=channel.id, user_id=user_id, invite_accepted=True)
+            for channel in channels
+            for user_id in members[channel.bucket_id]
+        ], batch_size=5000)
+
+        span = timedelta(days=days).total_seconds()
+        messages = []
+        for channel in channels:
+            for offset in sorted(rng.uniform(0, span) for _ in range(messages_per_channel)):
+                messages.append(Message(
+                    channel_id=channel.id,
+                    sender_id=rng.choice(members[channel.bucket_id]),
+                    message_text=' '.join(rng.choices(WORDS, k=rng.randint(3, 20))),
+                    created_at=now - timedelta(seconds=span - offset),
+                ))
+        Message.objects.bulk_create(messages, batch_size=5000)
+
+        Task.objects.bulk_create([
+            Task(
+                community_id=bucket_id,
+                assigned_by_id=rng.choice(user_list),
+                assigned_to_id=rng.choice(user_list),
+                title=' '.join(rng.choices(WORDS, k=4)),
+                status=rng.choice(TASK_STATUSES),
+                due_date=now + timedelta(hours=rng.uniform(-14 * 24, 14 * 24)),
+            )
+            for bucket_id, user_list in members.items()
+            for _ in range(tasks_per_bucket)
+        ], batch_size=5000)
+
+        channel_ids = [channel.id for channel in channels]
+        latest = Message.objects.filter(channel=OuterRef('pk')).order_by('-created_at', '-id')
+        Channel.objects.filter(id__in=channel_ids).update(
+            last_message=Subquery(latest.values('id')[:1]),
+            last_message_sender=Subquery(latest.values('sender_id')[:1]),
+            last_message_at=Subquery(latest.values('created_at')[:1]),
+        )
+        channel = Channel.objects.filter(id=OuterRef('channel_id'))
+        ChannelMember.objects.filter(channel_id__in=channel_ids).update(
+            last_read_message=Subquery(channel.values('last_message_id')[:1]),
+            last_read_at=Subquery(channel.values('last_message_at')[:1]),
+        )
+
+    return {
+        'users': users,
+        'buckets': buckets,
+        'channels': len(channels),
+        'messages': len(messages),
+        'tasks': buckets * tasks_per_bucket,
+    }
+
+
+def targets():
+    """What the scenarios can ask for: the seeded users and their (user id, channel id) memberships."""
+    memberships = list(ChannelMember.objects.filter(
+        user_id__startswith=USER_PREFIX, channel__channel_type='community'
+    ).order_by('channel_id', 'user_id').values_list('user_id', 'channel_id'))
+    return sorted({user_id for user_id, _ in memberships}), memberships
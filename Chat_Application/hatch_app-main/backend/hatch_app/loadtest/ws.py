@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+import aiohttp
+from .report import Result
+
+MARKER = 'load '
+
+
+def _channels(memberships, count):
+    """The first `count` seeded channels with their members."""
+    members = {}
+    for user_id, channel_id in memberships:
+        members.setdefault(channel_id, []).append(user_id)
+    return list(members.items())[:count]
+
+
+async def run(ws_url, memberships, channels, sockets_per_channel, senders_per_channel, rate, duration, drain=2.0):
+    """
+    Open `sockets_per_channel` ChatConsumer sockets in each of `channels` channels; the first
+    `senders_per_channel` of them also send `rate` messages per second for `duration` seconds.
+    Latency is send-to-receive time of each broadcast at every socket, including the sender's own.
+    """
+    result = Result('ws_chat')
+    sent = {}
+    connect_failures = 0
+    sockets = []
+
+    async def connect(session, channel_id, user_id):
+        nonlocal connect_failures
+        try:
+            socket = await session.ws_connect(
+                f'{ws_url}ws/chat/{channel_id}/?uid={user_id}', protocols=('hatch.json',), heartbeat=30
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            connect_failures += 1
+            return
+        sockets.append((channel_id, user_id, socket))
+
+    async def receive(socket):
+        async for frame in socket:
+            if frame.type != aiohttp.WSMsgType.TEXT:
+                break
+            payload = json.loads(frame.data)
+            if payload.get('error'):
+                result.errors += 1
+            elif payload.get('type') == 'chat.message' and payload['message'].startswith(MARKER):
+                result.latencies.append(time.time() - float(payload['message'].rsplit(' ', 1)[1]))
+
+    async def send(channel_id, user_id, socket, stop_at):
+        seq = 0
+        while time.monotonic() < stop_at:
+            await socket.send_str(json.dumps({
+                'message_text': f'{MARKER}{seq} {time.time():.6f}',
+                'channel_id': channel_id,
+                'sender_id': user_id,
+            }))
+            sent[channel_id] = sent.get(channel_id, 0) + 1
+            seq += 1
+            await asyncio.sleep(1 / rate)
+
+    async with aiohttp.ClientSession() as session:
+        connects = []
+        for channel_id, members in _channels(memberships, channels):
+            connects += [connect(session, channel_id, members[n % len(members)]) for n in range(sockets_per_channel)]
+        await asyncio.gather(*connects)
+
+        receivers = [asyncio.create_task(receive(socket)) for _, _, socket in sockets]
+        senders = []
+        by_channel = {}
+        for channel_id, user_id, socket in sockets:
+            by_channel.setdefault(channel_id, []).append((user_id, socket))
+
+        started = time.monotonic()
+        stop_at = started + duration
+        for channel_id, channel_sockets in by_channel.items():
+            senders += [send(channel_id, user_id, socket, stop_at) for user_id, socket in channel_sockets[:senders_per_channel]]
+        await asyncio.gather(*senders)
+        await asyncio.sleep(drain)
+        result.elapsed = time.monotonic() - started
+
+        for _, _, socket in sockets:
+            await socket.close()
+        await asyncio.gather(*receivers, return_exceptions=True)
+
+    # Every socket in a channel should see every message sent to it
+    expected = sum(count * len(by_channel[channel_id]) for channel_id, count in sent.items())
+    result.errors += connect_failures
+    result.extra = {
+        'sockets': len(sockets),
+        'sent': sum(sent.values()),
+        'delivered': len(result.latencies),
+        'lost': max(0, expected - len(result.latencies)),
+    }
+    return result
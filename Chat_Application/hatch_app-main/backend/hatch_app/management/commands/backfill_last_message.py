@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from hatch_app.features.chat.models import Channel, Message
+
+
+class Command(BaseCommand):
+    help = "Populate Channel.last_message / last_message_sender / last_message_at from existing messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Channels updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        latest = Message.objects.filter(channel=OuterRef('pk')).order_by('-created_at', '-id')
+
+        channel_ids = list(Channel.objects.order_by('id').values_list('id', flat=True))
+        updated = 0
+        for start in range(0, len(channel_ids), batch_size):
+            batch = channel_ids[start:start + batch_size]
+            with transaction.atomic():
+                updated += Channel.objects.filter(id__in=batch).update(
+                    last_message=Subquery(latest.values('id')[:1]),
+                    last_message_sender=Subquery(latest.values('sender_id')[:1]),
+                    last_message_at=Subquery(latest.values('created_at')[:1]),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled last message for {updated} channels"))
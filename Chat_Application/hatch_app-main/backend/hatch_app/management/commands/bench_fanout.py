@@ -0,0 +1,86 @@
+import asyncio
+import time
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from hatch_app.features.chat import fanout
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+STRATEGIES = {
+    'single': fanout.send_whole,
+    'sharded': fanout.send_sharded,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures broadcast delivery latency through the configured channel layer (run it against "
+        "a local Redis) for channels of different sizes, sending each event to the whole-channel "
+        "group and to the shard groups. Subscribers are bare layer channels joined to the same "
+        "groups a ChatConsumer socket would join."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,1000,10000', help='Comma-separated subscriber counts.')
+        parser.add_argument('--messages', type=int, default=5, help='Events sent per size and strategy.')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for one event to reach everyone.')
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer()
+        if type(layer).__name__ == 'InMemoryChannelLayer':
+            self.stderr.write("Warning: in-memory channel layer, numbers will not reflect Redis fan-out")
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        asyncio.run(self.run(layer, sizes, options['messages'], options['timeout']))
+
+    async def run(self, layer, sizes, messages, timeout):
+        for size in sizes:
+            channel_id = f"bench{size}"
+            names = await asyncio.gather(*[layer.new_channel() for _ in range(size)])
+            await self.each(names, lambda name: layer.group_add(fanout.channel_group(channel_id), name))
+            await self.each(names, lambda name: layer.group_add(
+                fanout.shard_group(channel_id, fanout.socket_shard(name)), name
+            ))
+            try:
+                for strategy, send in STRATEGIES.items():
+                    delivery, publish, lost = await self.measure(layer, send, channel_id, names, messages, timeout)
+                    self.stdout.write(
+                        f"{size:>6} subscribers {strategy:>8}: "
+                        f"p50 {percentile(delivery, 0.5) * 1000:.1f} ms, "
+                        f"p99 {percentile(delivery, 0.99) * 1000:.1f} ms, "
+                        f"max {max(delivery, default=0) * 1000:.1f} ms, "
+                        f"publish p50 {percentile(publish, 0.5) * 1000:.1f} ms, lost {lost}"
+                    )
+            finally:
+                await self.each(names, lambda name: layer.group_discard(fanout.channel_group(channel_id), name))
+                await self.each(names, lambda name: layer.group_discard(
+                    fanout.shard_group(channel_id, fanout.socket_shard(name)), name
+                ))
+
+    async def each(self, names, operation, batch=500):
+        for start in range(0, len(names), batch):
+            await asyncio.gather(*[operation(name) for name in names[start:start + batch]])
+
+    async def measure(self, layer, send, channel_id, names, messages, timeout):
+        """Send `messages` events one after another; returns delivery latencies, publish times and lost deliveries."""
+        delivery, publish, lost = [], [], 0
+        for n in range(messages):
+            async def receive(name):
+                event = await layer.receive(name)
+                delivery.append(time.time() - event["sent_at"])
+
+            receivers = [asyncio.create_task(receive(name)) for name in names]
+            await asyncio.sleep(0.1)  # let every receiver start listening before timing starts
+            started = time.monotonic()
+            await send(layer, channel_id, {"type": "bench.message", "n": n, "sent_at": time.time()})
+            publish.append(time.monotonic() - started)
+            done, pending = await asyncio.wait(receivers, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            lost += len(pending)
+        return delivery, publish, lost
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from hatch_app.features.chat.chatbot import hatch_chatbot
+from hatch_app.features.chat.llm_governor import Deadline, LLMUnavailable, llm_governor
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires a burst of concurrent chatbot calls through the LLM governor and reports how many were "
+        "answered, queued out, rejected or failed, with latency percentiles. Run it against "
+        "`manage.py fake_llm_server` (e.g. with --fail-rate/--stall-rate) via GEMINI_BASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--users', type=int, default=50, help='Distinct user ids the requests are spread over.')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Deadline per request, in seconds.')
+
+    def handle(self, *args, **options):
+        outcomes = Counter()
+        latencies = []
+        peak_queue = 0
+        lock = threading.Lock()
+
+        def call(n):
+            started = time.monotonic()
+            try:
+                hatch_chatbot.generate(f"Question {n}", user_id=f"bench-user-{n % options['users']}",
+                                       deadline=Deadline(options['timeout']))
+                outcome = 'ok'
+            except LLMUnavailable as e:
+                outcome = type(e).__name__
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(time.monotonic() - started)
+
+        threads = [threading.Thread(target=call, args=(n,)) for n in range(options['requests'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            peak_queue = max(peak_queue, llm_governor.queue_depth())
+            time.sleep(0.01)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(f"{options['requests']} requests in {elapsed:.2f}s, peak queue depth {peak_queue}")
+        for outcome, count in outcomes.most_common():
+            self.stdout.write(f"{outcome:>20} {count:>6}")
+        self.stdout.write(
+            f"latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms"
+        )
+        self.stdout.write(f"circuit breaker: {llm_governor.breaker.state}")
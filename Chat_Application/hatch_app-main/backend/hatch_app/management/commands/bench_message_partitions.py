@@ -0,0 +1,91 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from hatch_app.features.chat.models import Bucket, Channel
+from hatch_app.features.chat.partitions import TABLE, add_months, create_partition, is_partitioned, month_start
+from hatch_app.features.user.models import User
+
+FLAT_TABLE = 'bench_message_flat'
+
+LATEST_PAGE = (
+    'SELECT id, sender_id, channel_id, message_text, created_at FROM "{table}" '
+    'WHERE channel_id = %s ORDER BY created_at DESC, id DESC LIMIT 11'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare latest-page (fetch_messages) latency on the partitioned message table against an "
+        "unpartitioned copy as the row count grows. Everything runs in one transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000])
+        parser.add_argument('--channels', type=int, default=1000)
+        parser.add_argument('--months', type=int, default=24, help='Spread generated messages over this many months.')
+        parser.add_argument('--samples', type=int, default=200, help='Latest-page queries timed per table and size.')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('The message table is not partitioned (PostgreSQL only, migration 0016).')
+
+        with transaction.atomic():
+            user = User.objects.create(id='bench-partitions', name='Bench', email='bench-partitions@hatch.local')
+            bucket = Bucket.objects.create(name='Bench partitions')
+            channels = Channel.objects.bulk_create([
+                Channel(bucket=bucket, name=f'bench-{n}', channel_type='community') for n in range(options['channels'])
+            ])
+            channel_ids = [channel.id for channel in channels]
+
+            this_month = month_start(timezone.now())
+            for n in range(options['months'] + 1):
+                create_partition(add_months(this_month, -n))
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TEMP TABLE {FLAT_TABLE} (LIKE "{TABLE}") ON COMMIT DROP'
+                )
+                cursor.execute(f'CREATE INDEX ON {FLAT_TABLE} (channel_id, created_at DESC, id DESC)')
+
+                self.stdout.write(f"{'rows':>12} {'table':>12} {'p50 ms':>8} {'p95 ms':>8}")
+                inserted = 0
+                for size in sorted(options['sizes']):
+                    self.insert(cursor, user.id, channel_ids, inserted, size, options['months'])
+                    inserted = size
+                    cursor.execute(f'ANALYZE "{TABLE}"')
+                    cursor.execute(f'ANALYZE {FLAT_TABLE}')
+                    for table in (TABLE, FLAT_TABLE):
+                        p50, p95 = self.latency(cursor, table, channel_ids, options['samples'])
+                        self.stdout.write(f"{size:>12} {'partitioned' if table == TABLE else 'flat':>12} {p50:>8.2f} {p95:>8.2f}")
+
+            transaction.set_rollback(True)
+
+    def insert(self, cursor, user_id, channel_ids, start, end, months):
+        self.stdout.write(f"inserting messages {start + 1}..{end}")
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM "{TABLE}"')
+        max_id = cursor.fetchone()[0]
+        cursor.execute(
+            f'INSERT INTO "{TABLE}" (sender_id, channel_id, message_text, created_at) '
+            "SELECT %s, (%s::bigint[])[1 + g %% %s], 'bench message ' || g, "
+            "now() - random() * (%s * interval '30 days') FROM generate_series(%s, %s) g",
+            [user_id, channel_ids, len(channel_ids), months, start + 1, end]
+        )
+        cursor.execute(
+            f'INSERT INTO {FLAT_TABLE} (id, sender_id, channel_id, message_text, created_at) '
+            f'SELECT id, sender_id, channel_id, message_text, created_at FROM "{TABLE}" '
+            'WHERE id > %s AND channel_id = ANY(%s)',
+            [max_id, channel_ids]
+        )
+
+    def latency(self, cursor, table, channel_ids, samples):
+        sql = LATEST_PAGE.format(table=table)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            cursor.execute(sql, [random.choice(channel_ids)])
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from hatch_app.features.chat.models import Bucket, Channel
+from hatch_app.features.chat.persistence import MessageWriter
+from hatch_app.features.chat.services import create_message
+from hatch_app.features.user.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure WebSocket-path message persistence (messages/sec), direct INSERT vs write-behind."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--senders', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--messages', type=int, default=50, help='Messages sent by each sender.')
+        parser.add_argument('--skip-write-behind', action='store_true', help='Only measure direct INSERTs (non-PostgreSQL).')
+
+    def handle(self, *args, **options):
+        user = User.objects.create(id='bench-persistence', name='Bench', email='bench-persistence@hatch.local')
+        bucket = Bucket.objects.create(name='Bench persistence')
+        channel = Channel.objects.create(bucket=bucket, name='bench', channel_type='community')
+        try:
+            self.stdout.write(f"{'senders':>8} {'mode':>13} {'msg/s':>10} {'drain s':>8}")
+            for senders in options['senders']:
+                modes = ['direct'] if options['skip_write_behind'] else ['direct', 'write-behind']
+                for mode in modes:
+                    rate, drain = asyncio.run(self.run(mode, channel.id, user.id, senders, options['messages']))
+                    self.stdout.write(f"{senders:>8} {mode:>13} {rate:>10.0f} {drain:>8.3f}")
+        finally:
+            bucket.delete()
+            user.delete()
+
+    async def run(self, mode, channel_id, user_id, senders, messages):
+        writer = MessageWriter() if mode == 'write-behind' else None
+        save = database_sync_to_async(create_message)
+
+        async def sender(index):
+            for n in range(messages):
+                text = f"sender {index} message {n} / پیغام نمبر {n}"
+                if writer:
+                    await writer.submit(channel_id, user_id, text)
+                else:
+                    await save(channel_id=channel_id, sender_id=user_id, message_text=text)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[sender(index) for index in range(senders)])
+        accepted = time.perf_counter() - start
+
+        drain_start = time.perf_counter()
+        if writer:
+            await writer.close()
+        drain = time.perf_counter() - drain_start
+        return senders * messages / accepted, drain
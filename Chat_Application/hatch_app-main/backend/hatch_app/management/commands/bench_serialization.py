@@ -0,0 +1,70 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from hatch_app.features.chat.models import Bucket, BucketMember, Channel, Message
+from hatch_app.features.chat.projections import BUCKET_MEMBER, MESSAGE
+from hatch_app.features.chat.serializers import BucketMemberSerializer, MessageSerializer
+from hatch_app.features.user.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF serializers with the .values() projections used by the hot list endpoints: "
+        "query + serialize + render time per page, and whether the JSON is byte-identical. "
+        "Seed data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        largest = max(options['rows'])
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(id=f'bench-ser-{n}', name=f'Bench {n}', email=f'bench-ser-{n}@hatch.local') for n in range(largest)
+            ])
+            bucket = Bucket.objects.create(name='Bench serialization')
+            channel = Channel.objects.create(bucket=bucket, name='bench', channel_type='community')
+            BucketMember.objects.bulk_create([BucketMember(bucket=bucket, user=user, role='member') for user in users])
+            Message.objects.bulk_create([
+                Message(channel=channel, sender=users[n % len(users)], message_text=f'message {n} / پیغام {n}')
+                for n in range(largest)
+            ])
+
+            messages = Message.objects.filter(channel=channel).order_by('-created_at', '-id')
+            members = BucketMember.objects.filter(bucket=bucket).order_by('id')
+            shapes = [
+                ('messages',
+                 lambda n: MessageSerializer(list(messages.select_related('sender')[:n]), many=True).data,
+                 lambda n: MESSAGE.render(MESSAGE.values(messages)[:n])),
+                ('bucket members',
+                 lambda n: BucketMemberSerializer(list(members.select_related('user')[:n]), many=True).data,
+                 lambda n: BUCKET_MEMBER.render(BUCKET_MEMBER.values(members)[:n])),
+            ]
+
+            self.stdout.write(f"{'shape':>15} {'rows':>6} {'drf ms':>9} {'lean ms':>9} {'speedup':>8}  same bytes")
+            mismatches = []
+            for name, drf, lean in shapes:
+                for rows in options['rows']:
+                    drf_ms, drf_json = self.measure(drf, rows, options['repeat'])
+                    lean_ms, lean_json = self.measure(lean, rows, options['repeat'])
+                    same = drf_json == lean_json
+                    if not same:
+                        mismatches.append(f"{name} x{rows}")
+                    self.stdout.write(
+                        f"{name:>15} {rows:>6} {drf_ms:>9.2f} {lean_ms:>9.2f} {drf_ms / lean_ms:>7.1f}x  {'yes' if same else 'NO'}"
+                    )
+
+            transaction.set_rollback(True)
+
+        if mismatches:
+            raise CommandError(f"Output differs from DRF for: {', '.join(mismatches)}")
+
+    def measure(self, serialize, rows, repeat):
+        renderer = JSONRenderer()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = renderer.render(serialize(rows))
+        return (time.perf_counter() - start) * 1000 / repeat, body
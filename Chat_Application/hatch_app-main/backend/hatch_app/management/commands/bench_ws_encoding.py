@@ -0,0 +1,78 @@
+import json
+import time
+import zlib
+from django.core.management.base import BaseCommand
+from hatch_app.features.chat import wire
+
+SAMPLES = [
+    "ok",
+    "Meeting kal subah 10 baje hai, sab log time pe aa jana",
+    "آج کی میٹنگ ملتوی ہو گئی ہے، نئی تاریخ جلد بتائی جائے گی",
+    "Please review the PR before EOD — شکریہ!",
+    "Task update: design mockups done ✅ باقی کام کل مکمل ہو جائے گا، deployment Friday ko hogi. "
+    "Agar kisi ko koi issue ho to yahan batayein ya mujhe directly message karein.",
+]
+
+
+def event(n, text):
+    return {
+        "type": "chat.message",
+        "message_id": 1_000_000 + n,
+        "message": text,
+        "sender": "Ayesha Khan",
+        "sender_id": "kH3x9QeTz1ZbV0aP2mLr7sNcYw84",
+        "timestamp": "2026-10-18T09:15:42.123456+00:00",
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Bytes on the wire and server CPU per broadcast to N recipients for mixed Urdu/English chat "
+        "messages: per-recipient json.dumps (before), encode-once per subprotocol (now), and "
+        "per-connection permessage-deflate for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        recipients = options['recipients']
+        events = [event(n, text) for n, text in enumerate(SAMPLES)]
+
+        def per_recipient_json(payload):
+            for _ in range(recipients):
+                json.dumps(payload)
+
+        def per_connection_deflate(payload):
+            # Each socket has its own compression context, so the server compresses once per recipient
+            for _ in range(recipients):
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                compressor.compress(json.dumps(payload).encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def encode_once(protocol):
+            # One receiving process: every socket on the protocol shares the cached frame
+            def broadcast(payload):
+                event = wire.broadcast_event(payload)
+                cache = wire.FrameCache()
+                for _ in range(recipients):
+                    cache.get(event, protocol)
+            return broadcast
+
+        strategies = [
+            ('json per recipient', per_recipient_json, lambda p: len(json.dumps(p).encode())),
+            ('json + permessage-deflate', per_connection_deflate, lambda p: len(wire.deflate(json.dumps(p).encode()))),
+            ('encode once: json', encode_once(wire.JSON), lambda p: len(wire.encode(p, wire.JSON).encode())),
+            ('encode once: msgpack', encode_once(wire.MSGPACK), lambda p: len(wire.encode(p, wire.MSGPACK))),
+            ('encode once: msgpack.deflate', encode_once(wire.MSGPACK_DEFLATE), lambda p: len(wire.encode(p, wire.MSGPACK_DEFLATE))),
+        ]
+
+        self.stdout.write(f"{'strategy':>30} {'avg bytes/msg':>14} {f'cpu ms/{recipients} rcpt':>18}")
+        for name, broadcast, size in strategies:
+            start = time.perf_counter()
+            for _ in range(options['rounds']):
+                for payload in events:
+                    broadcast(payload)
+            cpu_ms = (time.perf_counter() - start) * 1000 / (options['rounds'] * len(events))
+            avg_bytes = sum(size(payload) for payload in events) / len(events)
+            self.stdout.write(f"{name:>30} {avg_bytes:>14.0f} {cpu_ms:>18.3f}")
@@ -0,0 +1,87 @@
+import re
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from hatch_app.features.chat.models import BucketMember, Channel, ChannelMember, Message
+from hatch_app.features.chat.search import ranked_matches
+from hatch_app.features.tasks.models import Notification, Task
+
+
+def hot_queries(user_id, channel_id, bucket_id):
+    """The query shapes issued by the hot views, as (view, table, queryset)."""
+    today = timezone.now()
+    mine = Q(assigned_to=user_id) | Q(assigned_by=user_id)
+    queries = [
+        ('fetch_messages', Message._meta.db_table,
+         Message.objects.filter(channel_id=channel_id).order_by('-created_at', '-id')[:11]),
+        ('create_direct_channel_and_send_message', Channel._meta.db_table,
+         Channel.objects.filter(direct_key=f'{user_id}:{user_id}~')),
+        ('check_channel_membership', ChannelMember._meta.db_table,
+         ChannelMember.objects.filter(channel_id=channel_id, user_id=user_id)),
+        ('get_chat_messages', ChannelMember._meta.db_table,
+         ChannelMember.objects.filter(user_id=user_id).values('channel_id')),
+        ('list_buckets', BucketMember._meta.db_table,
+         BucketMember.objects.filter(user_id=user_id, invite_accepted=True).values('bucket_id')),
+        ('get_all_communities_task', Task._meta.db_table,
+         Task.objects.filter(community_id=bucket_id).filter(mine)),
+        ('get_all_communities_task (upcoming)', Task._meta.db_table,
+         Task.objects.filter(
+             assigned_to=user_id,
+             status__in=['open', 'in-progress'],
+             due_date__range=[today, today + timedelta(days=7)],
+         )),
+        ('fetch_notifications_list', Notification._meta.db_table,
+         Notification.objects.filter(user_id=user_id).order_by('-created_at')),
+    ]
+    if connection.vendor == 'postgresql':
+        # The SQLite search fallback is a LIKE scan by design
+        queries.append(('search_messages', Message._meta.db_table,
+                        ranked_matches(Message.objects.all(), 'hello').order_by('-rank', '-id')[:11]))
+    return queries
+
+
+def is_full_scan(plan, table):
+    """True if the plan reads `table` sequentially instead of through an index."""
+    if connection.vendor == 'postgresql':
+        # Also catches scans of the monthly message partitions (table_pYYYYMM, table_default)
+        return re.search(rf'Seq Scan on "?{table}(_p\d{{6}}|_default)?"?\b', plan) is not None
+    if connection.vendor == 'sqlite':
+        return re.search(rf'\bSCAN {table}\b(?! USING)', plan) is not None
+    return False
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot view queries and fail if any of them falls back to a sequential scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='explain-user', help='User id to plan with.')
+        parser.add_argument('--channel', type=int, default=1, help='Channel id to plan with.')
+        parser.add_argument('--bucket', type=int, default=1, help='Bucket id to plan with.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f"Plan checks are not supported on {connection.vendor}")
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to scan, so take that option away to
+                # check that an index exists for each shape regardless of data size.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for view, table, queryset in hot_queries(options['user'], options['channel'], options['bucket']):
+                plan = queryset.explain()
+                if options['verbose_plans']:
+                    self.stdout.write(f"{view}:\n{plan}\n")
+                if is_full_scan(plan, table):
+                    failures.append(view)
+                    self.stdout.write(self.style.ERROR(f"SEQ SCAN  {view} ({table})"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"index     {view} ({table})"))
+
+        if failures:
+            raise CommandError(f"Sequential scans in: {', '.join(failures)}")
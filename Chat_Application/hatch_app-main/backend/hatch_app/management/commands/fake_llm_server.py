@@ -0,0 +1,84 @@
+import asyncio
+import json
+import random
+from aiohttp import web
+from django.core.management.base import BaseCommand
+
+FILLER = (
+    "Sure! Here is what I found in your communities. You have three open tasks this week, "
+    "the design channel has new messages, and the team sync is tomorrow at 10. Let me know "
+    "if you want me to send a message or assign a task to someone."
+).split(" ")
+
+
+def prompt_text(body):
+    """Text of the last user turn in a generateContent request body."""
+    for content in reversed(body.get("contents", [])):
+        parts = [part.get("text", "") for part in content.get("parts", [])]
+        if parts:
+            return " ".join(parts)
+    return ""
+
+
+def reply_words(prompt, count):
+    words = [f"You asked: {prompt[:80]}."] + FILLER
+    return [words[n % len(words)] for n in range(count)]
+
+
+def response_chunk(text, last=False):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if last:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves the Gemini generateContent and streamGenerateContent endpoints with canned replies, "
+        "so the chatbot can run and be load-tested offline. Point the app at it with "
+        "GEMINI_BASE_URL=http://127.0.0.1:<port>/ and any GEMINI_API_KEY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--tokens', type=int, default=40, help='Words per reply.')
+        parser.add_argument('--first-token-delay', type=float, default=0.5, help='Seconds before the first word.')
+        parser.add_argument('--token-delay', type=float, default=0.05, help='Seconds between words.')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with a 503.')
+        parser.add_argument('--stall-rate', type=float, default=0.0, help='Share of requests that never answer.')
+
+    def handle(self, *args, **options):
+        async def generate(request):
+            method = request.match_info['target'].partition(':')[2]
+            body = await request.json()
+            words = reply_words(prompt_text(body), options['tokens'])
+            await asyncio.sleep(options['first_token_delay'])
+
+            roll = random.random()
+            if roll < options['fail_rate']:
+                return web.json_response({"error": {"code": 503, "message": "Overloaded", "status": "UNAVAILABLE"}}, status=503)
+            if roll < options['fail_rate'] + options['stall_rate']:
+                await asyncio.sleep(3600)
+
+            if method == 'generateContent':
+                await asyncio.sleep(options['token_delay'] * len(words))
+                return web.json_response(response_chunk(" ".join(words), last=True))
+            if method != 'streamGenerateContent':
+                return web.json_response({"error": {"code": 404, "message": f"Unknown method {method}"}}, status=404)
+
+            response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+            await response.prepare(request)
+            for n, word in enumerate(words):
+                if n:
+                    await asyncio.sleep(options['token_delay'])
+                text = word if n == 0 else f" {word}"
+                chunk = response_chunk(text, last=n == len(words) - 1)
+                await response.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+            await response.write_eof()
+            return response
+
+        app = web.Application()
+        app.router.add_post('/{version}/models/{target}', generate)
+        self.stdout.write(f"Fake LLM server on http://{options['host']}:{options['port']}/")
+        web.run_app(app, host=options['host'], port=options['port'], print=None)
@@ -0,0 +1,75 @@
+import asyncio
+from django.core.management.base import BaseCommand, CommandError
+from hatch_app.loadtest import report, rest, seed, ws
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests a running server seeded with `manage.py loadtest_seed`. The server must run "
+        "with AUTH_TRUST_UID_HEADER=True against the same database. Each REST scenario runs "
+        "closed-loop for --duration seconds and its queries per request are counted in-process; "
+        "the ws_chat scenario runs sender/receiver swarms on ChatConsumer sockets. "
+        "--save-baseline records the run; --baseline fails the command on regression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/')
+        parser.add_argument('--ws-url', default='ws://127.0.0.1:8000/')
+        parser.add_argument('--scenarios', default=','.join([*rest.SCENARIOS, 'ws_chat']))
+        parser.add_argument('--concurrency', type=int, default=20, help='Concurrent REST clients.')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per scenario.')
+        parser.add_argument('--query-samples', type=int, default=5, help='Requests per REST scenario to count queries for.')
+        parser.add_argument('--ws-channels', type=int, default=5)
+        parser.add_argument('--ws-sockets', type=int, default=40, help='Sockets per channel.')
+        parser.add_argument('--ws-senders', type=int, default=4, help='Sockets per channel that also send.')
+        parser.add_argument('--ws-rate', type=float, default=2.0, help='Messages per second per sender.')
+        parser.add_argument('--baseline', help='Baseline JSON to compare against; regressions fail the command.')
+        parser.add_argument('--save-baseline', help='Write this run as a baseline JSON.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed latency/throughput drift, as a fraction.')
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = [name for name in scenarios if name not in rest.SCENARIOS and name != 'ws_chat']
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+
+        users, memberships = seed.targets()
+        if not memberships:
+            raise CommandError("No load-test data found; run `manage.py loadtest_seed` first")
+
+        summaries = {}
+        for name in scenarios:
+            self.stdout.write(f"Running {name}...")
+            if name == 'ws_chat':
+                result = asyncio.run(ws.run(
+                    options['ws_url'], memberships, options['ws_channels'], options['ws_sockets'],
+                    options['ws_senders'], options['ws_rate'], options['duration'],
+                ))
+                self.stdout.write(
+                    f"  {result.extra['sockets']} sockets, {result.extra['sent']} sent, "
+                    f"{result.extra['delivered']} delivered, {result.extra['lost']} lost"
+                )
+            else:
+                result = asyncio.run(rest.run(
+                    name, options['base_url'], users, memberships, options['concurrency'], options['duration'],
+                ))
+                result.queries = rest.count_queries(name, users, memberships, options['query_samples'])
+            summaries[name] = result.summary()
+
+        self.stdout.write(report.table(summaries))
+
+        config = {key: options[key] for key in (
+            'concurrency', 'duration', 'ws_channels', 'ws_sockets', 'ws_senders', 'ws_rate',
+        )}
+        if options['save_baseline']:
+            report.save_baseline(options['save_baseline'], summaries, config)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save_baseline']}"))
+
+        if options['baseline']:
+            baseline = report.load_baseline(options['baseline'])
+            if baseline['config'] != config:
+                self.stderr.write(f"Warning: baseline was recorded with {baseline['config']}")
+            found = report.regressions(summaries, baseline, options['tolerance'])
+            if found:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(found))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from hatch_app.loadtest import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the load-test data set (users 'load-<n>', buckets 'Load bucket <n>') with synthetic "
+        "users, buckets, community channels, messages and tasks. Local databases only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--buckets', type=int, default=10)
+        parser.add_argument('--members-per-bucket', type=int, default=40)
+        parser.add_argument('--channels-per-bucket', type=int, default=4)
+        parser.add_argument('--messages-per-channel', type=int, default=300)
+        parser.add_argument('--tasks-per-bucket', type=int, default=200)
+        parser.add_argument('--days', type=int, default=30, help='Messages are spread over this many past days.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, so data sets can be reproduced.')
+        parser.add_argument('--clear', action='store_true', help='Only delete the seeded data.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            buckets, users = seed.clear()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {buckets} buckets and {users} users"))
+            return
+
+        counts = seed.seed(
+            users=options['users'],
+            buckets=options['buckets'],
+            members_per_bucket=options['members_per_bucket'],
+            channels_per_bucket=options['channels_per_bucket'],
+            messages_per_channel=options['messages_per_channel'],
+            tasks_per_bucket=options['tasks_per_bucket'],
+            days=options['days'],
+            random_seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded " + ", ".join(f"{count} {name}" for name, count in counts.items())
+        ))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from hatch_app.features.chat.archive import archive_month
+from hatch_app.features.chat.partitions import (
+    add_months, create_partition, default_partition_rows, is_partitioned, monthly_partitions, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly message partitions and, with --archive-after, export old months to "
+        "archive files and detach them. Run daily from cron: a month without a partition lands in "
+        "the default partition, which then has to be emptied by hand before that month can be created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Partitions to keep ready past this month.')
+        parser.add_argument('--archive-after', type=int, metavar='MONTHS',
+                            help='Archive partitions that ended more than this many months ago.')
+        parser.add_argument('--keep-detached', action='store_true',
+                            help='Leave archived partitions as detached tables instead of dropping them.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('The message table is not partitioned (PostgreSQL only, migration 0016).')
+
+        this_month = month_start(timezone.now())
+        for n in range(options['months_ahead'] + 1):
+            month = add_months(this_month, n)
+            if options['dry_run']:
+                self.stdout.write(f"would ensure partition {month:%Y-%m}")
+            elif create_partition(month):
+                self.stdout.write(self.style.SUCCESS(f"created partition {month:%Y-%m}"))
+
+        stray = default_partition_rows()
+        if stray:
+            self.stdout.write(self.style.WARNING(f"{stray} messages are in the default partition"))
+
+        if options['archive_after'] is None:
+            return
+        if options['archive_after'] < 1:
+            raise CommandError('--archive-after must be at least 1 month.')
+
+        cutoff = add_months(this_month, -options['archive_after'])
+        for month, table in monthly_partitions():
+            if add_months(month, 1) > cutoff:
+                break
+            if options['dry_run']:
+                self.stdout.write(f"would archive {table}")
+                continue
+            exported = archive_month(month, drop=not options['keep_detached'])
+            self.stdout.write(self.style.SUCCESS(f"archived {table}: {exported} messages"))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from hatch_app.features.chat.archive import merge_archive
+from hatch_app.features.chat.membership import revoke_membership
+from hatch_app.features.chat.models import Channel, ChannelMember, Message, MessageArchive
+from hatch_app.features.chat.services import direct_channel_key, watermark_unread
+from hatch_app.features.chat.versions import BUCKET_CHANNELS, CHANNEL_SETTINGS, bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge 1-on-1 direct channels that migration 0017 left without a direct_key into the "
+        "pair's keyed channel, combining archive files for months both channels have archived."
+    )
+
+    def handle(self, *args, **options):
+        merged = keyed = 0
+        for channel in Channel.objects.filter(channel_type='direct', direct_key__isnull=True).order_by('id'):
+            user_ids = list(ChannelMember.objects.filter(channel=channel).values_list('user_id', flat=True))
+            if len(user_ids) != 2:
+                continue
+            key = direct_channel_key(*user_ids)
+            keep = Channel.objects.filter(direct_key=key).first()
+            if keep is None:
+                Channel.objects.filter(id=channel.id).update(direct_key=key)
+                keyed += 1
+                continue
+            self.merge(keep, channel, user_ids)
+            merged += 1
+        self.stdout.write(self.style.SUCCESS(f"Merged {merged} duplicate direct channels, keyed {keyed}"))
+
+    def merge(self, keep, duplicate, user_ids):
+        duplicate_id = duplicate.id
+        with transaction.atomic():
+            kept_months = set(MessageArchive.objects.filter(channel=keep).values_list('month', flat=True))
+            for archive in MessageArchive.objects.filter(channel=duplicate):
+                if archive.month in kept_months:
+                    merge_archive(keep.id, duplicate_id, archive.month)
+                else:
+                    MessageArchive.objects.filter(id=archive.id).update(channel=keep)
+            Message.objects.filter(channel=duplicate).update(channel=keep)
+
+            latest = Message.objects.filter(channel=keep).order_by('-created_at', '-id').first()
+            if latest and (keep.last_message_at is None or latest.created_at >= keep.last_message_at):
+                Channel.objects.filter(id=keep.id).update(
+                    last_message=latest, last_message_sender_id=latest.sender_id, last_message_at=latest.created_at
+                )
+            duplicate.delete()
+            ChannelMember.objects.filter(channel=keep).update(unread_count=watermark_unread())
+        bump(BUCKET_CHANNELS, [keep.bucket_id, duplicate.bucket_id])
+        bump(CHANNEL_SETTINGS, [duplicate_id])
+        revoke_membership(duplicate_id, user_ids, everyone=True)
+        self.stdout.write(f"Merged direct channel {duplicate_id} into {keep.id}")
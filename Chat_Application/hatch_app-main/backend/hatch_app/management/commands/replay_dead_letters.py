@@ -0,0 +1,48 @@
+import json
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from hatch_app.features.chat.models import Message
+from hatch_app.features.chat.persistence import MessageWriter
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert messages from the write-behind dead-letter log (CHAT_WRITE_BEHIND_DEAD_LETTER). "
+        "Messages already stored are skipped, so a log can be replayed more than once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Dead-letter file; defaults to CHAT_WRITE_BEHIND_DEAD_LETTER.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.CHAT_WRITE_BEHIND_DEAD_LETTER
+        if not path:
+            raise CommandError('No dead-letter file given and CHAT_WRITE_BEHIND_DEAD_LETTER is not set')
+
+        inserted = skipped = failed = 0
+        with open(path) as lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                message = Message(
+                    id=record['id'],
+                    channel_id=record['channel_id'],
+                    sender_id=record['sender_id'],
+                    message_text=record['message_text'],
+                    message_file=record['message_file'],
+                    created_at=datetime.fromisoformat(record['created_at']),
+                )
+                try:
+                    if MessageWriter.write([message]):
+                        inserted += 1
+                    else:
+                        skipped += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Message {message.id}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {inserted} messages, {skipped} already stored, {failed} failed"
+        ))
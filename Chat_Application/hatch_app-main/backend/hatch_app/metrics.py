@@ -0,0 +1,117 @@
+import threading
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from hatch_app.decorators import bearer_token
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """A metric family in the Prometheus text format. Values live in this process only."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, key, extra)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [('_total', key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Set directly, or give `function` to read the current value at scrape time (unlabelled)."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.function is not None:
+            return [('', (), (), self.function())]
+        with self._lock:
+            return [('', key, (), value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observed = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, observed + 1)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, observed) in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append(('_bucket', key, (('le', bound),), count))
+                samples.append(('_bucket', key, (('le', '+Inf'),), observed))
+                samples.append(('_sum', key, (), total))
+                samples.append(('_count', key, (), observed))
+        return samples
+
+
+registry = []
+
+
+def render():
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint. Needs `Authorization: Bearer <METRICS_TOKEN>` unless DEBUG is on."""
+    if not settings.DEBUG and (not settings.METRICS_TOKEN or bearer_token(request.headers.get('Authorization')) != settings.METRICS_TOKEN):
+        return JsonResponse({"error": "Not authorized"}, status=401)
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4')
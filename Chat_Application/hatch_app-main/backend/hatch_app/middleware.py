@@ -0,0 +1,42 @@
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from hatch_app.decorators import bearer_token
+from hatch_app.firebase_auth import authenticate
+from hatch_app.features.user.profiles import profiles
+
+
+@database_sync_to_async
+def get_user(uid):
+    return profiles.get(uid)
+
+
+class FirebaseAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections once, at handshake, with the same verifier as token_required.
+    The token is read from `?token=` or an `Authorization: Bearer` header; scope["user"] is the
+    user's cached UserProfile on success and None otherwise. With AUTH_TRUST_UID_HEADER (local
+    development and load runs) a `?uid=` parameter is trusted instead, like the HTTP UID header.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user'] = await self.resolve_user(scope)
+        return await super().__call__(scope, receive, send)
+
+    async def resolve_user(self, scope):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        if settings.AUTH_TRUST_UID_HEADER and query.get('uid'):
+            return await get_user(query['uid'][0])
+        headers = dict(scope.get('headers', []))
+        token = query.get('token', [None])[0] or bearer_token(headers.get(b'authorization', b'').decode())
+        if not token:
+            return None
+        try:
+            # Cache hits are cheap, but a miss may fetch Google's certificates.
+            claims = await sync_to_async(authenticate)(token)
+        except Exception:
+            return None
+        return await get_user(claims['uid'])
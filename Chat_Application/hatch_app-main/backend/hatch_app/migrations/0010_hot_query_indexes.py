@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0009_alter_channel_bucket_alter_channelmember_channel_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bucketmember',
+            index=models.Index(fields=['user', 'bucket', 'invite_accepted'], name='bmember_user_bucket_acc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='channelmember',
+            index=models.Index(fields=['user', 'channel'], name='chmember_user_channel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['channel', '-created_at', '-id'], name='msg_channel_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['community', 'assigned_to', 'due_date'], name='task_comm_assignee_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['community', 'assigned_by', 'due_date'], name='task_comm_assigner_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status__in', ['open', 'in-progress'])), fields=['assigned_to', 'due_date'], name='task_open_assignee_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hatch_app.message'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hatch_app.user'),
+        ),
+        migrations.AddIndex(
+            model_name='channel',
+            index=models.Index(fields=['bucket', '-last_message_at'], name='channel_bucket_last_msg_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0013_alter_message_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channelmember',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='channelmember',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hatch_app.message'),
+        ),
+        migrations.AddField(
+            model_name='channelmember',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='channelmember',
+            index=models.Index(condition=models.Q(('unread_count__gt', 0)), fields=['user'], name='chmember_user_unread_idx'),
+        ),
+        migrations.DeleteModel(
+            name='MessageSeen',
+        ),
+    ]
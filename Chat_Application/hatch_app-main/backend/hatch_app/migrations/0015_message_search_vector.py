@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:20
+
+from django.db import migrations
+
+# A generated column keeps the vector in step with message_text on every INSERT and UPDATE,
+# including the write-behind bulk inserts, without any application code.
+FORWARD_SQL = [
+    """
+    ALTER TABLE hatch_app_message
+    ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, coalesce(message_text, ''))) STORED
+    """,
+    "CREATE INDEX msg_search_vector_idx ON hatch_app_message USING gin (search_vector)",
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS msg_search_vector_idx",
+    "ALTER TABLE hatch_app_message DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # tsvector is PostgreSQL only; other databases search with a LIKE fallback
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0014_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD_SQL), run(REVERSE_SQL)),
+    ]
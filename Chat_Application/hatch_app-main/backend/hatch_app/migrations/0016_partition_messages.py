@@ -0,0 +1,127 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from datetime import datetime, timezone
+from django.db import migrations, models
+
+COLUMNS = 'id, sender_id, channel_id, message_text, message_file, join_channel, created_at'
+
+# Rebuilds hatch_app_message as a table range partitioned by month on created_at. PostgreSQL
+# requires the partition key in the primary key, so it becomes (id, created_at); ids still come
+# from a single sequence and stay unique. Foreign keys *to* the table cannot reference id alone,
+# so the ones from Channel, ChannelMember and MessageReaction lose their database constraints
+# first (Django enforces on_delete either way). This copies every message; on a large table run
+# it in a maintenance window.
+
+
+def _months(first, count):
+    index = first.year * 12 + first.month - 1
+    return [datetime((index + n) // 12, (index + n) % 12 + 1, 1, tzinfo=timezone.utc) for n in range(count + 1)]
+
+
+def partition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT min(created_at), coalesce(max(id), 0) FROM hatch_app_message")
+        oldest, max_id = cursor.fetchone()
+
+    now = datetime.now(timezone.utc)
+    first = (oldest or now).astimezone(timezone.utc)
+    months = _months(first, (now.year - first.year) * 12 + now.month - first.month + 3)
+
+    execute(
+        "CREATE TABLE hatch_app_message_partitioned (LIKE hatch_app_message INCLUDING GENERATED) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    for start, end in zip(months, months[1:]):
+        execute(
+            f"CREATE TABLE hatch_app_message_p{start:%Y%m} PARTITION OF hatch_app_message_partitioned "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    execute("CREATE TABLE hatch_app_message_default PARTITION OF hatch_app_message_partitioned DEFAULT")
+    execute(f"INSERT INTO hatch_app_message_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM hatch_app_message")
+
+    execute("DROP TABLE hatch_app_message")
+    execute("ALTER TABLE hatch_app_message_partitioned RENAME TO hatch_app_message")
+    execute("CREATE SEQUENCE hatch_app_message_id_seq OWNED BY hatch_app_message.id")
+    execute(f"SELECT setval('hatch_app_message_id_seq', {max_id + 1}, false)")
+    execute("ALTER TABLE hatch_app_message ALTER COLUMN id SET DEFAULT nextval('hatch_app_message_id_seq')")
+    _add_indexes(execute, primary_key='id, created_at')
+
+
+def unpartition_messages(apps, schema_editor):
+    """Copies live partitions back into a plain table. Archived months are not restored."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+
+    execute("CREATE TABLE hatch_app_message_unpartitioned (LIKE hatch_app_message INCLUDING GENERATED)")
+    execute(f"INSERT INTO hatch_app_message_unpartitioned ({COLUMNS}) SELECT {COLUMNS} FROM hatch_app_message")
+    execute("DROP TABLE hatch_app_message")
+    execute("ALTER TABLE hatch_app_message_unpartitioned RENAME TO hatch_app_message")
+    execute("ALTER TABLE hatch_app_message ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+    execute(
+        "SELECT setval(pg_get_serial_sequence('hatch_app_message', 'id'), "
+        "coalesce((SELECT max(id) FROM hatch_app_message), 0) + 1, false)"
+    )
+    _add_indexes(execute, primary_key='id')
+
+
+def _add_indexes(execute, primary_key):
+    execute(f"ALTER TABLE hatch_app_message ADD PRIMARY KEY ({primary_key})")
+    execute("CREATE INDEX msg_channel_created_idx ON hatch_app_message (channel_id, created_at DESC, id DESC)")
+    execute("CREATE INDEX msg_search_vector_idx ON hatch_app_message USING gin (search_vector)")
+    execute("CREATE INDEX hatch_app_message_sender_id_idx ON hatch_app_message (sender_id)")
+    execute(
+        "ALTER TABLE hatch_app_message ADD CONSTRAINT hatch_app_message_channel_id_fk_hatch_app_channel_id "
+        "FOREIGN KEY (channel_id) REFERENCES hatch_app_channel (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(
+        "ALTER TABLE hatch_app_message ADD CONSTRAINT hatch_app_message_sender_id_fk_hatch_app_user_id "
+        "FOREIGN KEY (sender_id) REFERENCES hatch_app_user (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0015_message_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='channel',
+            name='last_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hatch_app.message'),
+        ),
+        migrations.AlterField(
+            model_name='channelmember',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hatch_app.message'),
+        ),
+        migrations.AlterField(
+            model_name='messagereaction',
+            name='message',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='hatch_app.message'),
+        ),
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('path', models.CharField(max_length=255)),
+                ('message_count', models.PositiveIntegerField()),
+                ('oldest_at', models.DateTimeField()),
+                ('newest_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hatch_app.channel')),
+            ],
+            options={
+                'unique_together': {('channel', 'month')},
+            },
+        ),
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:05
+
+import logging
+from django.db import migrations, models, transaction
+
+# Gives every 1-on-1 direct channel its canonical key before the unique index is built. Where
+# the same two users ended up with several direct channels (concurrent first messages), the
+# oldest one is kept: later channels' messages move into it, its last-message pointer and both
+# members' unread counts are recomputed, and the duplicates are deleted. A duplicate whose
+# archived month clashes with one of the kept channel's is left unmerged, without a key (a
+# warning is logged for each). New messages for the pair go to the kept channel, which has the
+# key; `manage.py merge_direct_duplicates` then folds the leftovers in, merging the two archive
+# files for the shared months, and should be run once after this migration when any were logged.
+# Not atomic as a whole: the merge commits before the unique index is built, since PostgreSQL
+# will not alter a table with deferred foreign-key checks still pending in the transaction.
+
+
+logger = logging.getLogger('django.db.migrations')
+
+
+def _recount(Channel, ChannelMember, Message, channel_id):
+    messages = Message.objects.filter(channel_id=channel_id)
+    latest = messages.order_by('-created_at', '-id').values('id', 'sender_id', 'created_at').first()
+    if latest:
+        Channel.objects.filter(id=channel_id).update(
+            last_message_id=latest['id'], last_message_sender_id=latest['sender_id'], last_message_at=latest['created_at']
+        )
+    for member in ChannelMember.objects.filter(channel_id=channel_id):
+        unread = messages.exclude(sender_id=member.user_id)
+        if member.last_read_at is not None:
+            unread = unread.filter(created_at__gt=member.last_read_at)
+        member.unread_count = unread.count()
+        member.save(update_fields=['unread_count'])
+
+
+def _merge(Channel, ChannelMember, Message, MessageArchive, key, channel_ids):
+    keep, *duplicates = sorted(channel_ids)
+    merged = False
+    for duplicate in duplicates:
+        kept_months = set(MessageArchive.objects.filter(channel_id=keep).values_list('month', flat=True))
+        if MessageArchive.objects.filter(channel_id=duplicate, month__in=kept_months).exists():
+            logger.warning(
+                "Direct channel %s not merged into %s: both have archives for the same month; "
+                "run manage.py merge_direct_duplicates", duplicate, keep,
+            )
+            continue
+        Message.objects.filter(channel_id=duplicate).update(channel_id=keep)
+        MessageArchive.objects.filter(channel_id=duplicate).update(channel_id=keep)
+        Channel.objects.filter(id=duplicate).delete()
+        merged = True
+    if merged:
+        _recount(Channel, ChannelMember, Message, keep)
+    Channel.objects.filter(id=keep).update(direct_key=key)
+
+
+def merge_direct_channels(apps, schema_editor):
+    Channel = apps.get_model('hatch_app', 'Channel')
+    ChannelMember = apps.get_model('hatch_app', 'ChannelMember')
+    Message = apps.get_model('hatch_app', 'Message')
+    MessageArchive = apps.get_model('hatch_app', 'MessageArchive')
+
+    participants = {}
+    for channel_id, user_id in ChannelMember.objects.filter(
+        channel__channel_type='direct'
+    ).values_list('channel_id', 'user_id'):
+        participants.setdefault(channel_id, []).append(user_id)
+
+    channels_by_key = {}
+    for channel_id, user_ids in participants.items():
+        if len(user_ids) == 2:
+            channels_by_key.setdefault(':'.join(sorted(user_ids)), []).append(channel_id)
+
+    for key, channel_ids in channels_by_key.items():
+        with transaction.atomic():
+            _merge(Channel, ChannelMember, Message, MessageArchive, key, channel_ids)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('hatch_app', '0016_partition_messages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='direct_key',
+            field=models.CharField(blank=True, max_length=511, null=True),
+        ),
+        migrations.RunPython(merge_direct_channels, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='channel',
+            name='direct_key',
+            field=models.CharField(blank=True, max_length=511, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:10
+
+import gzip
+import json
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+# Fills newest_text for existing archives from the first (newest) line of each file, and clears
+# last-message and read pointers that already refer to archived messages.
+
+
+def backfill(apps, schema_editor):
+    Channel = apps.get_model('hatch_app', 'Channel')
+    ChannelMember = apps.get_model('hatch_app', 'ChannelMember')
+    Message = apps.get_model('hatch_app', 'Message')
+    MessageArchive = apps.get_model('hatch_app', 'MessageArchive')
+
+    storage = FileSystemStorage(location=settings.MESSAGE_ARCHIVE_DIR)
+    for archive in MessageArchive.objects.filter(newest_text__isnull=True):
+        try:
+            with storage.open(archive.path, 'rb') as stored, gzip.GzipFile(fileobj=stored) as lines:
+                first = lines.readline()
+        except OSError as e:
+            print(f"Archive {archive.path} not readable: {e}")
+            continue
+        if first:
+            archive.newest_text = json.loads(first)['message_text']
+            archive.save(update_fields=['newest_text'])
+
+    Channel.objects.filter(last_message__isnull=False).exclude(
+        Exists(Message.objects.filter(id=OuterRef('last_message_id')))
+    ).update(last_message=None)
+    ChannelMember.objects.filter(last_read_message__isnull=False).exclude(
+        Exists(Message.objects.filter(id=OuterRef('last_read_message_id')))
+    ).update(last_read_message=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0017_channel_direct_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagearchive',
+            name='newest_text',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
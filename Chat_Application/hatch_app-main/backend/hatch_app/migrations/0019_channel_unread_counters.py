@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0018_messagearchive_newest_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='unread_counters',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+# Existing archives keep an empty index and are read from the start, as before.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hatch_app', '0019_channel_unread_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagearchive',
+            name='block_index',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
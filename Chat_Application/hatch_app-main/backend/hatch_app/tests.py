@@ -1,3 +1,953 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from hatch_app.decorators import token_required
+from hatch_app.features.chat.chatbot import HatchChatbot, UpstreamError
+from hatch_app.features.chat.llm_governor import (
+    CircuitBreaker, CircuitOpen, Deadline, DeadlineExceeded, LLMGovernor, QueueFull,
+)
+from hatch_app.features.chat.models import Bucket, Channel, ChannelMember, Message
+from hatch_app.features.chat.persistence import MessageWriter
+from hatch_app.features.chat.notifications import FakePushTransport, PushPipeline
+from hatch_app.features.chat.presence import Presence
+from hatch_app.features.chat.search import search_messages
+from hatch_app.features.chat import archive, wire
+from hatch_app.features.chat.services import create_message, mark_read, unread_memberships
+from hatch_app.features.user.models import DeviceToken, User
+from hatch_app.features.user.profiles import PROFILE_FIELDS, UserProfileCache, profiles
+from hatch_app.management.commands.fake_llm_server import response_chunk
+from hatch_app.firebase_auth import LocalKeySource, TokenVerifier, set_verifier
+from hatch_app.middleware import FirebaseAuthMiddleware
 
-# Create your tests here.
+# Tests run against a per-process cache instead of the shared Redis one
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_user(uid):
+    return User.objects.create(id=uid, name=f'User {uid}', email=f'{uid}@hatch.test')
+
+
+def clear_caches():
+    cache.clear()
+    profiles.local.clear()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AUTH_TRUST_UID_HEADER=True)
+class InboxQueryCountTests(TestCase):
+    """The DM inbox is built with a fixed number of queries, however many channels the user has."""
+
+    def setUp(self):
+        clear_caches()
+        self.user = make_user('inbox-owner')
+        self.bucket = Bucket.objects.create(name='Direct Messages')
+        self.channel_count = 0
+
+    def add_direct_channels(self, count):
+        for _ in range(count):
+            self.channel_count += 1
+            other = make_user(f'inbox-peer-{self.channel_count}')
+            channel = Channel.objects.create(bucket=self.bucket, name=f'Direct {self.channel_count}', channel_type='direct')
+            ChannelMember.objects.create(channel=channel, user=self.user)
+            ChannelMember.objects.create(channel=channel, user=other)
+            create_message(channel=channel, sender_id=other.id, message_text='hello')
+            create_message(channel=channel, sender_id=self.user.id, message_text='hi back')
+
+    def fetch_inbox(self):
+        clear_caches()
+        return self.client.get('/api/chat/direct-messages/recent/', HTTP_UID=self.user.id)
+
+    def test_query_count_does_not_grow_with_channels(self):
+        self.add_direct_channels(2)
+        with CaptureQueriesContext(connection) as baseline:
+            response = self.fetch_inbox()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+        self.add_direct_channels(8)
+        with self.assertNumQueries(len(baseline)):
+            response = self.fetch_inbox()
+        self.assertEqual(len(response.json()), 10)
+
+    def test_entries_show_last_message_and_counterpart(self):
+        self.add_direct_channels(1)
+        entry = self.fetch_inbox().json()[0]
+        self.assertEqual(entry['channel_name'], 'User inbox-peer-1')
+        self.assertEqual(entry['latest_message'], 'hi back')
+        self.assertEqual(entry['latest_sender_id'], self.user.id)
+
+
+TEST_PROJECT = 'hatch-test'
+
+
+@token_required
+def whoami(request):
+    return JsonResponse({'user': request.user})
+
+
+class LocalKeysMixin:
+    """Verify tokens against an in-process key pair instead of Google's certificates."""
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.keys = LocalKeySource()
+        self.verifier = TokenVerifier(self.keys, TEST_PROJECT)
+        set_verifier(self.verifier)
+        self.addCleanup(set_verifier, None)
+
+    def sign(self, uid, **kwargs):
+        return self.keys.sign(uid, project_id=TEST_PROJECT, **kwargs)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, FIREBASE_PROJECT_ID=TEST_PROJECT, AUTH_TRUST_UID_HEADER=False)
+class TokenRequiredTests(LocalKeysMixin, TestCase):
+    def call(self, token=None, uid='alice'):
+        headers = {'HTTP_UID': uid}
+        if token:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        return whoami(RequestFactory().get('/', **headers))
+
+    def test_valid_token_sets_user(self):
+        response = self.call(self.sign('alice'))
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, {'user': 'alice'})
+
+    def test_missing_token(self):
+        self.assertEqual(self.call().status_code, 401)
+
+    def test_uid_header_must_match_token(self):
+        self.assertEqual(self.call(self.sign('bob'), uid='alice').status_code, 401)
+
+    def test_expired_token(self):
+        self.assertEqual(self.call(self.sign('alice', lifetime=-60)).status_code, 401)
+
+    def test_token_from_another_key(self):
+        forged = LocalKeySource().sign('alice', project_id=TEST_PROJECT)
+        self.assertEqual(self.call(forged).status_code, 401)
+
+    def test_token_for_another_project(self):
+        self.assertEqual(self.call(self.keys.sign('alice', project_id='other-project')).status_code, 401)
+
+    def test_verified_claims_are_cached(self):
+        token = self.sign('alice')
+        self.assertEqual(self.call(token).status_code, 200)
+        # A cache hit skips signature checks, so it still passes after the signing key rotates away
+        self.verifier.key_source = LocalKeySource(kid='rotated')
+        self.assertEqual(self.call(token).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, FIREBASE_PROJECT_ID=TEST_PROJECT, AUTH_TRUST_UID_HEADER=False)
+class WebSocketAuthMiddlewareTests(LocalKeysMixin, TransactionTestCase):
+    # The middleware reads users from database threads, which need committed rows
+
+    def setUp(self):
+        super().setUp()
+        make_user('alice')
+
+    def resolve(self, query_string=b'', headers=()):
+        scope = {'type': 'websocket', 'query_string': query_string, 'headers': list(headers)}
+        return async_to_sync(FirebaseAuthMiddleware(None).resolve_user)(scope)
+
+    def test_token_in_query_string(self):
+        user = self.resolve(f'token={self.sign("alice")}'.encode())
+        self.assertEqual(user.id, 'alice')
+
+    def test_token_in_authorization_header(self):
+        user = self.resolve(headers=[(b'authorization', f'Bearer {self.sign("alice")}'.encode())])
+        self.assertEqual(user.id, 'alice')
+
+    def test_invalid_token(self):
+        self.assertIsNone(self.resolve(b'token=not-a-token'))
+
+    def test_no_token(self):
+        self.assertIsNone(self.resolve())
+
+    def test_unknown_user(self):
+        self.assertIsNone(self.resolve(f'token={self.sign("nobody")}'.encode()))
+
+    def test_uid_parameter_ignored_unless_trusted(self):
+        self.assertIsNone(self.resolve(b'uid=alice'))
+        with self.settings(AUTH_TRUST_UID_HEADER=True):
+            self.assertEqual(self.resolve(b'uid=alice').id, 'alice')
+
+
+class StaleTokenTransport(FakePushTransport):
+    """Reports every token containing 'stale' as unregistered, like FCM does."""
+
+    def send(self, tokens, title, body, data):
+        super().send(tokens, title, body, data)
+        return [token for token in tokens if 'stale' in token]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PushPipelineTests(TransactionTestCase):
+    # Deliveries read device tokens from database threads, which need committed rows
+
+    def setUp(self):
+        clear_caches()
+        self.channel = Channel.objects.create(bucket=Bucket.objects.create(name='Push'), name='general')
+        for uid in ('alice', 'bob', 'carol'):
+            ChannelMember.objects.create(channel=self.channel, user=make_user(uid))
+            DeviceToken.objects.create(user_id=uid, token=f'{uid}-phone')
+        self.transport = FakePushTransport()
+
+    def run_pipeline(self, messages, online=(), drain=False, window=0.05):
+        """Feed `messages` as (sender_id, text) to a pipeline, then let the window pass or drain it."""
+        pipeline = PushPipeline(self.transport, window=window, online_users=lambda user_ids: set(online) & user_ids)
+
+        async def scenario():
+            for sender_id, text in messages:
+                pipeline.notify(self.channel.id, sender_id, f'User {sender_id}', text)
+            if drain:
+                await pipeline.drain()
+            else:
+                await asyncio.sleep(window * 4)
+                await asyncio.gather(*pipeline._tasks)
+
+        async_to_sync(scenario)()
+        return self.transport.sent
+
+    def tokens(self, push):
+        return sorted(push['tokens'])
+
+    def test_single_message(self):
+        [push] = self.run_pipeline([('alice', 'hello')])
+        self.assertEqual((push['title'], push['body']), ('User alice', 'hello'))
+        self.assertEqual(push['data'], {'channel_id': str(self.channel.id)})
+        self.assertEqual(self.tokens(push), ['bob-phone', 'carol-phone'])
+
+    def test_burst_is_coalesced(self):
+        [push] = self.run_pipeline([('alice', 'one'), ('alice', 'two'), ('bob', 'three')])
+        self.assertEqual((push['title'], push['body']), ('User alice, User bob', '3 new messages'))
+        # Every sender in the burst has seen it
+        self.assertEqual(self.tokens(push), ['carol-phone'])
+
+    def test_channels_are_coalesced_separately(self):
+        other = Channel.objects.create(bucket=self.channel.bucket, name='random')
+        ChannelMember.objects.create(channel=other, user_id='bob')
+        pipeline = PushPipeline(self.transport, window=0.05)
+
+        async def scenario():
+            pipeline.notify(self.channel.id, 'alice', 'User alice', 'general news')
+            pipeline.notify(other.id, 'alice', 'User alice', 'random news')
+            await pipeline.drain()
+
+        async_to_sync(scenario)()
+        self.assertEqual(sorted(push['body'] for push in self.transport.sent), ['general news', 'random news'])
+
+    def test_online_members_are_skipped(self):
+        [push] = self.run_pipeline([('alice', 'hello')], online={'bob'})
+        self.assertEqual(self.tokens(push), ['carol-phone'])
+
+    def test_nothing_sent_when_everyone_is_online(self):
+        self.assertEqual(self.run_pipeline([('alice', 'hello')], online={'bob', 'carol'}), [])
+
+    def test_pending_invites_are_skipped(self):
+        ChannelMember.objects.filter(channel=self.channel, user_id='carol').update(invite_accepted=False)
+        [push] = self.run_pipeline([('alice', 'hello')])
+        self.assertEqual(self.tokens(push), ['bob-phone'])
+
+    def test_tokens_are_sent_in_batches(self):
+        for n in range(4):
+            DeviceToken.objects.create(user_id='carol', token=f'carol-tablet-{n}')
+        self.transport.batch_size = 2
+        sent = self.run_pipeline([('alice', 'hello')])
+        self.assertEqual([len(push['tokens']) for push in sent], [2, 2, 2])
+        self.assertEqual(len({token for push in sent for token in push['tokens']}), 6)
+
+    def test_drain_delivers_before_the_window(self):
+        [push] = self.run_pipeline([('alice', 'one'), ('alice', 'two')], drain=True, window=60)
+        self.assertEqual(push['body'], '2 new messages')
+
+    def test_stale_tokens_are_forgotten(self):
+        DeviceToken.objects.create(user_id='bob', token='bob-stale-phone')
+        self.transport = StaleTokenTransport()
+        self.run_pipeline([('alice', 'hello')])
+        self.assertFalse(DeviceToken.objects.filter(token='bob-stale-phone').exists())
+        self.assertTrue(DeviceToken.objects.filter(token='bob-phone').exists())
+
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(settings.PRESENCE_REDIS_URL, socket_connect_timeout=0.5).ping()
+    except redis.RedisError:
+        return False
+
+
+@unittest.skipUnless(redis_available(), 'presence needs the Redis at PRESENCE_REDIS_URL')
+class PresenceTests(unittest.TestCase):
+    """Runs against the configured Redis under a throwaway key prefix."""
+
+    def setUp(self):
+        self.presence = Presence(settings.PRESENCE_REDIS_URL, ttl=0.3, prefix=f'presence-test-{uuid.uuid4().hex}')
+        self.addCleanup(self.cleanup)
+
+    def cleanup(self):
+        keys = list(self.presence.client.scan_iter(f'{self.presence.prefix}:*'))
+        if keys:
+            self.presence.client.delete(*keys)
+        self.presence.client.close()
+
+    def run_async(self, scenario):
+        # The async client belongs to the event loop that first used it, so each test uses one loop
+        async def wrapped():
+            try:
+                return await scenario()
+            finally:
+                await self.presence.async_client.aclose()
+        return async_to_sync(wrapped)()
+
+    def test_connections_count_per_device(self):
+        async def scenario():
+            await self.presence.connect('alice', 'phone')
+            await self.presence.connect('alice', 'laptop')
+            await self.presence.connect('bob', 'phone')
+            return await self.presence.device_counts(['alice', 'bob', 'carol'])
+
+        self.assertEqual(self.run_async(scenario), {'alice': 2, 'bob': 1, 'carol': 0})
+        self.assertEqual(self.presence.device_counts_sync(['alice', 'carol']), {'alice': 2, 'carol': 0})
+
+    def test_online_until_last_connection_leaves(self):
+        async def scenario():
+            await self.presence.connect('alice', 'phone')
+            await self.presence.connect('alice', 'laptop')
+            await self.presence.disconnect('alice', 'phone')
+            after_one = await self.presence.online_among(['alice'])
+            await self.presence.disconnect('alice', 'laptop')
+            return after_one, await self.presence.online_among(['alice'])
+
+        self.assertEqual(self.run_async(scenario), ({'alice'}, set()))
+
+    def test_connections_without_heartbeat_expire(self):
+        async def scenario():
+            await self.presence.connect('alice', 'phone')
+            await self.presence.connect('bob', 'phone')
+            for _ in range(2):
+                await asyncio.sleep(0.2)
+                await self.presence.heartbeat('bob', 'phone')
+            return await self.presence.online_among(['alice', 'bob'])
+
+        # alice's worker "died" after connecting; bob's kept heartbeating
+        self.assertEqual(self.run_async(scenario), {'bob'})
+
+    def test_duplicate_user_ids_are_counted_once(self):
+        async def scenario():
+            await self.presence.connect('alice', 'phone')
+            return await self.presence.device_counts(['alice', 'alice'])
+
+        self.assertEqual(self.run_async(scenario), {'alice': 1})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AUTH_TRUST_UID_HEADER=True)
+class SearchFallbackTests(TestCase):
+    """search_messages through the word-matching fallback used off PostgreSQL."""
+
+    def setUp(self):
+        clear_caches()
+        patcher = mock.patch('hatch_app.features.chat.search.connection', mock.Mock(vendor='sqlite'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = make_user('searcher')
+        make_user('outsider')
+        bucket = Bucket.objects.create(name='Search')
+        self.general = Channel.objects.create(bucket=bucket, name='general')
+        self.random = Channel.objects.create(bucket=bucket, name='random')
+        self.private = Channel.objects.create(bucket=bucket, name='private')
+        ChannelMember.objects.create(channel=self.general, user=self.user)
+        ChannelMember.objects.create(channel=self.random, user=self.user)
+        ChannelMember.objects.create(channel=self.private, user_id='outsider')
+
+    def post(self, channel, text, sender_id='searcher'):
+        return create_message(channel=channel, sender_id=sender_id, message_text=text).id
+
+    def search(self, text, limit=10, **kwargs):
+        rows, cursor = search_messages(self.user.id, text, limit, **kwargs)
+        return [row['id'] for row in rows], cursor
+
+    def test_only_members_channels_are_searched(self):
+        mine = self.post(self.general, 'launch plan')
+        self.post(self.private, 'secret launch plan', sender_id='outsider')
+        self.assertEqual(self.search('launch'), ([mine], None))
+
+    def test_every_word_must_match(self):
+        both = self.post(self.general, 'Deploy the API on Friday')
+        self.post(self.general, 'deploy the worker')
+        self.post(self.random, 'friday lunch')
+        self.assertEqual(self.search('friday DEPLOY'), ([both], None))
+
+    def test_channel_filter(self):
+        self.post(self.general, 'standup notes')
+        in_random = self.post(self.random, 'standup moved')
+        self.assertEqual(self.search('standup', channel_id=self.random.id), ([in_random], None))
+
+    def test_pages_newest_first_with_cursor(self):
+        ids = [self.post(self.general, f'release note {n}') for n in range(5)]
+        first, cursor = self.search('release', limit=2)
+        self.assertEqual(first, ids[:-3:-1])
+        second, cursor = self.search('release', limit=2, cursor=cursor)
+        self.assertEqual(second, ids[-3:-5:-1])
+        last, cursor = self.search('release', limit=2, cursor=cursor)
+        self.assertEqual((last, cursor), ([ids[0]], None))
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            self.search('release', cursor='not-a-cursor')
+
+    def test_view_rejects_bad_input(self):
+        url = '/api/chat/messages/search/'
+        self.assertEqual(self.client.get(url, HTTP_UID=self.user.id).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'x', 'cursor': 'junk'}, HTTP_UID=self.user.id).status_code, 400)
+
+    def test_view_returns_ranked_results(self):
+        message_id = self.post(self.general, 'hello search')
+        body = self.client.get('/api/chat/messages/search/', {'q': 'search'}, HTTP_UID=self.user.id).json()
+        self.assertEqual([result['id'] for result in body['results']], [message_id])
+        self.assertEqual(body['results'][0]['rank'], 0.0)
+        self.assertFalse(body['has_more'])
+
+
+class UpstreamDown(Exception):
+    pass
+
+
+class SlowUpstream:
+    """Stand-in LLM call that holds its governor slot until released."""
+
+    def __init__(self, governor, user_id):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.call, args=(governor, user_id), daemon=True)
+        self.thread.start()
+
+    def call(self, governor, user_id):
+        try:
+            with governor.slot(user_id, Deadline(5)):
+                self.entered.set()
+                self.release.wait(5)
+        except Exception as e:
+            self.error = e
+
+    def finish(self):
+        self.release.set()
+        self.thread.join(5)
+
+
+class LLMGovernorTests(SimpleTestCase):
+    def governor(self, max_concurrent=1, per_user=1, max_queue=1, failures=2, reset=0.05):
+        return LLMGovernor(max_concurrent, per_user, max_queue, CircuitBreaker(failures, reset), name='test')
+
+    def call_failing(self, governor, user_id='alice'):
+        with self.assertRaises(UpstreamDown):
+            with governor.slot(user_id, Deadline(1)):
+                raise UpstreamDown()
+
+    def call_ok(self, governor, user_id='alice'):
+        with governor.slot(user_id, Deadline(1)):
+            pass
+
+    def hold(self, governor, user_id):
+        upstream = SlowUpstream(governor, user_id)
+        self.addCleanup(upstream.finish)
+        return upstream
+
+    def wait_until(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, 'condition not reached')
+            time.sleep(0.005)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        governor = self.governor(failures=2)
+        self.call_failing(governor)
+        self.call_ok(governor)
+        self.call_failing(governor)
+        self.assertEqual(governor.breaker.state, CircuitBreaker.CLOSED)
+        self.call_failing(governor)
+        self.assertEqual(governor.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.call_ok(governor)
+
+    def test_one_trial_after_reset_closes_on_success(self):
+        governor = self.governor(max_concurrent=2, per_user=2, failures=1)
+        self.call_failing(governor)
+        time.sleep(0.06)
+        trial = self.hold(governor, 'alice')
+        self.assertTrue(trial.entered.wait(1))
+        self.assertEqual(governor.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only the trial reaches the upstream while it is half open
+        with self.assertRaises(CircuitOpen):
+            self.call_ok(governor, 'bob')
+        trial.finish()
+        self.assertEqual(governor.breaker.state, CircuitBreaker.CLOSED)
+        self.call_ok(governor, 'bob')
+
+    def test_failed_trial_reopens(self):
+        governor = self.governor(failures=1)
+        self.call_failing(governor)
+        time.sleep(0.06)
+        self.call_failing(governor)
+        self.assertEqual(governor.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.call_ok(governor)
+
+    def test_queue_full_is_rejected_immediately(self):
+        governor = self.governor(max_concurrent=1, per_user=2, max_queue=1)
+        running = self.hold(governor, 'alice')
+        self.assertTrue(running.entered.wait(1))
+        queued = self.hold(governor, 'bob')
+        self.wait_until(lambda: governor.queue_depth() == 1)
+        started = time.monotonic()
+        with self.assertRaises(QueueFull):
+            self.call_ok(governor, 'carol')
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        running.finish()
+        self.assertTrue(queued.entered.wait(1))
+        self.assertEqual(governor.queue_depth(), 0)
+
+    def test_waiting_counts_against_the_deadline(self):
+        governor = self.governor(max_concurrent=1, per_user=2, max_queue=5)
+        running = self.hold(governor, 'alice')
+        self.assertTrue(running.entered.wait(1))
+        with self.assertRaises(DeadlineExceeded):
+            with governor.slot('bob', Deadline(0.05)):
+                self.fail('a timed-out caller must not get a slot')
+        self.assertEqual(governor.queue_depth(), 0)
+        # Timing out in the queue says nothing about the upstream
+        self.assertEqual(governor.breaker.failures, 0)
+
+    def test_per_user_limit(self):
+        governor = self.governor(max_concurrent=2, per_user=1, max_queue=5)
+        running = self.hold(governor, 'alice')
+        self.assertTrue(running.entered.wait(1))
+        with self.assertRaises(DeadlineExceeded):
+            with governor.slot('alice', Deadline(0.05)):
+                pass
+        self.call_ok(governor, 'bob')
+
+    def test_freed_slot_skips_users_at_their_limit(self):
+        governor = self.governor(max_concurrent=2, per_user=1, max_queue=5)
+        alice = self.hold(governor, 'alice')
+        bob = self.hold(governor, 'bob')
+        self.assertTrue(alice.entered.wait(1) and bob.entered.wait(1))
+        alice_again = self.hold(governor, 'alice')
+        carol = self.hold(governor, 'carol')
+        self.wait_until(lambda: governor.queue_depth() == 2)
+        bob.finish()
+        self.assertTrue(carol.entered.wait(1))
+        self.assertFalse(alice_again.entered.is_set())
+        alice.finish()
+        self.assertTrue(alice_again.entered.wait(1))
+
+    def test_slot_without_time_left_is_not_an_upstream_failure(self):
+        governor = self.governor(failures=1)
+        with self.assertRaises(DeadlineExceeded):
+            with governor.slot('alice', Deadline(0)):
+                self.fail('no call may start without time left')
+        self.assertEqual((governor.active_calls(), governor.breaker.failures), (0, 0))
+        self.assertEqual(governor.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_async_slot_deadline_and_cancellation(self):
+        governor = self.governor(max_concurrent=1, per_user=2, max_queue=5)
+        running = self.hold(governor, 'alice')
+        self.assertTrue(running.entered.wait(1))
+
+        async def scenario():
+            with self.assertRaises(DeadlineExceeded):
+                async with governor.aslot('bob', Deadline(0.05)):
+                    pass
+
+            async def wait_for_slot():
+                async with governor.aslot('carol', Deadline(5)):
+                    pass
+
+            waiting = asyncio.ensure_future(wait_for_slot())
+            await asyncio.sleep(0.02)
+            self.assertEqual(governor.queue_depth(), 1)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+        async_to_sync(scenario)()
+        self.assertEqual(governor.queue_depth(), 0)
+        running.finish()
+        self.assertEqual(governor.active_calls(), 0)
+        self.assertEqual(governor.breaker.state, CircuitBreaker.CLOSED)
+
+
+class WireTests(SimpleTestCase):
+    def test_deflated_msgpack_round_trip(self):
+        frame = wire.encode({'message_text': 'hi'}, wire.MSGPACK_DEFLATE)
+        self.assertEqual(wire.decode(None, frame, wire.MSGPACK_DEFLATE), {'message_text': 'hi'})
+
+    def test_deflate_bomb_is_rejected(self):
+        bomb = wire.deflate(b'\0' * (wire.MAX_FRAME_BYTES * 8))
+        self.assertLess(len(bomb), 64 * 1024)
+        with self.assertRaisesMessage(wire.FrameError, 'Frame too large'):
+            wire.decode(None, bomb, wire.MSGPACK_DEFLATE)
+
+    def test_garbage_is_a_frame_error(self):
+        with self.assertRaises(wire.FrameError):
+            wire.decode(None, b'\xff\x00garbage', wire.MSGPACK_DEFLATE)
+
+    def test_broadcast_carries_the_payload_once(self):
+        payload = {'type': 'chat.message', 'message': 'hi'}
+        event = wire.broadcast_event(payload)
+        self.assertEqual(set(event), {'type', 'id', 'payload'})
+        self.assertEqual(event['payload'], payload)
+
+    def test_frames_are_encoded_once_per_protocol_in_use(self):
+        cache = wire.FrameCache()
+        event = wire.broadcast_event({'type': 'chat.message', 'message': 'hi'})
+        with mock.patch.object(wire, 'encode', wraps=wire.encode) as encode:
+            for _ in range(3):
+                self.assertEqual(cache.get(event, wire.MSGPACK), wire.msgpack.packb(event['payload']))
+            cache.get(event, wire.JSON)
+        self.assertEqual([call.args[1] for call in encode.call_args_list], [wire.MSGPACK, wire.JSON])
+
+    def test_frame_cache_is_bounded(self):
+        cache = wire.FrameCache(max_size=2)
+        for n in range(5):
+            cache.get(wire.broadcast_event({'type': 'chat.message', 'n': n}), wire.JSON)
+        self.assertEqual(len(cache._frames), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AUTH_TRUST_UID_HEADER=True, UNREAD_COUNTER_MAX_MEMBERS=6)
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.channel = Channel.objects.create(bucket=Bucket.objects.create(name='Unread'), name='general')
+
+    def join(self, *uids):
+        for uid in uids:
+            ChannelMember.objects.create(channel=self.channel, user=make_user(uid))
+        cache.clear()
+
+    def post(self, sender_id, count=1):
+        return [create_message(channel=self.channel, sender_id=sender_id, message_text='hi') for _ in range(count)][-1]
+
+    def unread(self, user_id):
+        return dict(unread_memberships(user_id).values_list('channel_id', 'unread')).get(self.channel.id)
+
+    def counters(self):
+        return dict(ChannelMember.objects.filter(channel=self.channel).values_list('user_id', 'unread_count'))
+
+    def test_small_channel_keeps_counters(self):
+        self.join('alice', 'bob')
+        self.post('alice', 3)
+        self.assertEqual(self.counters(), {'alice': 0, 'bob': 3})
+        self.assertEqual(self.unread('bob'), 3)
+
+    def test_large_channel_counts_from_watermark(self):
+        self.join('alice', 'bob', 'carol', 'dave', 'erin', 'frank')
+        self.post('alice', 2)
+        read_up_to = self.post('bob')
+        self.post('alice')
+        self.channel.refresh_from_db()
+        self.assertFalse(self.channel.unread_counters)
+        self.assertEqual(set(self.counters().values()), {0})
+        self.assertEqual((self.unread('alice'), self.unread('bob'), self.unread('carol')), (1, 3, 4))
+
+        self.assertEqual(mark_read(self.channel.id, 'carol', read_up_to.id), 1)
+        self.assertEqual(self.unread('carol'), 1)
+
+    def test_counters_come_back_when_the_channel_shrinks(self):
+        self.join('alice', 'bob', 'carol', 'dave', 'erin', 'frank')
+        self.post('alice', 2)
+        ChannelMember.objects.filter(channel=self.channel).exclude(user_id__in=['alice', 'bob']).delete()
+        cache.clear()
+        self.join('gina')
+        # Three members is not below half the limit yet
+        self.post('bob')
+        self.channel.refresh_from_db()
+        self.assertFalse(self.channel.unread_counters)
+
+        ChannelMember.objects.filter(channel=self.channel, user_id='bob').delete()
+        cache.clear()
+        self.post('alice')
+        self.channel.refresh_from_db()
+        self.assertTrue(self.channel.unread_counters)
+        # gina joined after alice's first two messages
+        self.assertEqual(self.counters(), {'alice': 1, 'gina': 2})
+
+    def test_mark_read_resets_counter(self):
+        self.join('alice', 'bob')
+        first = self.post('alice')
+        self.post('alice', 2)
+        self.assertEqual(mark_read(self.channel.id, 'bob', first.id), 2)
+        self.assertEqual(self.counters()['bob'], 2)
+        self.assertIsNone(mark_read(self.channel.id, 'outsider', first.id))
+
+    def test_mark_read_endpoint_rejects_malformed_entries(self):
+        self.join('alice', 'bob')
+        message = self.post('alice')
+        response = self.client.post('/api/chat/channels/read/', {'read': [
+            'junk',
+            {'channel_id': self.channel.id, 'message_id': 'abc'},
+            {'channel_id': str(self.channel.id), 'message_id': message.id},
+        ]}, content_type='application/json', HTTP_UID='bob')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['invalid', 'invalid', 'read'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.channel = Channel.objects.create(bucket=Bucket.objects.create(name='Writes'), name='general')
+        for uid in ('alice', 'bob'):
+            ChannelMember.objects.create(channel=self.channel, user=make_user(uid))
+
+    def message(self, message_id):
+        return Message(id=message_id, channel=self.channel, sender_id='alice', message_text='hi', created_at=timezone.now())
+
+    def test_rewriting_a_stored_batch_has_no_side_effects(self):
+        batch = [self.message(9001), self.message(9002)]
+        self.assertEqual(MessageWriter.write(batch), batch)
+        # A retry after a commit that looked failed, or a dead-letter replay
+        retry = batch + [self.message(9003)]
+        self.assertEqual([message.id for message in MessageWriter.write(retry)], [9003])
+        self.assertEqual(Message.objects.filter(channel=self.channel).count(), 3)
+        self.assertEqual(ChannelMember.objects.get(channel=self.channel, user_id='bob').unread_count, 3)
+        self.assertEqual(MessageWriter.write(retry), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserProfileCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.profiles = UserProfileCache(local_size=100, local_ttl=30, shared_ttl=3600, prefix='profile-test')
+        make_user('alice')
+
+    def rename(self, name, users=User.objects):
+        users.filter(id='alice').update(name=name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profiles.forget('alice')
+
+    def fresh_name(self):
+        # As seen by another process: nothing local, only the shared cache
+        self.profiles.local.clear()
+        return self.profiles.get('alice').name
+
+    def test_forget_drops_the_shared_entry(self):
+        self.assertEqual(self.fresh_name(), 'User alice')
+        self.rename('Alice')
+        self.assertEqual(self.fresh_name(), 'Alice')
+
+    def test_forget_during_a_database_read_is_not_lost(self):
+        users = User.objects.all()
+
+        def read_then_rename(**lookup):
+            stale = list(users.filter(**lookup).values(*PROFILE_FIELDS))
+            self.rename('Alice', users=users)
+            return mock.Mock(values=lambda *fields: stale)
+
+        with mock.patch.object(User.objects, 'filter', side_effect=read_then_rename):
+            self.assertEqual(self.profiles.get('alice').name, 'User alice')
+        self.assertEqual(self.fresh_name(), 'Alice')
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Answers Gemini generateContent/streamGenerateContent as the test's server.mode says."""
+
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if server.mode == 'slow':
+            server.stopped.wait(5)
+        if server.mode == 'fail':
+            self.reply(503, {"error": {"code": 503, "message": "Overloaded", "status": "UNAVAILABLE"}})
+        elif 'streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for n, word in enumerate(['Hello', ' there']):
+                chunk = response_chunk(word, last=n == 1)
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+        else:
+            self.reply(200, response_chunk('Hello there', last=True))
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ChatbotUpstreamTests(SimpleTestCase):
+    """HatchChatbot through the real HTTP client against a local stub server."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+        self.server.daemon_threads = True
+        self.server.mode, self.server.requests, self.server.stopped = 'ok', 0, threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.stop_server)
+
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        with mock.patch.dict(os.environ, {'GEMINI_BASE_URL': base_url, 'GEMINI_API_KEY': 'test-key'}):
+            self.chatbot = HatchChatbot()
+        self.governor = LLMGovernor(2, 2, 2, CircuitBreaker(2, 60), name='test')
+        patcher = mock.patch('hatch_app.features.chat.chatbot.llm_governor', self.governor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stop_server(self):
+        self.server.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reply(self):
+        self.assertEqual(self.chatbot.generate('hi', user_id='alice', deadline=Deadline(5)), 'Hello there')
+        self.assertEqual(self.governor.breaker.failures, 0)
+
+    def test_slow_upstream_times_out_at_the_deadline(self):
+        self.server.mode = 'slow'
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            self.chatbot.generate('hi', user_id='alice', deadline=Deadline(0.5))
+        self.assertLess(time.monotonic() - started, 2)
+        # A slow upstream is unhealthy; the failure counts toward opening the breaker
+        self.assertEqual(self.governor.breaker.failures, 1)
+
+    def test_failing_upstream_opens_the_breaker(self):
+        self.server.mode = 'fail'
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                self.chatbot.generate('hi', user_id='alice', deadline=Deadline(5))
+        with self.assertRaises(CircuitOpen):
+            self.chatbot.generate('hi', user_id='alice', deadline=Deadline(5))
+        self.assertEqual(self.server.requests, 2)
+
+    def collect_stream(self, deadline):
+        async def collect():
+            return [text async for text in self.chatbot.stream('hi', user_id='alice', deadline=deadline)]
+        return async_to_sync(collect)()
+
+    def test_stream(self):
+        self.assertEqual(''.join(self.collect_stream(Deadline(5))), 'Hello there')
+
+    def test_slow_stream_times_out_at_the_deadline(self):
+        self.server.mode = 'slow'
+        with self.assertRaises(DeadlineExceeded):
+            self.collect_stream(Deadline(0.5))
+        self.assertEqual(self.governor.active_calls(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArchivePagingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for patcher in (
+            mock.patch.object(archive, 'archive_storage', FileSystemStorage(location=directory.name)),
+            mock.patch.object(archive, 'ARCHIVE_BLOCK_SIZE', 10),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.channel = Channel.objects.create(bucket=Bucket.objects.create(name='Archive'), name='general')
+        month = timezone.now().replace(year=2024, month=3, day=1, hour=0, minute=0, second=0, microsecond=0)
+        writer = archive.ArchiveWriter(self.channel.id, month)
+        # 45 messages, newest first, with pairs sharing a timestamp to exercise id tie-breaks
+        for n in range(45, 0, -1):
+            writer.write({
+                'id': n, 'channel_id': self.channel.id, 'sender_id': 'alice', 'message_text': f'm{n}',
+                'message_file': None, 'join_channel': False, 'created_at': month + timedelta(minutes=n // 2),
+                'reactions': [],
+            })
+        writer.close()
+
+    def page_through(self, limit):
+        ids, before, has_more = [], None, True
+        while has_more:
+            page, has_more = archive.archived_page(self.channel.id, before, limit)
+            ids += [message.id for message in page]
+            before = (page[-1].created_at, page[-1].id)
+        return ids
+
+    def test_pages_cover_every_message_in_order(self):
+        for limit in (1, 7, 10, 45):
+            self.assertEqual(self.page_through(limit), list(range(45, 0, -1)))
+
+    def test_later_pages_start_at_their_block(self):
+        offsets = []
+        read_archive = archive.read_archive
+        with mock.patch.object(archive, 'read_archive', side_effect=lambda path, offset=0: (
+            offsets.append(offset) or read_archive(path, offset)
+        )):
+            self.page_through(10)
+        starts = [start for _, _, start in self.channel.messagearchive_set.get().block_index]
+        self.assertEqual(len(starts), 5)
+        # A page starts at the last block whose newest message is not older than its cursor
+        self.assertEqual(offsets, [0, 0] + starts[1:4])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MergeDirectDuplicatesTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(archive, 'archive_storage', FileSystemStorage(location=directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        bucket = Bucket.objects.create(name='Direct Messages')
+        self.keep = Channel.objects.create(bucket=bucket, name='Direct', channel_type='direct', direct_key='alice:bob')
+        self.duplicate = Channel.objects.create(bucket=bucket, name='Direct', channel_type='direct')
+        for uid in ('alice', 'bob'):
+            make_user(uid)
+            for channel in (self.keep, self.duplicate):
+                ChannelMember.objects.create(channel=channel, user_id=uid)
+        self.month = timezone.now().replace(year=2024, month=3, day=1, hour=0, minute=0, second=0, microsecond=0)
+        self.archive(self.keep, [4, 2])
+        self.archive(self.duplicate, [3, 1])
+        create_message(channel=self.duplicate, sender_id='alice', message_text='live')
+
+    def archive(self, channel, ids):
+        writer = archive.ArchiveWriter(channel.id, self.month)
+        for n in ids:
+            writer.write({
+                'id': n, 'channel_id': channel.id, 'sender_id': 'alice', 'message_text': f'm{n}',
+                'message_file': None, 'join_channel': False, 'created_at': self.month + timedelta(minutes=n),
+                'reactions': [],
+            })
+        writer.close()
+
+    def test_leftover_duplicate_is_merged_with_its_archives(self):
+        call_command('merge_direct_duplicates', stdout=open(os.devnull, 'w'))
+        self.assertFalse(Channel.objects.filter(id=self.duplicate.id).exists())
+        self.assertEqual(Message.objects.get(message_text='live').channel_id, self.keep.id)
+        page, has_more = archive.archived_page(self.keep.id, limit=10)
+        self.assertEqual(([message.id for message in page], has_more), ([4, 3, 2, 1], False))
+        self.assertEqual(self.keep.messagearchive_set.get().message_count, 4)
+        self.assertEqual(ChannelMember.objects.get(channel=self.keep, user_id='bob').unread_count, 1)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from .features.storage import views
+from .metrics import metrics_view
 
 urlpatterns = [
     path('chat/', include('hatch_app.features.chat.urls')),
@@ -8,4 +9,5 @@ urlpatterns = [
     path('user/', include('hatch_app.features.user.urls')),
     path('storage/upload/', views.upload_file, name='upload_file'),
     path('storage/<int:file_id>/', views.get_file, name='get_file'),
+    path('metrics/', metrics_view, name='metrics'),
 ]